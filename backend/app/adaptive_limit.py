@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Limite adaptativo de chamadas simultâneas por host da Matrix Cargo e organização (AIMD)
+ADAPTIVE_LIMIT_ENABLED = os.getenv('ADAPTIVE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADAPTIVE_LIMIT_INITIAL = float(os.getenv('ADAPTIVE_LIMIT_INITIAL', 10))
+ADAPTIVE_LIMIT_MIN = float(os.getenv('ADAPTIVE_LIMIT_MIN', 1))
+ADAPTIVE_LIMIT_MAX = float(os.getenv('ADAPTIVE_LIMIT_MAX', 100))
+# Latência acima da qual a chamada conta como sinal de sobrecarga, em segundos
+ADAPTIVE_LIMIT_TARGET_LATENCY_SECONDS = float(os.getenv('ADAPTIVE_LIMIT_TARGET_LATENCY_SECONDS', 2))
+# Fator aplicado ao limite a cada redução
+ADAPTIVE_LIMIT_BACKOFF = float(os.getenv('ADAPTIVE_LIMIT_BACKOFF', 0.7))
+# Peso da última amostra na média móvel exponencial da latência
+ADAPTIVE_LIMIT_LATENCY_SMOOTHING = float(os.getenv('ADAPTIVE_LIMIT_LATENCY_SMOOTHING', 0.2))
+
+
+class AdaptiveLimiter:
+    """
+    Limite de concorrência AIMD: cada resposta rápida soma 1/limite (cerca de +1 por
+    "janela" de chamadas); 429, 5xx, erro de rede ou latência acima do alvo multiplicam
+    o limite por `backoff`, no máximo uma vez por janela (a latência média), para que as
+    falhas de uma mesma rajada contem como um só sinal. Quem excede o limite espera na
+    fila, por ordem de chegada. Usado apenas a partir do event loop.
+    """
+
+    def __init__(self, name: str, initial: float = ADAPTIVE_LIMIT_INITIAL,
+                 minimum: float = ADAPTIVE_LIMIT_MIN, maximum: float = ADAPTIVE_LIMIT_MAX,
+                 target_latency: float = ADAPTIVE_LIMIT_TARGET_LATENCY_SECONDS,
+                 backoff: float = ADAPTIVE_LIMIT_BACKOFF):
+        self.name = name
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.successes = 0
+        self.overloads = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _capacity(self) -> int:
+        return int(self.limit)
+
+    def _wake(self) -> None:
+        # Entrega as vagas livres diretamente aos primeiros da fila
+        while self._waiters and self.in_flight < self._capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self) -> None:
+        if not self._waiters and self.in_flight < self._capacity():
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A vaga já tinha sido entregue: devolve para o próximo da fila
+                self.in_flight -= 1
+                self._wake()
+            raise
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """
+        Libera a vaga e ajusta o limite. latency None (chamada cancelada ou não
+        enviada) só libera a vaga, sem contar como amostra.
+        """
+        self.in_flight -= 1
+        if latency is not None:
+            self._record(latency, overloaded)
+        self._wake()
+
+    def _record(self, latency: float, overloaded: bool) -> None:
+        self.last_latency = latency
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += ADAPTIVE_LIMIT_LATENCY_SMOOTHING * (latency - self.latency_ewma)
+
+        if overloaded or latency > self.target_latency:
+            self.overloads += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= min(self.latency_ewma, self.target_latency):
+                self._last_decrease = now
+                previous = self.limit
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                if self.limit < previous:
+                    self.decreases += 1
+                    logger.info(
+                        "Limite de %s reduzido de %.1f para %.1f (%s, latência %.2fs)",
+                        self.name, previous, self.limit,
+                        "sobrecarga" if overloaded else "latência acima do alvo", latency
+                    )
+            return
+
+        self.successes += 1
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "min": self.minimum,
+            "max": self.maximum,
+            "target_latency_seconds": self.target_latency,
+            "latency_ewma_seconds": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+            "last_latency_seconds": round(self.last_latency, 4) if self.last_latency is not None else None,
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "decreases": self.decreases
+        }
+
+
+_limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+
+
+def get_adaptive_limiter(host: str, organization_id: Optional[str]) -> Optional[AdaptiveLimiter]:
+    """Limitador do par (host, organização); None com ADAPTIVE_LIMIT_ENABLED desligado"""
+    if not ADAPTIVE_LIMIT_ENABLED:
+        return None
+    key = (host, organization_id or '')
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = _limiters[key] = AdaptiveLimiter(f"{host} [{organization_id}]")
+    return limiter
+
+
+def adaptive_limit_stats() -> List[Dict[str, Any]]:
+    return [
+        {"host": host, "organization_id": organization_id, **limiter.stats()}
+        for (host, organization_id), limiter in _limiters.items()
+    ]
@@ -0,0 +1,130 @@
+import os
+import tarfile
+import zipfile
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Tuple
+
+from .logging_config import get_logger
+from .xml_processor import NFXMLProcessor, new_note_id, validate_and_extract
+
+logger = get_logger(__name__)
+
+# Limites contra arquivos compactados maliciosos (zip bombs), em bytes descompactados
+ARCHIVE_MAX_MEMBER_SIZE = int(os.getenv('ARCHIVE_MAX_MEMBER_SIZE', 50 * 1024 * 1024))
+ARCHIVE_MAX_TOTAL_SIZE = int(os.getenv('ARCHIVE_MAX_TOTAL_SIZE', 2 * 1024 * 1024 * 1024))
+ARCHIVE_MAX_MEMBERS = int(os.getenv('ARCHIVE_MAX_MEMBERS', 100000))
+
+# Tamanho dos blocos lidos de cada membro e entregues ao extrator
+ARCHIVE_READ_CHUNK_SIZE = 64 * 1024
+
+
+class ArchiveLimitError(ValueError):
+    """Um membro ou o arquivo como um todo ultrapassou os limites configurados"""
+
+
+class _Budget:
+    """Contabiliza os bytes descompactados lidos de todo o arquivo"""
+
+    def __init__(self):
+        self.total = 0
+
+
+def _is_xml_member(name: str) -> bool:
+    return name.lower().endswith('.xml') and not name.startswith('__MACOSX/')
+
+
+def _iter_zip(fileobj: BinaryIO) -> Iterator[Tuple[str, Callable[[], BinaryIO]]]:
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_xml_member(info.filename):
+                continue
+            yield info.filename, lambda info=info: archive.open(info)
+
+
+def _iter_tar(fileobj: BinaryIO) -> Iterator[Tuple[str, Callable[[], BinaryIO]]]:
+    # Modo de fluxo ('r|*'): os membros são lidos em sequência, sem índice em memória
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not _is_xml_member(member.name):
+                continue
+            yield member.name, lambda member=member: archive.extractfile(member)
+
+
+def iter_archive_members(fileobj: BinaryIO) -> Iterator[Tuple[str, Callable[[], BinaryIO]]]:
+    """
+    Percorre os XMLs de um arquivo zip ou tar (gz/bz2/xz).
+    Gera (caminho do membro, função que abre o membro para leitura).
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        return _iter_zip(fileobj)
+    fileobj.seek(0)
+    return _iter_tar(fileobj)
+
+
+def _read_chunks(stream: BinaryIO, budget: _Budget) -> Iterator[bytes]:
+    """Lê o membro em blocos, contando os bytes realmente descompactados"""
+    member_size = 0
+    while True:
+        chunk = stream.read(ARCHIVE_READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        member_size += len(chunk)
+        budget.total += len(chunk)
+        if member_size > ARCHIVE_MAX_MEMBER_SIZE:
+            raise ArchiveLimitError(
+                f"Arquivo excede o tamanho máximo permitido de {ARCHIVE_MAX_MEMBER_SIZE} bytes"
+            )
+        if budget.total > ARCHIVE_MAX_TOTAL_SIZE:
+            raise ArchiveLimitError(
+                f"Arquivo compactado excede o tamanho total permitido de {ARCHIVE_MAX_TOTAL_SIZE} bytes"
+            )
+        yield chunk
+
+
+def process_archive(fileobj: BinaryIO) -> Dict[str, Any]:
+    """
+    Processa os XMLs de um arquivo compactado, um membro por vez.
+    Cada membro é entregue em blocos ao extrator, de modo que a memória usada
+    não depende do tamanho do arquivo. Os erros são indexados pelo caminho do membro.
+    Operação bloqueante: deve ser executada fora do event loop.
+    """
+    results = {
+        "processed_data": [],
+        "validation_errors": {}
+    }
+    budget = _Budget()
+
+    try:
+        for count, (path, open_member) in enumerate(iter_archive_members(fileobj), start=1):
+            if count > ARCHIVE_MAX_MEMBERS:
+                results["validation_errors"]["error"] = [
+                    f"Arquivo compactado excede o limite de {ARCHIVE_MAX_MEMBERS} XMLs"
+                ]
+                break
+
+            try:
+                with open_member() as stream:
+                    processor = NFXMLProcessor.from_chunks(_read_chunks(stream, budget))
+                data, errors = validate_and_extract(processor)
+            except ArchiveLimitError as e:
+                results["validation_errors"][path] = [str(e)]
+                if budget.total > ARCHIVE_MAX_TOTAL_SIZE:
+                    break
+                continue
+            except ValueError as e:
+                data, errors = None, [str(e)]
+            except Exception as e:
+                data, errors = None, [f"Erro ao processar XML: {str(e)}"]
+
+            if errors is not None:
+                results["validation_errors"][path] = errors
+                continue
+
+            data = data.with_id(new_note_id(data.numeroNF))
+            results["processed_data"].append(data)
+
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        logger.warning("Arquivo compactado inválido: %s", e)
+        raise ValueError(f"Arquivo compactado inválido: {str(e)}")
+
+    return results
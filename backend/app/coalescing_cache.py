@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Entry(NamedTuple):
+    stored_at: float
+    value: Any
+
+
+class CoalescingTTLCache:
+    """
+    Cache assíncrono com expiração, para respostas de sistemas externos.
+
+    - Buscas simultâneas da mesma chave, sem valor em cache, compartilham uma única chamada ao loader.
+    - Com stale_seconds > 0, um valor vencido há menos de stale_seconds ainda é devolvido
+      na hora enquanto uma atualização roda em segundo plano (stale-while-revalidate).
+    - Apenas resultados bem-sucedidos são guardados; erros chegam a todos que aguardavam.
+    Usado apenas a partir do event loop, por isso não tem travas.
+    """
+
+    def __init__(self, ttl_seconds: float, stale_seconds: float = 0, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await loader()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.stored_at
+            if age <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if age <= self.ttl_seconds + self.stale_seconds:
+                self.stale_hits += 1
+                self._load(key, loader)
+                return entry.value
+
+        self.misses += 1
+        if key in self._inflight:
+            self.coalesced += 1
+        # shield: se quem aguarda for cancelado, a busca continua para os demais
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Inicia a busca da chave, ou devolve a que já está em andamento"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+
+        future = asyncio.ensure_future(loader())
+        self._inflight[key] = future
+
+        def done(task: asyncio.Future) -> None:
+            self._inflight.pop(key, None)
+            if task.cancelled():
+                return
+            error = task.exception()
+            if error is not None:
+                logger.debug("Falha ao atualizar o cache: %s", error)
+                return
+            self._store(key, task.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def _store(self, key: str, value: Any) -> None:
+        self._entries[key] = _Entry(time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced
+        }
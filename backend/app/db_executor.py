@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from .database import DB_POOL_SIZE, SessionLocal, engine
+
+# Threads dedicadas ao banco. O SQLite aceita um escritor por vez, então o padrão é 1:
+# as escritas saem do event loop e ficam em fila, sem disputar o lock do arquivo.
+# Nos demais bancos, uma thread por conexão do pool
+DB_EXECUTOR_THREADS = int(os.getenv('DB_EXECUTOR_THREADS', 1 if engine.dialect.name == 'sqlite' else DB_POOL_SIZE))
+
+T = TypeVar('T')
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def start_db_executor() -> None:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(DB_EXECUTOR_THREADS, 1), thread_name_prefix='db')
+
+
+def shutdown_db_executor() -> None:
+    """Espera as operações já enfileiradas (ex. gravação de resultados) e encerra as threads"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_in_db_executor(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Executa fn nas threads do banco, sem bloquear o event loop.
+    O contexto (ex. medições de LOG_TIMINGS) acompanha a chamada.
+    """
+    if _executor is None:
+        start_db_executor()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+def _with_session(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # expire_on_commit=False: os objetos devolvidos continuam legíveis depois que a sessão fecha
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa fn(db, *args, **kwargs) nas threads do banco, com uma sessão própria"""
+    return await run_in_db_executor(_with_session, fn, *args, **kwargs)
+
@@ -1,6 +1,19 @@
+import logging
+import os
 from typing import Dict, Any
+from urllib.parse import urlsplit
 import httpx
 from fastapi import HTTPException
+from .adaptive_limit import get_adaptive_limiter
+from .http_client import get_http_client
+from .json_codec import dumps_bytes
+from .logging_config import get_logger, redact_headers, stage
+from .resilience import CircuitOpenError, send_with_retry
+
+logger = get_logger(__name__)
+
+MATRIXCARGO_TRACKING_API_URL = os.getenv('MATRIXCARGO_TRACKING_API_URL', 'https://tracking-api.matrixcargo.com.br/api/v1/external')
+MATRIXCARGO_PAINEL_LOGISTICO_API_URL = os.getenv('MATRIXCARGO_PAINEL_LOGISTICO_API_URL', 'https://painel-logistico-api.matrixcargo.com.br/api/v1')
 
 class MatrixcargoTracking:
     def __init__(self, base_url: str, api_key: str, organization_id: str, workspace_id: str = None):
@@ -14,38 +27,51 @@ class MatrixcargoTracking:
         }
         if workspace_id:
             self.headers["X-Workspace-Key"] = workspace_id
+        # Concorrência adaptativa por host e organização, compartilhada por todos os envios
+        self.limiter = get_adaptive_limiter(urlsplit(base_url).netloc, organization_id)
 
     async def create_trip(self, trip_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Envia a viagem para o sistema Tracking Matrixcargo
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                print(f"Enviando requisição para: {self.base_url}")
-                print(f"Headers: {self.headers}")
-                
-                response = await client.post(
+        # Cliente compartilhado: reaproveita conexões TCP/TLS entre as chamadas
+        client = get_http_client()
+        try:
+            logger.debug("Enviando requisição para: %s", self.base_url)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Headers: %s", redact_headers(self.headers))
+            
+            with stage('remote'):
+                # Falhas transitórias são repetidas; com o circuito aberto falha na hora
+                response = await send_with_retry(
+                    client,
+                    "POST",
                     self.base_url,
-                    json=trip_data,
+                    limiter=self.limiter,
+                    content=dumps_bytes(trip_data),
                     headers=self.headers
                 )
 
-                print(f"Status code: {response.status_code}")
-                print(f"Response: {response.text}")
+            logger.debug("Status code: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                # response.text decodifica o corpo inteiro: só com DEBUG ativo
+                logger.debug("Response: %s", response.text)
 
-                if response.status_code in (200, 201):
-                    return response.json()
+            if response.status_code in (200, 201):
+                return response.json()
 
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Erro na integração: {response.text}"
-                )
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Erro na integração: {response.text}"
+            )
 
-            except httpx.RequestError as e:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Erro de comunicação com sistema externo: {str(e)}"
-                )
+        except CircuitOpenError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Erro de comunicação com sistema externo: {str(e)}"
+            )
 
 class MatrixcargoPainelLogistico:
     def __init__(self, base_url: str, api_key: str, organization_id: str, workspace_id: str):
@@ -58,32 +84,44 @@ class MatrixcargoPainelLogistico:
             "X-Organization-Key": organization_id,
             "X-Workspace-Key": workspace_id
         }
+        # Concorrência adaptativa por host e organização, compartilhada por todos os envios
+        self.limiter = get_adaptive_limiter(urlsplit(base_url).netloc, organization_id)
 
     async def create_order(self, order_data: dict) -> dict:
-        async with httpx.AsyncClient(verify=True, timeout=30.0) as client:
-            try:
-                print(f"Enviando requisição para: {self.base_url}")
-                print(f"Headers: {self.headers}")
-                print(f"Payload: {order_data}")
-                
-                response = await client.post(
+        client = get_http_client()
+        try:
+            logger.debug("Enviando requisição para: %s", self.base_url)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Headers: %s", redact_headers(self.headers))
+            logger.debug("Payload: %s", order_data)
+            
+            with stage('remote'):
+                # Falhas transitórias são repetidas; com o circuito aberto falha na hora
+                response = await send_with_retry(
+                    client,
+                    "POST",
                     self.base_url,
-                    json=order_data,
+                    limiter=self.limiter,
+                    content=dumps_bytes(order_data),
                     headers=self.headers
                 )
-                
-                print(f"Status code: {response.status_code}")
-                print(f"Response: {response.text}")
-                
-                if response.status_code not in (200, 201):
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=f"Erro na integração com Matrix Cargo: {response.text}"
-                    )
-                    
-                return response.json()
-            except httpx.RequestError as e:
+            
+            logger.debug("Status code: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                # response.text decodifica o corpo inteiro: só com DEBUG ativo
+                logger.debug("Response: %s", response.text)
+            
+            if response.status_code not in (200, 201):
                 raise HTTPException(
-                    status_code=500,
-                    detail=f"Erro de comunicação com Matrix Cargo: {str(e)}"
-                )
\ No newline at end of file
+                    status_code=response.status_code,
+                    detail=f"Erro na integração com Matrix Cargo: {response.text}"
+                )
+                
+            return response.json()
+        except CircuitOpenError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Erro de comunicação com Matrix Cargo: {str(e)}"
+            )
\ No newline at end of file
@@ -0,0 +1,71 @@
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Conexões simultâneas com os sistemas externos e quantas ficam abertas para reuso
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+# Segundos que uma conexão ociosa é mantida aberta
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))
+# Timeout total de leitura/escrita e timeout de conexão, em segundos
+HTTP_TIMEOUT_SECONDS = float(os.getenv('HTTP_TIMEOUT_SECONDS', 30))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', 10))
+# HTTP/2 usa o pacote 'h2', instalado pelo extra httpx[http2] do requirements.txt
+HTTP_HTTP2 = os.getenv('HTTP_HTTP2', 'false').lower() in ('1', 'true', 'yes')
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    if not HTTP_HTTP2:
+        return False
+    if importlib.util.find_spec('h2') is None:
+        logger.warning("HTTP_HTTP2 ativo, mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+        return False
+    return True
+
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        verify=True,
+        timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+
+async def start_http_client() -> None:
+    """Cria o cliente compartilhado; chamado no startup da aplicação"""
+    global _client
+    if _client is None:
+        _client = _create_client()
+
+
+async def close_http_client() -> None:
+    """Fecha as conexões do cliente compartilhado; chamado no shutdown da aplicação"""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Cliente HTTP da aplicação, com pool de conexões reaproveitadas entre requisições.
+    Os headers de cada organização vão em cada chamada, nunca no cliente.
+    Fora do ciclo de vida da aplicação (scripts), o cliente é criado na primeira chamada.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from .database import IdempotencyRecord, SessionLocal
+from .db_executor import run_in_db_executor
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Por quanto tempo uma resposta guardada é devolvida para repetições
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+# Tempo máximo de um envio em andamento; depois disso outra requisição pode assumi-lo
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 120))
+# Quanto uma repetição simultânea espera o envio original terminar antes de desistir
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 30))
+
+_POLL_SECONDS = 0.2
+
+
+class IdempotencyConflict(Exception):
+    """A chave já foi usada com outro conteúdo"""
+
+
+class IdempotencyInProgress(Exception):
+    """Um envio com a mesma chave ainda está em andamento"""
+
+
+class IdempotentResponse(NamedTuple):
+    status_code: int
+    content: Any
+    replayed: bool
+
+
+class _Existing(NamedTuple):
+    request_hash: str
+    status: str
+    status_code: Optional[int]
+    response: Any
+
+
+def make_key(scope: str, organization_id: str, value: str) -> str:
+    """Chave do registro: hash do escopo ('trip', 'order'...), da organização e do valor"""
+    return hashlib.sha256(f"{scope}\x00{organization_id}\x00{value}".encode('utf-8')).hexdigest()
+
+
+def content_hash(payload: Any) -> str:
+    """Hash do conteúdo em JSON canônico (chaves ordenadas)"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _reserve(key: str, request_hash: str) -> Tuple[bool, Optional[_Existing]]:
+    """
+    Tenta reservar a chave para esta requisição.
+    A unicidade da coluna key garante que, entre requisições simultâneas, só uma insere;
+    registros vencidos, ou em andamento com a trava expirada, são assumidos com um UPDATE condicional.
+    Returns:
+        (True, None) se reservou, ou (False, registro existente)
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        values = {
+            "request_hash": request_hash,
+            "status": 'in_progress',
+            "status_code": None,
+            "response": None,
+            "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        }
+        db.add(IdempotencyRecord(key=key, **values))
+        try:
+            db.commit()
+            return True, None
+        except IntegrityError:
+            db.rollback()
+
+        taken = (
+            db.query(IdempotencyRecord)
+            .filter(
+                IdempotencyRecord.key == key,
+                or_(
+                    IdempotencyRecord.expires_at < now,
+                    and_(IdempotencyRecord.status == 'in_progress', IdempotencyRecord.locked_until < now)
+                )
+            )
+            .update({getattr(IdempotencyRecord, name): value for name, value in values.items()},
+                    synchronize_session=False)
+        )
+        db.commit()
+        if taken:
+            return True, None
+
+        record = db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).first()
+        if record is None:
+            # Removido entre o INSERT e a consulta: a próxima tentativa insere de novo
+            return False, None
+        return False, _Existing(record.request_hash, record.status, record.status_code, record.response)
+    finally:
+        db.close()
+
+
+def _complete(key: str, status_code: int, content: Any) -> None:
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).update({
+            IdempotencyRecord.status: 'completed',
+            IdempotencyRecord.status_code: status_code,
+            IdempotencyRecord.response: content,
+            IdempotencyRecord.locked_until: None
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _release(key: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyRecord).filter(
+            IdempotencyRecord.key == key, IdempotencyRecord.status == 'in_progress'
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def purge_expired() -> int:
+    """Remove os registros vencidos; chamado no startup"""
+    db = SessionLocal()
+    try:
+        removed = db.query(IdempotencyRecord).filter(
+            IdempotencyRecord.expires_at < datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return removed
+    finally:
+        db.close()
+
+
+async def run_idempotent(
+    key: str,
+    request_hash: str,
+    operation: Callable[[], Awaitable[Tuple[int, Any]]],
+    should_store: Callable[[int, Any], bool] = lambda status_code, content: status_code < 400
+) -> IdempotentResponse:
+    """
+    Executa operation() uma única vez por chave.
+    Repetições recebem a resposta guardada sem executar a operação; uma repetição
+    simultânea aguarda o envio original. Respostas que não devem ser guardadas
+    (should_store) e exceções liberam a chave, permitindo um novo envio.
+    Raises:
+        IdempotencyConflict: a chave já foi usada com outro conteúdo
+        IdempotencyInProgress: o envio original não terminou dentro de IDEMPOTENCY_WAIT_SECONDS
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        reserved, existing = await run_in_db_executor(_reserve, key, request_hash)
+        if reserved:
+            break
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                raise IdempotencyConflict("Chave de idempotência já utilizada com outro conteúdo")
+            if existing.status == 'completed':
+                return IdempotentResponse(existing.status_code, existing.response, True)
+        if time.monotonic() > deadline:
+            raise IdempotencyInProgress("Envio idêntico ainda em andamento")
+        await asyncio.sleep(_POLL_SECONDS)
+
+    try:
+        status_code, content = await operation()
+    except BaseException:
+        await run_in_db_executor(_release, key)
+        raise
+
+    if should_store(status_code, content):
+        await run_in_db_executor(_complete, key, status_code, content)
+    else:
+        await run_in_db_executor(_release, key)
+    return IdempotentResponse(status_code, content, False)
@@ -0,0 +1,444 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.orm.attributes import flag_modified
+
+from .database import IntegratedTrip
+from .db_executor import run_db
+from .logging_config import get_logger, stage
+
+logger = get_logger(__name__)
+
+# Por quanto tempo o total do histórico (por combinação de filtros) é reaproveitado, em segundos
+HISTORY_COUNT_CACHE_SECONDS = float(os.getenv('HISTORY_COUNT_CACHE_SECONDS', 30))
+# Caracteres da mensagem de erro incluídos na listagem; a mensagem inteira fica no detalhe
+HISTORY_ERROR_SNIPPET_CHARS = int(os.getenv('HISTORY_ERROR_SNIPPET_CHARS', 200))
+# Linhas antigas atualizadas por transação no preenchimento de stop_count/note_count
+SUMMARY_BACKFILL_BATCH_SIZE = int(os.getenv('SUMMARY_BACKFILL_BATCH_SIZE', 500))
+
+# Gravação dos resultados dos envios de viagem:
+#   strict   um commit por viagem, antes de responder (padrão)
+#   batched  as viagens entram em um buffer gravado em lotes (write-behind)
+TRIP_WRITE_MODE = os.getenv('TRIP_WRITE_MODE', 'strict').lower()
+if TRIP_WRITE_MODE not in ('strict', 'batched'):
+    raise ValueError(f"TRIP_WRITE_MODE inválido: {TRIP_WRITE_MODE}")
+# Durabilidade no modo batched:
+#   commit    quem grava espera o commit do lote em que a viagem entrou; nada se perde
+#             numa queda, e vários envios simultâneos dividem o mesmo commit
+#   buffered  retorna assim que a viagem entra no buffer; numa queda do processo
+#             perdem-se as viagens ainda não gravadas (até TRIP_WRITE_FLUSH_SECONDS)
+TRIP_WRITE_DURABILITY = os.getenv('TRIP_WRITE_DURABILITY', 'commit').lower()
+# O lote é gravado ao atingir este tamanho ou após este tempo desde a primeira viagem pendente
+TRIP_WRITE_BATCH_SIZE = int(os.getenv('TRIP_WRITE_BATCH_SIZE', 100))
+TRIP_WRITE_FLUSH_SECONDS = float(os.getenv('TRIP_WRITE_FLUSH_SECONDS', 0.05))
+# Viagens pendentes acima das quais quem grava espera o lote atual ser gravado
+TRIP_WRITE_MAX_PENDING = int(os.getenv('TRIP_WRITE_MAX_PENDING', 1000))
+
+
+class InvalidCursor(ValueError):
+    """Cursor de paginação malformado"""
+
+
+class HistoryFilters(NamedTuple):
+    status: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+
+class HistoryPage(NamedTuple):
+    items: List[Dict[str, Any]]
+    total: int
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def _trip_record(
+    external_id: str,
+    trip_data: Any,
+    status: str,
+    matrix_cargo_response: Any = None,
+    error_message: Optional[str] = None
+) -> Dict[str, Any]:
+    stop_count, note_count = _trip_counts(trip_data)
+    return {
+        "external_id": external_id,
+        "trip_data": trip_data,
+        "matrix_cargo_response": matrix_cargo_response,
+        "status": status,
+        "error_message": error_message,
+        "stop_count": stop_count,
+        "note_count": note_count,
+        # Hora do envio, não a da gravação do lote, para manter a ordem do histórico
+        "created_at": datetime.utcnow()
+    }
+
+
+def _save(db: Session, records: List[Dict[str, Any]]) -> None:
+    """Grava as viagens em uma única transação"""
+    db.add_all([IntegratedTrip(**record) for record in records])
+    with stage('db_commit'):
+        db.commit()
+
+
+def _trip_counts(trip_data: Any) -> Tuple[int, int]:
+    stops = (trip_data or {}).get('stops') or []
+    return len(stops), sum(len(stop.get('notes') or []) for stop in stops)
+
+
+def _get(db: Session, external_id: str) -> Optional[IntegratedTrip]:
+    return db.query(IntegratedTrip).filter(IntegratedTrip.external_id == external_id).first()
+
+
+def encode_cursor(trip: Any) -> str:
+    """Cursor opaco com a chave de ordenação (created_at, id) da viagem"""
+    raw = json.dumps([trip.created_at.isoformat(), trip.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, trip_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(trip_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Cursor de paginação inválido") from e
+
+
+# Colunas da listagem: os JSONs (trip_data, matrix_cargo_response) só são lidos no detalhe
+_SUMMARY_COLUMNS = (
+    IntegratedTrip.id,
+    IntegratedTrip.external_id,
+    IntegratedTrip.status,
+    IntegratedTrip.created_at,
+    IntegratedTrip.stop_count,
+    IntegratedTrip.note_count,
+    func.substr(IntegratedTrip.error_message, 1, HISTORY_ERROR_SNIPPET_CHARS).label('error_message'),
+)
+
+
+def _filtered(db: Session, filters: HistoryFilters, *columns: Any) -> Query:
+    query = db.query(*columns) if columns else db.query(IntegratedTrip)
+    if filters.status:
+        query = query.filter(IntegratedTrip.status == filters.status)
+    if filters.created_from:
+        query = query.filter(IntegratedTrip.created_at >= filters.created_from)
+    if filters.created_to:
+        query = query.filter(IntegratedTrip.created_at < filters.created_to)
+    return query
+
+
+_COUNT_CACHE_MAX_ENTRIES = 256
+_count_cache: Dict[HistoryFilters, Tuple[float, int]] = {}
+_count_lock = threading.Lock()
+
+
+def _count(db: Session, filters: HistoryFilters) -> int:
+    """
+    Total aproximado: o COUNT percorre todo o índice, então o resultado é reaproveitado
+    por HISTORY_COUNT_CACHE_SECONDS e pode não incluir as viagens gravadas nesse intervalo
+    """
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(filters)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    total = _filtered(db, filters).count()
+    with _count_lock:
+        if len(_count_cache) >= _COUNT_CACHE_MAX_ENTRIES:
+            # Filtros de data variam muito; sem limite o cache cresceria a cada consulta
+            _count_cache.clear()
+        _count_cache[filters] = (now + HISTORY_COUNT_CACHE_SECONDS, total)
+    return total
+
+
+def _list_keyset(
+    db: Session,
+    size: int,
+    filters: HistoryFilters,
+    cursor: Optional[str],
+    backwards: bool
+) -> HistoryPage:
+    key = tuple_(IntegratedTrip.created_at, IntegratedTrip.id)
+    query = _filtered(db, filters, *_SUMMARY_COLUMNS)
+
+    # Das mais recentes para as mais antigas; para voltar, lê no sentido contrário a
+    # partir do cursor e inverte. Um item a mais indica se existe página seguinte
+    if cursor is None:
+        rows = query.order_by(IntegratedTrip.created_at.desc(), IntegratedTrip.id.desc()).limit(size + 1).all()
+    elif backwards:
+        rows = query.filter(key > decode_cursor(cursor))\
+            .order_by(IntegratedTrip.created_at.asc(), IntegratedTrip.id.asc())\
+            .limit(size + 1)\
+            .all()
+    else:
+        rows = query.filter(key < decode_cursor(cursor))\
+            .order_by(IntegratedTrip.created_at.desc(), IntegratedTrip.id.desc())\
+            .limit(size + 1)\
+            .all()
+
+    has_more = len(rows) > size
+    items = rows[:size]
+    if backwards:
+        items.reverse()
+        has_newer, has_older = has_more, cursor is not None
+    else:
+        has_newer, has_older = cursor is not None, has_more
+
+    return HistoryPage(
+        items=[row._asdict() for row in items],
+        total=_count(db, filters),
+        next_cursor=encode_cursor(items[-1]) if items and has_older else None,
+        prev_cursor=encode_cursor(items[0]) if items and has_newer else None
+    )
+
+
+def _list_page(db: Session, page: int, size: int, filters: HistoryFilters) -> Tuple[int, List[Dict[str, Any]]]:
+    trips = _filtered(db, filters, *_SUMMARY_COLUMNS)\
+        .order_by(IntegratedTrip.created_at.desc(), IntegratedTrip.id.desc())\
+        .offset((page - 1) * size)\
+        .limit(size)\
+        .all()
+    return _count(db, filters), [row._asdict() for row in trips]
+
+
+def _backfill_batch(db: Session, batch_size: int) -> int:
+    """
+    Preenche stop_count/note_count de linhas antigas e regrava seus JSONs,
+    que passam a ficar comprimidos. Retorna quantas linhas foram atualizadas.
+    """
+    trips = db.query(IntegratedTrip).filter(IntegratedTrip.stop_count.is_(None)).limit(batch_size).all()
+    for trip in trips:
+        trip.stop_count, trip.note_count = _trip_counts(trip.trip_data)
+        flag_modified(trip, 'trip_data')
+        if trip.matrix_cargo_response is not None:
+            flag_modified(trip, 'matrix_cargo_response')
+    db.commit()
+    return len(trips)
+
+
+class TripWriteBuffer:
+    """
+    Buffer write-behind dos resultados de envio (TRIP_WRITE_MODE=batched).
+
+    As viagens se acumulam e são gravadas em uma transação por lote, ao atingir
+    TRIP_WRITE_BATCH_SIZE ou TRIP_WRITE_FLUSH_SECONDS após a primeira pendente, trocando
+    um commit por viagem por um commit por lote. Se o lote falhar (ex. external_id
+    repetido), as viagens são regravadas uma a uma para isolar a que falhou.
+    Viagens pendentes continuam visíveis por external_id (get_integrated_trip), mas só
+    aparecem na listagem do histórico depois de gravadas. Usado apenas a partir do event loop.
+    """
+
+    def __init__(self, batch_size: int = TRIP_WRITE_BATCH_SIZE, flush_seconds: float = TRIP_WRITE_FLUSH_SECONDS,
+                 durability: str = TRIP_WRITE_DURABILITY, max_pending: int = TRIP_WRITE_MAX_PENDING):
+        if durability not in ('commit', 'buffered'):
+            raise ValueError(f"TRIP_WRITE_DURABILITY inválido: {durability}")
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = flush_seconds
+        self.durability = durability
+        self.max_pending = max(max_pending, self.batch_size)
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self._pending: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]] = []
+        self._by_external_id: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._has_pending: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(
+            "Gravação de viagens em lotes de até %d a cada %.3fs (durabilidade: %s)",
+            self.batch_size, self.flush_seconds, self.durability
+        )
+
+    async def stop(self) -> None:
+        """Encerra o flush periódico e grava tudo o que estiver pendente"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    def pending(self, external_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_external_id.get(external_id)
+
+    async def add(self, record: Dict[str, Any]) -> None:
+        if len(self._pending) >= self.max_pending:
+            # Banco mais lento que os envios: quem grava ajuda a esvaziar o buffer
+            await self.flush()
+        future = asyncio.get_running_loop().create_future() if self.durability == 'commit' else None
+        self._pending.append((record, future))
+        self._by_external_id[record["external_id"]] = record
+        self._has_pending.set()
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        if future is not None:
+            # shield: cancelar a requisição não tira a viagem do lote
+            await asyncio.shield(future)
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                # shield: um stop() no meio do lote não abandona quem espera o commit
+                await asyncio.shield(self.flush())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Erro ao gravar lote de viagens")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                if len(self._pending) < self.batch_size:
+                    self._full.clear()
+                if not self._pending:
+                    self._has_pending.clear()
+                await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]) -> None:
+        records = [record for record, _ in batch]
+        try:
+            await run_db(_save, records)
+            outcomes: List[Optional[BaseException]] = [None] * len(batch)
+        except Exception as e:
+            logger.warning("Lote de %d viagens falhou (%s); gravando uma a uma", len(batch), e)
+            outcomes = []
+            for record in records:
+                try:
+                    await run_db(_save, [record])
+                    outcomes.append(None)
+                except Exception as record_error:
+                    logger.error("Viagem %s não foi gravada: %s", record["external_id"], record_error)
+                    outcomes.append(record_error)
+
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        for (record, future), error in zip(batch, outcomes):
+            if error is None:
+                self.written += 1
+            else:
+                self.failed += 1
+            if self._by_external_id.get(record["external_id"]) is record:
+                del self._by_external_id[record["external_id"]]
+            if future is not None and not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": TRIP_WRITE_MODE,
+            "durability": self.durability,
+            "batch_size": self.batch_size,
+            "flush_seconds": self.flush_seconds,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+            "last_batch_size": self.last_batch_size
+        }
+
+
+# Iniciado no startup apenas com TRIP_WRITE_MODE=batched
+trip_write_buffer = TripWriteBuffer()
+
+
+# Toda leitura e escrita de IntegratedTrip passa pelas threads do banco (db_executor),
+# nunca pelo event loop
+
+async def save_integrated_trip(
+    external_id: str,
+    trip_data: Any,
+    status: str,
+    matrix_cargo_response: Any = None,
+    error_message: Optional[str] = None
+) -> None:
+    """
+    Registra o resultado do envio de uma viagem ('success' ou 'error'): no modo strict,
+    com commit próprio; no batched, pelo buffer, conforme TRIP_WRITE_DURABILITY
+    """
+    record = _trip_record(external_id, trip_data, status, matrix_cargo_response, error_message)
+    if trip_write_buffer.running:
+        await trip_write_buffer.add(record)
+    else:
+        await run_db(_save, [record])
+
+
+async def get_integrated_trip(external_id: str) -> Optional[IntegratedTrip]:
+    """Viagem completa, com trip_data e matrix_cargo_response; inclui as ainda no buffer"""
+    record = trip_write_buffer.pending(external_id)
+    if record is not None:
+        return IntegratedTrip(**record)
+    return await run_db(_get, external_id)
+
+
+async def backfill_summary_columns() -> int:
+    """
+    Atualiza as linhas gravadas antes das colunas de resumo, em lotes pequenos para
+    não segurar as threads do banco. Roda em segundo plano a partir do startup.
+    """
+    updated = 0
+    try:
+        while True:
+            batch = await run_db(_backfill_batch, SUMMARY_BACKFILL_BATCH_SIZE)
+            updated += batch
+            if batch < SUMMARY_BACKFILL_BATCH_SIZE:
+                break
+    except Exception:
+        # Ninguém aguarda esta tarefa: sem o log a falha passaria despercebida
+        logger.exception("Erro ao preencher stop_count/note_count após %d viagens", updated)
+        return updated
+    if updated:
+        logger.info("stop_count/note_count preenchidos em %d viagens antigas", updated)
+    return updated
+
+
+async def list_integrated_trips_page(
+    size: int,
+    filters: HistoryFilters,
+    cursor: Optional[str] = None,
+    backwards: bool = False
+) -> HistoryPage:
+    """
+    Resumo de uma página do histórico, das viagens mais recentes para as mais antigas, por cursor:
+    sem cursor, a primeira; com backwards, a anterior ao cursor. O custo não cresce
+    com a posição da página, ao contrário de OFFSET.
+    Raises:
+        InvalidCursor: o cursor não foi gerado por esta função
+    """
+    return await run_db(_list_keyset, size, filters, cursor, backwards)
+
+
+async def list_integrated_trips(page: int, size: int, filters: HistoryFilters) -> Tuple[int, List[Dict[str, Any]]]:
+    """Paginação numerada (OFFSET), mantida para clientes que ainda enviam ?page="""
+    return await run_db(_list_page, page, size, filters)
@@ -0,0 +1,32 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele usa o json da biblioteca padrão
+    orjson = None
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    JSON em UTF-8 para corpos de requisição; usa orjson quando instalado (requirements.txt).
+    O conteúdo é o mesmo do json da biblioteca padrão, mas os bytes diferem: sem espaços
+    após ',' e ':' e com acentos em UTF-8 em vez de escapes \\uXXXX.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def dumps(obj: Any) -> str:
+    """JSON como texto, usado pelo SQLAlchemy para as colunas JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
+
+def loads(data: Any) -> Any:
+    """Lê JSON de bytes ou texto; usa orjson quando instalado"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
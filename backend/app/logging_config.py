@@ -0,0 +1,106 @@
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+# Nível de log da aplicação (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Quando ativo, registra a duração de cada etapa (parse, validate,
+# extract, remote, db_commit) ao final de cada requisição
+LOG_TIMINGS = os.getenv('LOG_TIMINGS', 'false').lower() in ('1', 'true', 'yes')
+
+_TOKEN_PATTERN = re.compile(r'(Bearer\s+)[^\s\'",}]+', re.IGNORECASE)
+_SENSITIVE_HEADERS = frozenset({'authorization', 'proxy-authorization', 'cookie', 'set-cookie'})
+
+_NO_TIMING = nullcontext()
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('stage_timings', default=None)
+
+
+def redact(text: str) -> str:
+    """Remove tokens Bearer de um texto"""
+    return _TOKEN_PATTERN.sub(r'\1***', text)
+
+
+def redact_headers(headers: Mapping[str, Any]) -> Dict[str, Any]:
+    """Cópia dos headers com os valores de autenticação mascarados"""
+    return {
+        key: '***' if key.lower() in _SENSITIVE_HEADERS else value
+        for key, value in headers.items()
+    }
+
+
+class RedactingFilter(logging.Filter):
+    """Garante que nenhum token Bearer chegue aos handlers"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        redacted = redact(message)
+        if redacted != message:
+            record.msg = redacted
+            record.args = None
+        return True
+
+
+def configure_logging() -> None:
+    """Configura o logger 'app' uma única vez; chamadas seguintes não têm efeito"""
+    logger = logging.getLogger('app')
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler.addFilter(RedactingFilter())
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger filho de 'app'; use formatação preguiçosa (logger.debug('%s', x))"""
+    return logging.getLogger(name if name.startswith('app') else f'app.{name}')
+
+
+@contextmanager
+def _measure(timings: Dict[str, float], name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def stage(name: str):
+    """
+    Context manager que soma a duração da etapa às medições da requisição atual.
+    Sem LOG_TIMINGS, ou fora de uma requisição medida, não faz nada.
+    """
+    if not LOG_TIMINGS:
+        return _NO_TIMING
+    timings = _timings.get()
+    if timings is None:
+        return _NO_TIMING
+    return _measure(timings, name)
+
+
+def start_timings() -> Optional[Dict[str, float]]:
+    """Inicia as medições para o contexto atual (requisição ou processo do pool)"""
+    if not LOG_TIMINGS:
+        return None
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def merge_timings(timings: Optional[Dict[str, float]]) -> None:
+    """Soma medições feitas em outro processo às da requisição atual"""
+    current = _timings.get()
+    if current is None or not timings:
+        return
+    for name, duration in timings.items():
+        current[name] = current.get(name, 0.0) + duration
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    return ' '.join(f'{name}={duration * 1000:.1f}ms' for name, duration in timings.items())
@@ -1,24 +1,37 @@
 from typing import List, Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from . import xml_processor
+from .archive_processor import process_archive
 from pydantic import BaseModel
-import os
-from datetime import datetime, timezone, timedelta
-from .models import Trip
-from .external_api import MatrixcargoTracking
-from .external_api import MatrixcargoPainelLogistico
-from sqlalchemy.orm import Session
-from fastapi import Depends
-from .database import get_db, IntegratedTrip
+from datetime import datetime, timezone
+from .models import OrderRequest, Trip
+from . import idempotency, outbox
+from .submissions import new_trip_external_id, stream_orders, submit_orders, submit_trip
+from .http_client import close_http_client, start_http_client
+from .organizations import get_organizations_cached
+from .adaptive_limit import adaptive_limit_stats
+from .db_executor import run_db, run_in_db_executor, shutdown_db_executor, start_db_executor
+from .integrated_trips import (
+    TRIP_WRITE_MODE, HistoryFilters, InvalidCursor, backfill_summary_columns, get_integrated_trip,
+    list_integrated_trips, list_integrated_trips_page, trip_write_buffer
+)
+import asyncio
 import json
-import random
 from sqlalchemy.orm.decl_api import DeclarativeMeta
 from typing import Any
 import csv
 import io
 import pytz
-import httpx
+import time
+from .logging_config import (
+    LOG_TIMINGS, configure_logging, format_timings, get_logger, start_timings
+)
+
+configure_logging()
+logger = get_logger(__name__)
 
 app = FastAPI(
     title="Matrix Cargo Integration API",
@@ -36,19 +49,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add environment variables for Matrix Cargo API
-MATRIXCARGO_TRACKING_API_URL = os.getenv('MATRIXCARGO_TRACKING_API_URL', 'https://tracking-api.matrixcargo.com.br/api/v1/external')
-MATRIXCARGO_PAINEL_LOGISTICO_API_URL = os.getenv('MATRIXCARGO_PAINEL_LOGISTICO_API_URL', 'https://painel-logistico-api.matrixcargo.com.br/api/v1')
+# URLs da Matrix Cargo e limites de envio de pedidos: ver external_api e submissions
 # Adicione este modelo para a resposta paginada
 class PaginatedTrips(BaseModel):
     items: List[dict]
     total: int
-    page: int
+    page: Optional[int] = None
     size: int
     pages: int
+    # Paginação por cursor: passe next_cursor (ou prev_cursor com direction=prev) em ?cursor=
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+if LOG_TIMINGS:
+    @app.middleware("http")
+    async def log_stage_timings(request, call_next):
+        # Só é registrado com LOG_TIMINGS, para não pesar nas requisições comuns
+        timings = start_timings()
+        start = time.perf_counter()
+        response = await call_next(request)
+        timings['total'] = time.perf_counter() - start
+        logger.info("%s %s %s", request.method, request.url.path, format_timings(timings))
+        return response
+
+@app.on_event("startup")
+async def startup_event():
+    # Cliente HTTP compartilhado por todas as chamadas à Matrix Cargo
+    await start_http_client()
+    # Threads dedicadas ao banco: nenhuma consulta ou commit roda no event loop
+    start_db_executor()
+    # Resultados dos envios de viagem gravados em lotes (write-behind), se configurado
+    if TRIP_WRITE_MODE == 'batched':
+        trip_write_buffer.start()
+    # Jobs do outbox que não terminaram dentro da validade do token, antes dos workers
+    await run_in_db_executor(outbox.purge_expired_tokens)
+    # Workers que drenam o outbox dos envios assíncronos
+    outbox.worker_pool.start()
+    # Respostas de idempotência vencidas
+    await run_in_db_executor(idempotency.purge_expired)
+    # Contagens de paradas/notas e compressão dos JSONs das viagens gravadas antes disso
+    app.state.summary_backfill = asyncio.ensure_future(backfill_summary_columns())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Encerra os processos usados no parsing dos XMLs
+    xml_processor.shutdown_process_pool()
+    app.state.summary_backfill.cancel()
+    await outbox.worker_pool.stop()
+    # Grava as viagens ainda no buffer, inclusive as dos workers que acabaram de parar
+    await trip_write_buffer.stop()
+    await close_http_client()
+    # Depois dos workers, para que os resultados já enfileirados sejam gravados
+    shutdown_db_executor()
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+async def _stream_upload_results(files: List[UploadFile]):
+    """Gera uma linha NDJSON por arquivo, assim que ele é processado, e uma linha final de resumo"""
+    processed = 0
+    failed = 0
+    async for filename, data, errors in xml_processor.iter_xml_files(files):
+        if errors is not None:
+            failed += 1
+            line = {"type": "error", "filename": filename, "errors": errors}
+        else:
+            processed += 1
+            line = {"type": "note", "filename": filename, "data": data.to_dict()}
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    yield json.dumps({
+        "type": "summary",
+        "total": processed + failed,
+        "processed": processed,
+        "failed": failed
+    }) + "\n"
 
 @app.post("/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+async def upload_files(
+    files: List[UploadFile] = File(...),
+    stream: bool = False,
+    accept: Optional[str] = Header(None)
+):
+    # Modo streaming: escolhido por ?stream=true ou Accept: application/x-ndjson
+    if stream or (accept and NDJSON_MEDIA_TYPE in accept):
+        return StreamingResponse(_stream_upload_results(files), media_type=NDJSON_MEDIA_TYPE)
+
     try:
         # Processa os arquivos XML
         result = await xml_processor.process_xml_files(files)
@@ -57,8 +143,9 @@ async def upload_files(files: List[UploadFile] = File(...)):
         if not result.get("processed_data"):
             raise ValueError("Nenhum dado foi processado dos arquivos")
         
+        # Os registros compactos só viram dicts aqui, na montagem da resposta
         return {
-            "processed_data": result["processed_data"],
+            "processed_data": [note.to_dict() for note in result["processed_data"]],
             "validation_errors": result.get("validation_errors", {})
         }
         
@@ -67,6 +154,50 @@ async def upload_files(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/upload/archive")
+async def upload_archive(file: UploadFile = File(...)):
+    """Recebe um arquivo zip ou tar.gz de XMLs e processa os membros um a um"""
+    try:
+        # A leitura do arquivo compactado é bloqueante: roda no threadpool
+        result = await run_in_threadpool(process_archive, file.file)
+        
+        if not result.get("processed_data"):
+            raise ValueError("Nenhum dado foi processado dos arquivos")
+        
+        # Os registros compactos só viram dicts aqui, na montagem da resposta
+        return {
+            "processed_data": [note.to_dict() for note in result["processed_data"]],
+            "validation_errors": result.get("validation_errors", {})
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/upload/cache/stats")
+async def get_upload_cache_stats():
+    """Contadores do cache de NF-es já processadas"""
+    return xml_processor.nfe_cache.stats()
+
+@app.get("/upstream/limits")
+async def get_upstream_limits():
+    """Limite de concorrência adaptativo e latência observada por host da Matrix Cargo e organização"""
+    return {"limiters": adaptive_limit_stats()}
+
+@app.get("/trips/write-buffer")
+async def get_trip_write_buffer():
+    """Modo de gravação dos resultados de viagem e contadores dos lotes"""
+    return trip_write_buffer.stats()
+
+@app.get("/upload/cache/notes/{chave_acesso}")
+async def get_cached_note(chave_acesso: str):
+    """Busca no cache uma NF-e já processada pela chave de acesso"""
+    data = xml_processor.nfe_cache.get_by_chave(chave_acesso)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Nota fiscal não encontrada no cache")
+    return data.to_dict()
+
 @app.get("/")
 async def root():
     return {"message": "API XML Processor está funcionando!"} 
@@ -81,10 +212,23 @@ async def create_trip(trip: Trip):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _idempotent_response(key: str, request_hash: str, operation, **kwargs) -> JSONResponse:
+    """Executa o envio uma única vez por chave; repetições recebem a resposta guardada"""
+    try:
+        response = await idempotency.run_idempotent(key, request_hash, operation, **kwargs)
+    except idempotency.IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except idempotency.IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    headers = {"Idempotent-Replayed": "true"} if response.replayed else None
+    return JSONResponse(status_code=response.status_code, content=response.content, headers=headers)
+
 @app.post("/trips/matrix-cargo")
 async def create_matrix_cargo_trip(
     trip: Trip, 
-    db: Session = Depends(get_db),
+    asynchronous: bool = Query(False, alias="async"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     authorization: str = Header(None),
     organization_id: str = Header(None, alias="Organization-Id"),
     workspace_id: str = Header(None, alias="Workspace-Id")
@@ -98,170 +242,33 @@ async def create_matrix_cargo_trip(
     if not workspace_id:
         raise HTTPException(status_code=401, detail="Workspace ID não fornecido")
 
-    try:
-        # Generate a unique externalId in the specific format
-        timestamp = datetime.now()
-        generated_external_id = f"{timestamp.strftime('%Y%m%d%H%M%S')}{random.randint(1000,9999)}"
-
-        # Transform trip data to Matrix Cargo format
-        matrix_cargo_data = {
-            "externalId": generated_external_id,
-            "licensePlates": [trip.vehicle.plate],
-            "estimatedStart": datetime.now(timezone.utc).isoformat(),
-            "tripDetails": {},
-            "transporter": {
-                "cnpj": "29551997000150",
-                "name": "Regler",
-                "abbreviation": "RGL",
-                "email": "contact2@matrixcargo.com"
-            },
-            "workspace": {
-                "id": workspace_id,
-                "name": "Operação"
-            },
-            "customer": {
-                "cnpj": "29551997000150",
-                "name": "Regler"
-            },
-            "driver": {
-                "name": trip.driver.name,
-                "cpf": trip.driver.document,
-                "email": f"driver{random.randint(1000,99999)}@matrixcargo.com",
-                "phone": "+5500000000000"
-            },
-            "tags": [
-                {
-                    "name": "INTEGRATION"
-                }
-            ],
-            "tripStops": [
-                {
-                    "type": "PICKUP" if stop.type == "COLETA" else "DELIVERY",
-                    "sequence": idx,
-                    "weightInGrams": int(sum(note.transporte.pesoBruto * 1000 for note in stop.notes)),
-                    "volumeInCubicMillimeters": int(sum(note.transporte.volume * 1000000000 for note in stop.notes)),
-                    "timeWindowStart": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
-                    "timeWindowEnd": (datetime.now(timezone.utc) + timedelta(days=1, hours=2)).isoformat(),
-                    "requiresPickupInvoice": False,
-                    "requiresProofOfDelivery": stop.type == "ENTREGA",
-                    "proofOfDeliveryDetails": [
-                        {
-                            "type": "CANHOTO_NOTA_FISCAL",
-                            "quantity": 1,
-                            "identifier": note.chaveAcesso
-                        } for note in stop.notes
-                    ] if stop.type == "ENTREGA" else [],
-                    "servicePoint": {
-                        "name": stop.companyName,
-                        "cnpj": stop.cnpj,
-                        "address": {
-                            "street": stop.address.logradouro,
-                            "number": stop.address.numero,
-                            "neighborhood": stop.address.bairro,
-                            "complement": "",
-                            "country": "BRASIL",
-                            "city": stop.address.municipio,
-                            "state": stop.address.uf,
-                            "zipCode": stop.address.cep,
-                            "latitude": "0",
-                            "longitude": "0"
-                        }
-                    },
-                    "orders": [
-                        {
-                            "externalId": note.chaveAcesso,
-                            "items": [
-                                {
-                                    "code": note.numeroNF,
-                                    "description": "NF",
-                                    "weightInGrams": int(note.transporte.pesoBruto * 1000),
-                                    "volumeInCubicMillimeters": int(note.transporte.volume * 1000000000),
-                                    "unitOfMeasure": "UN",
-                                    "quantity": 1,
-                                    "unitPriceInCents": 0,
-                                    "totalPriceInCents": 0
-                                }
-                            ]
-                        } for note in stop.notes
-                    ]
-                } for idx, stop in enumerate(trip.stops)
-            ]
-        }
-
-        print(f"Dados preparados para envio: {json.dumps(matrix_cargo_data, indent=2)}")
-
-        try:
-            # Inicializar o client com o token recebido do frontend
-
-            token = authorization.replace('Bearer ', '')
-
-            matrix_cargo_client = MatrixcargoTracking(
-                MATRIXCARGO_TRACKING_API_URL, 
-                token, 
-                organization_id,
-                workspace_id
+    token = authorization.replace('Bearer ', '')
+    trip_payload = trip.dict()
+
+    async def send():
+        # Modo assíncrono: grava no outbox e retorna o job na hora
+        if asynchronous:
+            external_id = new_trip_external_id()
+            job = await run_db(
+                outbox.enqueue_job, 'trip', [{"externalId": external_id, "trip": trip_payload}],
+                token, organization_id, workspace_id
             )
+            return 202, {"jobId": job.id, "status": job.status, "total": job.total, "externalId": external_id}
 
-            # Primeiro tenta enviar para a Matrix Cargo
-            result = await matrix_cargo_client.create_trip(matrix_cargo_data)
-            print(f"Resposta da Matrix Cargo: {result}")
-            
-            # Se chegou aqui, deu sucesso. Agora salva no banco
-            integrated_trip = IntegratedTrip(
-                external_id=generated_external_id,
-                trip_data=json.loads(trip.json()),
-                matrix_cargo_response=result,
-                status='success'
-            )
-            db.add(integrated_trip)
-            db.commit()
-            
-            return {
-                "externalId": generated_external_id,
-                "matrix_cargo_response": result
-            }
+        return 200, await submit_trip(trip, token, organization_id, workspace_id)
 
-        except HTTPException as api_error:
-            error_detail = str(api_error.detail)
-            print(f"Erro na API da Matrix Cargo: {error_detail}")
-            
-            # Se falhou na Matrix Cargo, salva o erro no banco
-            integrated_trip = IntegratedTrip(
-                external_id=generated_external_id,
-                trip_data=json.loads(trip.json()),
-                status='error',
-                error_message=error_detail
-            )
-            db.add(integrated_trip)
-            db.commit()
-            
-            raise HTTPException(
-                status_code=api_error.status_code,
-                detail=f"Erro na integração com Matrix Cargo: {error_detail}"
-            )
+    # Sem Idempotency-Key cada chamada é um envio novo: reenviar a mesma viagem de propósito
+    # não pode devolver a resposta antiga
+    if not idempotency_key:
+        status_code, content = await send()
+        return JSONResponse(status_code=status_code, content=content)
 
-    except Exception as e:
-        import traceback
-        error_msg = f"{str(e)}\n{traceback.format_exc()}"
-        print(f"Erro não tratado: {error_msg}")
-        
-        # Erro geral - tenta salvar no banco, mas não falha se não conseguir
-        try:
-            integrated_trip = IntegratedTrip(
-                external_id=generated_external_id,
-                trip_data=json.loads(trip.json()),
-                status='error',
-                error_message=error_msg
-            )
-            db.add(integrated_trip)
-            db.commit()
-        except Exception as db_error:
-            print(f"Failed to store error in database: {str(db_error)}")
-        
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro ao processar viagem: {error_msg}"
-        )
+    # Reenvios com a mesma chave recebem a resposta guardada; o modo faz parte do escopo
+    # para que um reenvio síncrono não receba o job de um envio assíncrono (e vice-versa)
+    request_hash = idempotency.content_hash(trip_payload)
+    scope = 'trip-async' if asynchronous else 'trip-sync'
+    key = idempotency.make_key(scope, organization_id, idempotency_key)
+    return await _idempotent_response(key, request_hash, send)
 
 def serialize_sqlalchemy(obj: Any) -> Any:
     """Serializa objetos SQLAlchemy e tipos Python complexos para JSON."""
@@ -287,21 +294,36 @@ def serialize_sqlalchemy(obj: Any) -> Any:
 
 @app.get("/trips/integration-history", response_model=PaginatedTrips)
 async def get_integration_history(
-    db: Session = Depends(get_db),
-    page: int = 1,
-    size: int = 10
+    page: Optional[int] = Query(None, ge=1),
+    size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    direction: str = Query("next", regex="^(next|prev)$"),
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None
 ):
-    offset = (page - 1) * size
-    total = db.query(IntegratedTrip).count()
+    """
+    Histórico das viagens integradas, das mais recentes para as mais antigas.
+    Pagina por cursor (cursor + direction); ?page= sem cursor mantém a paginação
+    numerada antiga. O total é aproximado (reaproveitado por alguns segundos).
+    Cada item traz só o resumo (contagens e início do erro); os JSONs completos
+    ficam em /trips/integration-history/{external_id}.
+    """
+    filters = HistoryFilters(status, _as_naive_utc(created_from), _as_naive_utc(created_to))
+
+    if page is not None and cursor is None:
+        total, trips = await list_integrated_trips(page, size, filters)
+        next_cursor = prev_cursor = None
+    else:
+        try:
+            history = await list_integrated_trips_page(size, filters, cursor, backwards=direction == "prev")
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        total, trips = history.total, history.items
+        next_cursor, prev_cursor = history.next_cursor, history.prev_cursor
     total_pages = (total + size - 1) // size
     
-    trips = db.query(IntegratedTrip)\
-        .order_by(IntegratedTrip.created_at.desc())\
-        .offset(offset)\
-        .limit(size)\
-        .all()
-    
-    # Serializa os objetos SQLAlchemy
+    # Serializa as datas do resumo
     trips_dict = [serialize_sqlalchemy(trip) for trip in trips]
     
     return {
@@ -309,9 +331,25 @@ async def get_integration_history(
         "total": total,
         "page": page,
         "size": size,
-        "pages": total_pages
+        "pages": total_pages,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor
     }
 
+def _as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """created_at é gravado em UTC sem fuso; datas com fuso são convertidas"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+@app.get("/trips/integration-history/{external_id}")
+async def get_integration_history_detail(external_id: str):
+    """Viagem integrada completa: trip_data, resposta da Matrix Cargo e mensagem de erro inteira"""
+    trip = await get_integrated_trip(external_id)
+    if trip is None:
+        raise HTTPException(status_code=404, detail="Viagem não encontrada no histórico")
+    return serialize_sqlalchemy(trip)
+
 @app.post("/orders/upload")
 async def upload_orders(file: UploadFile = File(...)):
     try:
@@ -370,43 +408,6 @@ async def upload_orders(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-def transform_order_to_matrix_cargo_format(order: dict) -> dict:
-    """Transforma o pedido para o formato esperado pela API do Matrixcargo Painel Logistico"""
-    return {
-        "externalId": order["id"],
-        "cliente": {
-            "cnpj": order["customerCNPJ"],
-            "nome": order["customerName"]
-        },
-        "pontoServicoOrigem": {
-            "cnpj": order["originCNPJ"],
-            "nome": order["originName"]
-        },
-        "dataColeta": order["pickupDate"],
-        "pontoServicoDestino": {
-            "cnpj": order["destinationCNPJ"],
-            "nome": order["destinationName"]
-        },
-        "dataEntrega": order["deliveryDate"],
-        "mercadoriaPerigosa": order["isDangerous"],
-        "precisaDeEscolta": order["needsEscort"],
-        "itens": [
-            {
-                "codigo": order["itemCode"],
-                "descricao": order["itemDescription"],
-                "m3": order["itemVolume"],
-                "peso": order["itemWeight"],
-                "quantidade": order["itemQuantity"],
-                "unidade": order["itemUnit"],
-                "valorUnitario": order["itemUnitPrice"]
-            }
-        ],
-        "tipoMercadoria": {
-            "ativo": True,
-            "descricao": order["merchandiseType"]
-        }
-    }
-
 class Workspace(BaseModel):
     id: str
     name: str
@@ -419,35 +420,24 @@ class Organization(BaseModel):
 class OrganizationResponse(BaseModel):
     data: List[Organization]
 
-# Add new models for order validation
-class OrderRequest(BaseModel):
-    id: str
-    uniqueId: str
-    customerCNPJ: str
-    customerName: str
-    originCNPJ: str
-    originName: str
-    pickupDate: str
-    destinationCNPJ: str
-    destinationName: str
-    deliveryDate: str
-    itemCode: str
-    itemDescription: str
-    itemVolume: float
-    itemWeight: float
-    itemQuantity: int
-    itemUnit: str
-    itemUnitPrice: float
-    merchandiseType: str
-    isDangerous: bool
-    needsEscort: bool
+async def _ndjson_events(events):
+    async for event in events:
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+async def _sse_events(events):
+    async for event in events:
+        yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
 
 @app.post("/orders/matrix-cargo")
 async def create_matrix_cargo_orders(
     orders: List[OrderRequest],
+    asynchronous: bool = Query(False, alias="async"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     authorization: str = Header(None),
     organization_id: str = Header(None, alias="Organization-Id"),
-    workspace_id: str = Header(None, alias="Workspace-Id")
+    workspace_id: str = Header(None, alias="Workspace-Id"),
+    stream: bool = False,
+    accept: Optional[str] = Header(None)
 ):
     if not authorization:
         raise HTTPException(status_code=401, detail="Token não fornecido")
@@ -456,76 +446,66 @@ async def create_matrix_cargo_orders(
     if not workspace_id:
         raise HTTPException(status_code=400, detail="Workspace-Id header é obrigatório")
 
+    # Modo streaming: SSE com Accept: text/event-stream; NDJSON com ?stream=true ou
+    # Accept: application/x-ndjson. Cada pedido já é deduplicado pelo uniqueId, então
+    # o Idempotency-Key do lote não se aplica aqui
+    use_sse = bool(accept and SSE_MEDIA_TYPE in accept)
+    if use_sse or stream or (accept and NDJSON_MEDIA_TYPE in accept):
+        if asynchronous:
+            raise HTTPException(status_code=400, detail="async e streaming não podem ser usados juntos")
+        token = authorization.replace('Bearer ', '')
+        events = stream_orders(orders, token, organization_id, workspace_id)
+        if use_sse:
+            return StreamingResponse(
+                _sse_events(events),
+                media_type=SSE_MEDIA_TYPE,
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        return StreamingResponse(_ndjson_events(events), media_type=NDJSON_MEDIA_TYPE)
+
     try:
         token = authorization.replace('Bearer ', '')
-        
-        matrix_cargo_client = MatrixcargoPainelLogistico(
-            MATRIXCARGO_PAINEL_LOGISTICO_API_URL,
-            token,
-            organization_id,
-            workspace_id
+        payloads = [order.dict() for order in orders]
+
+        async def send():
+            # Modo assíncrono: cada pedido vira um item do outbox
+            if asynchronous:
+                job = await run_db(outbox.enqueue_job, 'orders', payloads, token, organization_id, workspace_id)
+                return 202, {"jobId": job.id, "status": job.status, "total": job.total}
+
+            return 200, await submit_orders(orders, token, organization_id, workspace_id)
+
+        # Cada pedido já é deduplicado pelo uniqueId; com Idempotency-Key, o lote inteiro
+        # também é, desde que todos os pedidos tenham sido aceitos
+        if not idempotency_key:
+            status_code, content = await send()
+            return JSONResponse(status_code=status_code, content=content)
+
+        request_hash = idempotency.content_hash(payloads)
+        return await _idempotent_response(
+            idempotency.make_key('orders', organization_id, idempotency_key),
+            request_hash,
+            send,
+            should_store=lambda status_code, content: not content.get("errors")
         )
         
-        results = []
-        errors = []
-        
-        for order in orders:
-            try:
-                matrix_cargo_order = transform_order_to_matrix_cargo_format(order.dict())
-                result = await matrix_cargo_client.create_order(matrix_cargo_order)
-                results.append({
-                    "id": order.id,
-                    "uniqueId": order.uniqueId,
-                    "status": "success",
-                    "result": result
-                })
-            except HTTPException as e:
-                error_detail = e.detail
-                # Tenta extrair a mensagem de erro da Matrix Cargo
-                if isinstance(error_detail, str):
-                    try:
-                        error_json = json.loads(error_detail)
-                        if isinstance(error_json.get('message'), list):
-                            error_message = '; '.join(error_json['message'])
-                        else:
-                            error_message = str(error_json.get('message', error_detail))
-                    except:
-                        error_message = error_detail
-                else:
-                    error_message = str(error_detail)
-
-                print(f"Erro ao processar pedido {order.id} (uniqueId: {order.uniqueId}): {error_message}")
-                errors.append({
-                    "id": order.id,
-                    "uniqueId": order.uniqueId,
-                    "status": "error",
-                    "error": error_message
-                })
-            except Exception as e:
-                error_message = str(e)
-                print(f"Erro ao processar pedido {order.id} (uniqueId: {order.uniqueId}): {error_message}")
-                errors.append({
-                    "id": order.id,
-                    "uniqueId": order.uniqueId,
-                    "status": "error",
-                    "error": error_message
-                })
-        
-        return {
-            "results": results,
-            "errors": errors,
-            "total": len(orders),
-            "success": len(results),
-            "failed": len(errors)
-        }
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Erro geral na integração: {str(e)}")
+        logger.error("Erro geral na integração: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Erro ao criar pedidos no Matrix Cargo: {str(e)}"
         )
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Progresso de um envio assíncrono, item a item"""
+    status = await run_db(outbox.get_job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return status
+
 @app.get(
     "/organizations",
     response_model=OrganizationResponse,
@@ -542,70 +522,7 @@ async def get_organizations(
     
     token = authorization.replace('Bearer ', '')
     
-    try:
-        async with httpx.AsyncClient(
-            verify=True,
-            timeout=30.0
-        ) as client:
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive'
-            }
-            
-            url = "https://painel-logistico-api.matrixcargo.com.br/api/v1/organization"
-            
-            response = await client.get(
-                url,
-                headers=headers,
-                follow_redirects=True
-            )
-            
-            if response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Token inválido ou expirado")
-            elif response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Erro na requisição: {response.text}"
-                )
-
-            # Filtrar apenas os campos necessários da resposta
-            raw_data = response.json()
-            filtered_data = {
-                "data": [
-                    {
-                        "id": org["id"],
-                        "name": org["name"],
-                        "workspaces": [
-                            {
-                                "id": ws["id"],
-                                "name": ws["name"]
-                            }
-                            for ws in org["workspaces"]
-                        ]
-                    }
-                    for org in raw_data["data"]
-                ]
-            }
-            
-            return filtered_data
-            
-    except httpx.HTTPError as e:
-        print(f"Erro HTTP: {str(e)}")
-        if hasattr(e, 'response'):
-            print(f"Status code: {e.response.status_code}")
-            print(f"Response body: {e.response.text}")
-        raise HTTPException(
-            status_code=getattr(e, 'response', httpx.Response(status_code=500)).status_code,
-            detail=f"Erro ao buscar organizações: {str(e)}"
-        )
-    except Exception as e:
-        print(f"Erro inesperado: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro interno do servidor: {str(e)}"
-        )
+    # Cache por hash do token; requisições simultâneas compartilham a mesma busca
+    return await get_organizations_cached(token)
 
 
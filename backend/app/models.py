@@ -39,4 +39,26 @@ class Trip(BaseModel):
     externalId: str
     driver: Driver
     vehicle: Vehicle
-    stops: List[Stop] 
\ No newline at end of file
+    stops: List[Stop]
+
+class OrderRequest(BaseModel):
+    id: str
+    uniqueId: str
+    customerCNPJ: str
+    customerName: str
+    originCNPJ: str
+    originName: str
+    pickupDate: str
+    destinationCNPJ: str
+    destinationName: str
+    deliveryDate: str
+    itemCode: str
+    itemDescription: str
+    itemVolume: float
+    itemWeight: float
+    itemQuantity: int
+    itemUnit: str
+    itemUnitPrice: float
+    merchandiseType: str
+    isDangerous: bool
+    needsEscort: bool
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+from .nfe_records import NFNote
+
+# Quantidade máxima de NF-es mantidas em cache (0 desativa o cache)
+NFE_CACHE_MAX_ENTRIES = int(os.getenv('NFE_CACHE_MAX_ENTRIES', 10000))
+# Tempo de vida de cada entrada, em segundos (0 mantém até ser removida pelo LRU)
+NFE_CACHE_TTL_SECONDS = float(os.getenv('NFE_CACHE_TTL_SECONDS', 3600))
+
+
+class _Entry(NamedTuple):
+    expires_at: float
+    data: NFNote
+
+
+def content_digest(content: bytes) -> str:
+    """Chave do cache: hash dos bytes do XML como recebidos"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class NFeResultCache:
+    """
+    Cache LRU com expiração dos dados extraídos de NF-es válidas.
+
+    Indexado pelo hash do conteúdo e também pela chave de acesso. Os registros são
+    imutáveis, então podem ser devolvidos sem cópia; o ID de cada upload é aplicado
+    em uma nova instância (NFNote.with_id) e não vaza entre respostas.
+    Usado apenas a partir do event loop, por isso não tem travas.
+    """
+
+    def __init__(self, max_entries: int = NFE_CACHE_MAX_ENTRIES, ttl_seconds: float = NFE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._by_chave: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, digest: str) -> Optional[NFNote]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self.ttl_seconds and entry.expires_at <= time.monotonic():
+            self._remove(digest)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry.data
+
+    def get_by_chave(self, chave_acesso: str) -> Optional[NFNote]:
+        digest = self._by_chave.get(chave_acesso)
+        if digest is None:
+            return None
+        return self.get(digest)
+
+    def put(self, digest: str, data: NFNote) -> None:
+        if not self.enabled:
+            return
+        if digest in self._entries:
+            self._remove(digest)
+        self._entries[digest] = _Entry(time.monotonic() + self.ttl_seconds, data)
+        chave_acesso = data.chaveAcesso
+        if chave_acesso:
+            self._by_chave[chave_acesso] = digest
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, digest: str) -> None:
+        entry = self._entries.pop(digest)
+        chave_acesso = entry.data.chaveAcesso
+        if chave_acesso and self._by_chave.get(chave_acesso) == digest:
+            del self._by_chave[chave_acesso]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_chave.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+nfe_cache = NFeResultCache()
@@ -0,0 +1,204 @@
+import codecs
+import itertools
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+from .nfe_schema import NFE_NAMESPACE, PLAN
+
+_NS = '{%s}' % NFE_NAMESPACE
+_NFE_TAG = _NS + 'NFe'
+_INF_NFE_TAG = _NS + 'infNFe'
+
+# Grupos que nunca contêm campos de interesse: o conteúdo é descartado assim
+# que o elemento termina, o que mantém a memória constante mesmo em notas
+# com milhares de itens (det)
+_DISCARD_TAGS = frozenset(
+    [_NS + tag for tag in ('det', 'total', 'cobr', 'pag', 'infAdic', 'autXML', 'infRespTec', 'protNFe')]
+    + ['{http://www.w3.org/2000/09/xmldsig#}Signature']
+)
+
+# Tamanho dos blocos entregues ao parser; limita a fila de eventos pendentes
+FEED_CHUNK_SIZE = 64 * 1024
+
+# Encodings tentados, em ordem, quando o XML não declara encoding e não é
+# UTF-8 válido, ou quando o encoding declarado está errado ou é desconhecido
+FALLBACK_ENCODINGS = ('utf-8', 'latin-1')
+
+_DECLARATION = re.compile(rb'^(?:\xef\xbb\xbf)?\s*<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+_UTF8_NAMES = frozenset({'utf-8', 'utf8'})
+
+
+class NFeStreamExtractor:
+    """
+    Percorre o XML da NF-e em uma única passada (estilo iterparse).
+
+    Apenas o esqueleto com as seções do plano (nfe_schema.PLAN) é mantido; os
+    demais grupos são liberados assim que consumidos. Ao término da primeira
+    NFe os textos dos campos do plano são copiados para `sections` e a árvore
+    é descartada.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=('end',))
+        self._nfe: Optional[ET.Element] = None
+        self._last: Optional[ET.Element] = None
+
+        self.has_nfe = False
+        self.has_inf_nfe = False
+        self.sections: Dict[str, Dict[str, Optional[str]]] = {}
+
+    def feed(self, data: Union[str, bytes]) -> None:
+        # Fatias de bytes via memoryview, sem cópias do documento
+        view = memoryview(data) if isinstance(data, (bytes, bytearray)) else data
+        for offset in range(0, len(data), FEED_CHUNK_SIZE):
+            self._parser.feed(view[offset:offset + FEED_CHUNK_SIZE])
+            self._consume()
+
+    def close(self) -> 'NFeStreamExtractor':
+        self._parser.close()
+        self._consume()
+        # Assim como root.find('.//nfe:NFe'), a própria raiz não conta como NFe
+        if self._last is self._nfe:
+            self.has_nfe = False
+            self.has_inf_nfe = False
+            self.sections = {}
+        self._nfe = self._last = None
+        return self
+
+    def _consume(self) -> None:
+        elem = None
+        for _, elem in self._parser.read_events():
+            tag = elem.tag
+            if tag in _DISCARD_TAGS:
+                elem.clear()
+            elif tag == _NFE_TAG and self._nfe is None:
+                self._nfe = elem
+                self._collect(elem)
+                elem.clear()
+        if elem is not None:
+            self._last = elem
+
+    def _collect(self, nfe: ET.Element) -> None:
+        self.has_nfe = True
+        inf_nfe = nfe.find(_INF_NFE_TAG)
+        if inf_nfe is None:
+            return
+
+        self.has_inf_nfe = True
+        self.sections['infNFe'] = {'@' + name: inf_nfe.get(name) for name in PLAN.inf_nfe_attributes}
+
+        # Segue os caminhos exatos do plano sobre o esqueleto já podado
+        found = {'infNFe': inf_nfe}
+        for section in PLAN.sections:
+            parent = found.get(section.parent)
+            if parent is None:
+                continue
+            element = parent.find(section.qualified_tag)
+            if element is None:
+                continue
+            found[section.name] = element
+            values = {'@' + name: element.get(name) for name in section.attributes}
+            for tag, qualified_tag in section.children:
+                child = element.find(qualified_tag)
+                if child is not None:
+                    values[tag] = child.text
+            self.sections[section.name] = values
+
+
+def declared_encoding(head: bytes) -> Optional[str]:
+    """Encoding indicado pelo BOM ou pelo prólogo <?xml ... encoding="..."?>, em minúsculas"""
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    match = _DECLARATION.match(head[:256])
+    return match.group(1).decode('ascii').lower() if match else None
+
+
+def _parse(chunks: Iterable[Union[str, bytes]]) -> NFeStreamExtractor:
+    extractor = NFeStreamExtractor()
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor.close()
+
+
+def parse_nfe(xml_content: Union[str, bytes]) -> NFeStreamExtractor:
+    """
+    Executa a passada única sobre o conteúdo completo de um XML.
+
+    Bytes vão direto para o parser, que respeita o encoding do prólogo (UTF-8
+    se ausente). Só se o parsing falhar o conteúdo é relido com os encodings
+    de FALLBACK_ENCODINGS, cobrindo arquivos sem declaração ou com declaração
+    incorreta ou desconhecida.
+    """
+    try:
+        return _parse((xml_content,))
+    except (ET.ParseError, LookupError) as error:
+        if isinstance(xml_content, str):
+            raise
+        for encoding in FALLBACK_ENCODINGS:
+            try:
+                text = bytes(xml_content).decode(encoding)
+            except UnicodeDecodeError:
+                continue
+            try:
+                return _parse((text,))
+            except ET.ParseError:
+                continue
+        raise error from None
+
+
+def _utf8_then_fallback(chunks: Iterable[bytes], as_text: bool) -> Iterator[Union[str, bytes]]:
+    # Enquanto os blocos forem UTF-8 válido seguem adiante (como bytes ou texto);
+    # a partir do primeiro bloco inválido o restante usa o último fallback.
+    # Bytes de um caractere incompleto no fim do bloco só seguem com o bloco seguinte.
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = b''
+    for chunk in chunks:
+        if decoder is not None:
+            data = pending + chunk if pending else chunk
+            try:
+                text = decoder.decode(chunk)
+            except UnicodeDecodeError:
+                decoder = None
+                chunk = data
+            else:
+                pending = decoder.getstate()[0]
+                yield text if as_text else data[:len(data) - len(pending)]
+                continue
+        yield chunk.decode(FALLBACK_ENCODINGS[-1])
+    if decoder is not None and pending:
+        yield pending.decode(FALLBACK_ENCODINGS[-1])
+
+
+def _with_fallback(chunks: Iterable[bytes]) -> Iterator[Union[str, bytes]]:
+    chunks = iter(chunks)
+    # Junta o início do documento até ter o prólogo inteiro
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= 256:
+            break
+    chunks = itertools.chain((head,), chunks)
+
+    encoding = declared_encoding(head)
+    if encoding is None or encoding in _UTF8_NAMES:
+        # UTF-8 declarado ou implícito: os bytes vão direto para o parser
+        yield from _utf8_then_fallback(chunks, as_text=False)
+        return
+
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        # Encoding desconhecido: o texto decodificado substitui a declaração
+        yield from _utf8_then_fallback(chunks, as_text=True)
+        return
+    yield from chunks
+
+
+def parse_nfe_chunks(chunks: Iterable[bytes]) -> NFeStreamExtractor:
+    """
+    Versão de parse_nfe para conteúdo lido em blocos (ex.: membros de arquivos
+    compactados), que não pode ser relido: o fallback de encoding é decidido
+    bloco a bloco, sem manter o documento em memória.
+    """
+    return _parse(_with_fallback(chunks))
@@ -0,0 +1,96 @@
+from typing import Any, Dict, NamedTuple, Optional
+
+
+# Registros imutáveis (tuplas nomeadas) usados no lugar de dicts aninhados:
+# sem __dict__ por instância, ocupam uma fração da memória quando milhares
+# de notas ficam em memória, e podem ser compartilhados com segurança pelo cache.
+# to_dict() gera exatamente o formato JSON devolvido pela API.
+
+
+class NFAddress(NamedTuple):
+    logradouro: str
+    numero: str
+    bairro: str
+    municipio: str
+    uf: str
+    cep: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "logradouro": self.logradouro,
+            "numero": self.numero,
+            "bairro": self.bairro,
+            "municipio": self.municipio,
+            "uf": self.uf,
+            "cep": self.cep
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'NFAddress':
+        return cls(data["logradouro"], data["numero"], data["bairro"], data["municipio"], data["uf"], data["cep"])
+
+
+class NFParty(NamedTuple):
+    cnpj: str
+    nome: str
+    endereco: NFAddress
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cnpj": self.cnpj,
+            "nome": self.nome,
+            "endereco": self.endereco.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'NFParty':
+        return cls(data["cnpj"], data["nome"], NFAddress.from_dict(data["endereco"]))
+
+
+class NFTransport(NamedTuple):
+    volume: int
+    pesoBruto: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "volume": self.volume,
+            "pesoBruto": self.pesoBruto
+        }
+
+
+class NFNote(NamedTuple):
+    numeroNF: str
+    chaveAcesso: str
+    remetente: NFParty
+    destinatario: NFParty
+    transporte: NFTransport
+    id: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "numeroNF": self.numeroNF,
+            "chaveAcesso": self.chaveAcesso,
+            "remetente": self.remetente.to_dict(),
+            "destinatario": self.destinatario.to_dict(),
+            "transporte": self.transporte.to_dict()
+        }
+        if self.id is not None:
+            data["id"] = self.id
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'NFNote':
+        """Converte o dict de NFXMLProcessor.extract_data() em registro"""
+        transporte = data["transporte"]
+        return cls(
+            data["numeroNF"],
+            data["chaveAcesso"],
+            NFParty.from_dict(data["remetente"]),
+            NFParty.from_dict(data["destinatario"]),
+            NFTransport(transporte["volume"], transporte["pesoBruto"]),
+            data.get("id")
+        )
+
+    def with_id(self, note_id: str) -> 'NFNote':
+        """Cópia com o ID do upload; as partes internas são compartilhadas"""
+        return self._replace(id=note_id)
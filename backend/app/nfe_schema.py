@@ -0,0 +1,194 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+NFE_NAMESPACE = 'http://www.portalfiscal.inf.br/nfe'
+
+
+class NFeSection(NamedTuple):
+    name: str                           # elemento da NF-e, ex. 'enderEmit'
+    parent: str                         # seção que contém o elemento como filho direto
+    required: bool
+    extract_error: Optional[str] = None  # erro da extração quando a seção não existe
+
+
+class NFeField(NamedTuple):
+    key: str                             # caminho no resultado, ex. 'remetente.endereco.cep'
+    section: str
+    tag: str                             # filho direto da seção; '@Nome' lê um atributo
+    required: bool = False
+    message: Optional[str] = None        # descrição usada na mensagem de validação
+    coerce: Optional[Callable[[str], Any]] = None
+    default: Any = ''
+
+
+# A ordem das seções define a ordem das mensagens de validação;
+# uma seção deve aparecer depois da seção que a contém
+SECTIONS: Tuple[NFeSection, ...] = (
+    NFeSection('emit', 'infNFe', True, 'Emitente não encontrado'),
+    NFeSection('dest', 'infNFe', True, 'Destinatário não encontrado'),
+    NFeSection('enderEmit', 'emit', True, 'Endereço do emitente não encontrado'),
+    NFeSection('enderDest', 'dest', True, 'Endereço do destinatário não encontrado'),
+    NFeSection('ide', 'infNFe', True),
+    NFeSection('transp', 'infNFe', False),
+    NFeSection('vol', 'transp', False),
+)
+
+# A ordem dos campos define a ordem das chaves no resultado
+FIELDS: Tuple[NFeField, ...] = (
+    NFeField('numeroNF', 'ide', 'nNF', True, 'Número da Nota Fiscal'),
+    NFeField('chaveAcesso', 'infNFe', '@Id', coerce=lambda value: value.replace('NFe', '')),
+    NFeField('remetente.cnpj', 'emit', 'CNPJ', True, 'CNPJ do Remetente'),
+    NFeField('remetente.nome', 'emit', 'xNome', True, 'Nome do Remetente'),
+    NFeField('remetente.endereco.logradouro', 'enderEmit', 'xLgr', True, 'Logradouro do Remetente'),
+    NFeField('remetente.endereco.numero', 'enderEmit', 'nro', True, 'Número do Remetente'),
+    NFeField('remetente.endereco.bairro', 'enderEmit', 'xBairro', True, 'Bairro do Remetente'),
+    NFeField('remetente.endereco.municipio', 'enderEmit', 'xMun', True, 'Município do Remetente'),
+    NFeField('remetente.endereco.uf', 'enderEmit', 'UF', True, 'UF do Remetente'),
+    NFeField('remetente.endereco.cep', 'enderEmit', 'CEP', True, 'CEP do Remetente'),
+    NFeField('destinatario.cnpj', 'dest', 'CNPJ', True, 'CNPJ do Destinatário'),
+    NFeField('destinatario.nome', 'dest', 'xNome', True, 'Nome do Destinatário'),
+    NFeField('destinatario.endereco.logradouro', 'enderDest', 'xLgr', True, 'Logradouro do Destinatário'),
+    NFeField('destinatario.endereco.numero', 'enderDest', 'nro', True, 'Número do Destinatário'),
+    NFeField('destinatario.endereco.bairro', 'enderDest', 'xBairro', True, 'Bairro do Destinatário'),
+    NFeField('destinatario.endereco.municipio', 'enderDest', 'xMun', True, 'Município do Destinatário'),
+    NFeField('destinatario.endereco.uf', 'enderDest', 'UF', True, 'UF do Destinatário'),
+    NFeField('destinatario.endereco.cep', 'enderDest', 'CEP', True, 'CEP do Destinatário'),
+    NFeField('transporte.volume', 'vol', 'qVol', coerce=int, default=1),
+    NFeField('transporte.pesoBruto', 'vol', 'pesoB', coerce=float, default=0.0),
+)
+
+
+class CompiledSection(NamedTuple):
+    name: str
+    qualified_tag: str
+    parent: str
+    # (tag, tag qualificado com namespace) dos campos lidos desta seção
+    children: Tuple[Tuple[str, str], ...]
+    attributes: Tuple[str, ...]
+
+
+class NFePlan:
+    """
+    Plano de leitura gerado uma única vez a partir de SECTIONS e FIELDS.
+
+    Guarda os nomes já qualificados com o namespace, os campos obrigatórios
+    agrupados na ordem das mensagens e a estrutura do resultado, de modo que
+    validar e extrair não alocam nem montam caminhos a cada chamada.
+    """
+
+    def __init__(self, sections: Tuple[NFeSection, ...], fields: Tuple[NFeField, ...]):
+        ns = '{%s}' % NFE_NAMESPACE
+        known = {'infNFe'}
+        for section in sections:
+            if section.parent not in known:
+                raise ValueError(f"Seção {section.name} declarada antes de {section.parent}")
+            known.add(section.name)
+
+        # Seções na ordem em que devem ser localizadas (pai antes do filho)
+        self.sections: Tuple[CompiledSection, ...] = tuple(
+            CompiledSection(
+                name=section.name,
+                qualified_tag=ns + section.name,
+                parent=section.parent,
+                children=tuple(
+                    (field.tag, ns + field.tag)
+                    for field in fields
+                    if field.section == section.name and not field.tag.startswith('@')
+                ),
+                attributes=tuple(
+                    field.tag[1:]
+                    for field in fields
+                    if field.section == section.name and field.tag.startswith('@')
+                ),
+            )
+            for section in sections
+        )
+        self.inf_nfe_attributes: Tuple[str, ...] = tuple(
+            field.tag[1:] for field in fields if field.section == 'infNFe' and field.tag.startswith('@')
+        )
+
+        # (seção, mensagem da seção, [(tag, mensagem do campo)]) na ordem das mensagens de validação
+        self.validation: Tuple[Tuple[str, str, Tuple[Tuple[str, str], ...]], ...] = tuple(
+            (
+                section.name,
+                f"Seção {section.name} não encontrada",
+                tuple(
+                    (field.tag, f"Campo {field.message or field.tag} não encontrado ou vazio")
+                    for field in fields
+                    if field.section == section.name and field.required
+                ),
+            )
+            for section in sections
+            if section.required
+        )
+
+        # Na extração cada seção é verificada logo após a seção que a contém
+        def walk(parent: str):
+            for section in sections:
+                if section.parent == parent:
+                    yield section
+                    yield from walk(section.name)
+
+        self.extract_errors: Tuple[Tuple[str, str], ...] = tuple(
+            (section.name, section.extract_error) for section in walk('infNFe') if section.extract_error
+        )
+
+        # (caminho de chaves, seção, tag, conversão, default) na ordem do resultado
+        self.fields: Tuple[Tuple[Tuple[str, ...], str, str, Optional[Callable[[str], Any]], Any], ...] = tuple(
+            (tuple(field.key.split('.')), field.section, field.tag, field.coerce, field.default)
+            for field in fields
+        )
+
+    def validate(self, sections: Dict[str, Dict[str, Optional[str]]]) -> List[str]:
+        """Retorna as mensagens dos campos obrigatórios ausentes"""
+        missing_fields = []
+        for section, section_message, required in self.validation:
+            values = sections.get(section)
+            if values is None:
+                missing_fields.append(section_message)
+                continue
+            for tag, message in required:
+                if not values.get(tag):
+                    missing_fields.append(message)
+        return missing_fields
+
+    def extract(self, sections: Dict[str, Dict[str, Optional[str]]]) -> Dict[str, Any]:
+        """Monta o resultado a partir dos valores coletados, aplicando as conversões"""
+        for section, error in self.extract_errors:
+            if section not in sections:
+                raise ValueError(error)
+
+        result: Dict[str, Any] = {}
+        # A conversão é tudo-ou-nada por seção: se um campo falhar,
+        # todos os campos convertidos da seção voltam ao default
+        failed_sections = set()
+        converted = []
+        for path, section, tag, coerce, default in self.fields:
+            text = (sections.get(section) or {}).get(tag)
+            if not text:
+                value = default
+            elif coerce is None:
+                value = text
+            else:
+                try:
+                    value = coerce(text)
+                except (ValueError, TypeError) as e:
+                    logger.debug("Erro ao converter %s: %s", tag, e)
+                    failed_sections.add(section)
+                    value = default
+            converted.append((path, section, coerce, default, value))
+
+        for path, section, coerce, default, value in converted:
+            if coerce is not None and section in failed_sections:
+                value = default
+            target = result
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+        return result
+
+
+PLAN = NFePlan(SECTIONS, FIELDS)
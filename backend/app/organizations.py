@@ -0,0 +1,103 @@
+import hashlib
+import os
+from typing import Any, Dict
+
+import httpx
+from fastapi import HTTPException
+
+from .coalescing_cache import CoalescingTTLCache
+from .external_api import MATRIXCARGO_PAINEL_LOGISTICO_API_URL
+from .http_client import get_http_client
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MATRIXCARGO_ORGANIZATIONS_URL = f"{MATRIXCARGO_PAINEL_LOGISTICO_API_URL}/organization"
+
+# Tempo que a lista de organizações de um token fica em cache (0 desativa o cache)
+ORGANIZATIONS_CACHE_TTL_SECONDS = float(os.getenv('ORGANIZATIONS_CACHE_TTL_SECONDS', 60))
+# Janela após o vencimento em que o valor antigo ainda é servido enquanto é atualizado (0 desativa)
+ORGANIZATIONS_CACHE_STALE_SECONDS = float(os.getenv('ORGANIZATIONS_CACHE_STALE_SECONDS', 0))
+ORGANIZATIONS_CACHE_MAX_ENTRIES = int(os.getenv('ORGANIZATIONS_CACHE_MAX_ENTRIES', 1000))
+
+organizations_cache = CoalescingTTLCache(
+    ORGANIZATIONS_CACHE_TTL_SECONDS,
+    ORGANIZATIONS_CACHE_STALE_SECONDS,
+    ORGANIZATIONS_CACHE_MAX_ENTRIES
+)
+
+
+def token_cache_key(token: str) -> str:
+    """Chave do cache: hash do token, para que o token nunca fique guardado em memória no cache"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+async def fetch_organizations(token: str) -> Dict[str, Any]:
+    """Busca no Painel Logístico as organizações e workspaces visíveis para o token"""
+    try:
+        client = get_http_client()
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive'
+        }
+        
+        url = MATRIXCARGO_ORGANIZATIONS_URL
+        
+        response = await client.get(
+            url,
+            headers=headers,
+            follow_redirects=True
+        )
+        
+        if response.status_code == 401:
+            raise HTTPException(status_code=401, detail="Token inválido ou expirado")
+        elif response.status_code != 200:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Erro na requisição: {response.text}"
+            )
+
+        # Filtrar apenas os campos necessários da resposta
+        raw_data = response.json()
+        filtered_data = {
+            "data": [
+                {
+                    "id": org["id"],
+                    "name": org["name"],
+                    "workspaces": [
+                        {
+                            "id": ws["id"],
+                            "name": ws["name"]
+                        }
+                        for ws in org["workspaces"]
+                    ]
+                }
+                for org in raw_data["data"]
+            ]
+        }
+        
+        return filtered_data
+        
+    except httpx.HTTPError as e:
+        logger.error("Erro HTTP: %s", e)
+        if hasattr(e, 'response'):
+            logger.debug("Status code: %s", e.response.status_code)
+            logger.debug("Response body: %s", e.response.text)
+        raise HTTPException(
+            status_code=getattr(e, 'response', httpx.Response(status_code=500)).status_code,
+            detail=f"Erro ao buscar organizações: {str(e)}"
+        )
+    except Exception as e:
+        logger.error("Erro inesperado: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+
+
+async def get_organizations_cached(token: str) -> Dict[str, Any]:
+    """Organizações do token, do cache ou do Painel Logístico; buscas simultâneas são agrupadas"""
+    return await organizations_cache.get(token_cache_key(token), lambda: fetch_organizations(token))
@@ -0,0 +1,387 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from .database import OutboxItem, OutboxJob, SessionLocal
+from .db_executor import run_in_db_executor
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Workers que consomem o outbox neste processo (0 apenas enfileira)
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 4))
+# Tempo que um item fica reservado para o worker; deve cobrir as retentativas e timeouts do envio
+OUTBOX_LEASE_SECONDS = float(os.getenv('OUTBOX_LEASE_SECONDS', 120))
+# Intervalo de consulta ao outbox quando não há trabalho
+OUTBOX_POLL_SECONDS = float(os.getenv('OUTBOX_POLL_SECONDS', 1))
+# Execuções de um item antes de desistir (um item volta à fila quando a lease expira)
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 3))
+# Tempo de espera, no shutdown, pelos itens em execução
+OUTBOX_SHUTDOWN_GRACE_SECONDS = float(os.getenv('OUTBOX_SHUTDOWN_GRACE_SECONDS', 10))
+# Validade do token guardado com o job, em segundos. Depois disso os itens que restam
+# falham e o token é apagado, mesmo que o job não tenha terminado
+OUTBOX_TOKEN_TTL_SECONDS = float(os.getenv('OUTBOX_TOKEN_TTL_SECONDS', 6 * 3600))
+
+# Chaves Fernet (separadas por vírgula; a primeira cifra, todas decifram, para rotação)
+# usadas para cifrar o token guardado com o job. Sem elas, uma chave aleatória é gerada
+# a cada processo: os jobs pendentes num reinício falham em vez de expor o token
+OUTBOX_TOKEN_KEY = os.getenv('OUTBOX_TOKEN_KEY', '')
+
+_TOKEN_EXPIRED_MESSAGE = "Credencial do envio expirou antes do processamento; envie novamente"
+
+
+def _token_cipher() -> MultiFernet:
+    keys = [key.strip() for key in OUTBOX_TOKEN_KEY.split(',') if key.strip()]
+    if not keys:
+        logger.warning(
+            "OUTBOX_TOKEN_KEY não definida: tokens do outbox cifrados com chave temporária, "
+            "jobs pendentes não sobrevivem a um reinício"
+        )
+        keys = [Fernet.generate_key().decode('ascii')]
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+_cipher = _token_cipher()
+
+
+def _seal_token(token: str) -> str:
+    return _cipher.encrypt(token.encode('utf-8')).decode('ascii')
+
+
+def _open_token(sealed: Optional[str]) -> Optional[str]:
+    """Token do job; None se apagado, expirado (OUTBOX_TOKEN_TTL_SECONDS) ou cifrado com outra chave"""
+    if not sealed:
+        return None
+    try:
+        return _cipher.decrypt(sealed.encode('ascii'), ttl=int(OUTBOX_TOKEN_TTL_SECONDS)).decode('utf-8')
+    except (InvalidToken, UnicodeError):
+        return None
+
+_CLAIM_CANDIDATES = 10
+
+
+class ClaimedItem(NamedTuple):
+    item_id: int
+    job_id: str
+    kind: str
+    position: int
+    payload: Any
+    attempts: int
+    token: Optional[str]
+    organization_id: str
+    workspace_id: str
+
+
+# Handler de um tipo de job: recebe o item e retorna (sucesso, resultado, mensagem de erro)
+ItemHandler = Callable[[ClaimedItem], Awaitable[Tuple[bool, Any, Optional[str]]]]
+
+_handlers: Dict[str, ItemHandler] = {}
+
+
+def register_handler(kind: str, handler: ItemHandler) -> None:
+    _handlers[kind] = handler
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payloads: List[Any],
+    token: str,
+    organization_id: str,
+    workspace_id: str
+) -> OutboxJob:
+    """Grava o job e seus itens em uma transação e acorda os workers"""
+    job = OutboxJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        status='pending' if payloads else 'done',
+        total=len(payloads),
+        organization_id=organization_id,
+        workspace_id=workspace_id,
+        # Cifrado: quem lê o banco ou um backup não obtém a credencial
+        auth_token=_seal_token(token) if payloads else None
+    )
+    db.add(job)
+    db.add_all([
+        OutboxItem(job_id=job.id, position=position, payload=payload, status='pending')
+        for position, payload in enumerate(payloads)
+    ])
+    db.commit()
+    worker_pool.notify()
+    return job
+
+
+def _claimable(now: datetime):
+    # Pendentes, ou em execução por um worker cuja lease expirou (processo caiu)
+    return or_(
+        OutboxItem.status == 'pending',
+        and_(OutboxItem.status == 'running', OutboxItem.lease_expires_at < now)
+    )
+
+
+def _claim_next(worker_id: str) -> Optional[ClaimedItem]:
+    """
+    Reserva o próximo item do outbox para o worker.
+    A reserva é um UPDATE condicional: se dois workers (ou processos) disputam o mesmo
+    item, apenas um altera a linha; o outro tenta o candidato seguinte.
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            now = datetime.utcnow()
+            candidates = (
+                db.query(OutboxItem.id)
+                .filter(_claimable(now))
+                .order_by(OutboxItem.id)
+                .limit(_CLAIM_CANDIDATES)
+                .all()
+            )
+            if not candidates:
+                return None
+
+            for (item_id,) in candidates:
+                claimed = (
+                    db.query(OutboxItem)
+                    .filter(OutboxItem.id == item_id, _claimable(now))
+                    .update({
+                        OutboxItem.status: 'running',
+                        OutboxItem.lease_owner: worker_id,
+                        OutboxItem.lease_expires_at: now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                        OutboxItem.attempts: OutboxItem.attempts + 1,
+                        OutboxItem.updated_at: now
+                    }, synchronize_session=False)
+                )
+                db.commit()
+                if not claimed:
+                    continue
+
+                item = db.query(OutboxItem).get(item_id)
+                job = db.query(OutboxJob).get(item.job_id)
+                if item.attempts > OUTBOX_MAX_ATTEMPTS:
+                    logger.warning("Item %s do job %s excedeu %d tentativas", item.id, job.id, OUTBOX_MAX_ATTEMPTS)
+                    _complete(db, item.id, job.id, worker_id, False, None, "Limite de tentativas de envio atingido")
+                    break
+                token = _open_token(job.auth_token)
+                if token is None:
+                    _complete(db, item.id, job.id, worker_id, False, None, _TOKEN_EXPIRED_MESSAGE)
+                    break
+                if job.status == 'pending':
+                    job.status = 'running'
+                    db.commit()
+                return ClaimedItem(
+                    item.id, job.id, job.kind, item.position, item.payload, item.attempts,
+                    token, job.organization_id, job.workspace_id
+                )
+    finally:
+        db.close()
+
+
+def _complete(
+    db: Session,
+    item_id: int,
+    job_id: str,
+    worker_id: str,
+    succeeded: bool,
+    result: Any,
+    error_message: Optional[str]
+) -> None:
+    now = datetime.utcnow()
+    # Só o dono da lease grava o resultado: se ela expirou e outro worker assumiu o item,
+    # este resultado é descartado
+    updated = (
+        db.query(OutboxItem)
+        .filter(OutboxItem.id == item_id, OutboxItem.lease_owner == worker_id, OutboxItem.status == 'running')
+        .update({
+            OutboxItem.status: 'success' if succeeded else 'error',
+            OutboxItem.result: result,
+            OutboxItem.error_message: error_message,
+            OutboxItem.lease_expires_at: None,
+            OutboxItem.updated_at: now
+        }, synchronize_session=False)
+    )
+    db.commit()
+    if not updated:
+        logger.warning("Lease do item %s do job %s perdida; resultado descartado", item_id, job_id)
+        return
+
+    remaining = (
+        db.query(func.count(OutboxItem.id))
+        .filter(OutboxItem.job_id == job_id, OutboxItem.status.in_(('pending', 'running')))
+        .scalar()
+    )
+    if remaining == 0:
+        db.query(OutboxJob).filter(OutboxJob.id == job_id, OutboxJob.status != 'done').update({
+            OutboxJob.status: 'done',
+            OutboxJob.auth_token: None,
+            OutboxJob.finished_at: now
+        }, synchronize_session=False)
+        db.commit()
+
+
+def purge_expired_tokens() -> int:
+    """
+    Encerra os jobs não terminados mais antigos que OUTBOX_TOKEN_TTL_SECONDS: os itens
+    restantes falham e o token é apagado. Chamado no startup; retorna os jobs encerrados.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        expired = [
+            job_id for (job_id,) in db.query(OutboxJob.id).filter(
+                OutboxJob.status != 'done',
+                OutboxJob.created_at < now - timedelta(seconds=OUTBOX_TOKEN_TTL_SECONDS)
+            )
+        ]
+        if not expired:
+            return 0
+        db.query(OutboxItem).filter(
+            OutboxItem.job_id.in_(expired), OutboxItem.status.in_(('pending', 'running'))
+        ).update({
+            OutboxItem.status: 'error',
+            OutboxItem.error_message: _TOKEN_EXPIRED_MESSAGE,
+            OutboxItem.lease_owner: None,
+            OutboxItem.lease_expires_at: None,
+            OutboxItem.updated_at: now
+        }, synchronize_session=False)
+        db.query(OutboxJob).filter(OutboxJob.id.in_(expired)).update({
+            OutboxJob.status: 'done',
+            OutboxJob.auth_token: None,
+            OutboxJob.finished_at: now
+        }, synchronize_session=False)
+        db.commit()
+        logger.warning("Outbox: %d jobs não terminados expiraram; tokens apagados", len(expired))
+        return len(expired)
+    finally:
+        db.close()
+
+
+def _finish_item(claim: ClaimedItem, worker_id: str, succeeded: bool, result: Any, error_message: Optional[str]) -> None:
+    db = SessionLocal()
+    try:
+        _complete(db, claim.item_id, claim.job_id, worker_id, succeeded, result, error_message)
+    finally:
+        db.close()
+
+
+def get_job_status(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    """Situação do job e de cada item, na ordem em que foram enviados"""
+    job = db.query(OutboxJob).get(job_id)
+    if job is None:
+        return None
+
+    items = db.query(OutboxItem).filter(OutboxItem.job_id == job_id).order_by(OutboxItem.position).all()
+    counts = {'pending': 0, 'running': 0, 'success': 0, 'error': 0}
+    for item in items:
+        counts[item.status] = counts.get(item.status, 0) + 1
+
+    return {
+        "jobId": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "total": job.total,
+        "pending": counts['pending'],
+        "running": counts['running'],
+        "success": counts['success'],
+        "failed": counts['error'],
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+        "items": [
+            {
+                "position": item.position,
+                "status": item.status,
+                "attempts": item.attempts,
+                "result": item.result,
+                "error": item.error_message
+            }
+            for item in items
+        ]
+    }
+
+
+class OutboxWorkerPool:
+    """
+    Workers assíncronos que drenam o outbox no event loop da aplicação.
+    O acesso ao banco roda nas threads do banco (db_executor); o envio usa o mesmo código do modo síncrono.
+    """
+
+    def __init__(self, size: int = OUTBOX_WORKERS):
+        self.size = size
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self.size <= 0 or self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        prefix = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks = [
+            asyncio.ensure_future(self._run(f"{prefix}-{number}"))
+            for number in range(self.size)
+        ]
+        logger.info("Outbox: %d workers iniciados", self.size)
+
+    def notify(self) -> None:
+        """Acorda os workers parados à espera de trabalho; pode ser chamado das threads do banco"""
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def stop(self) -> None:
+        """Aguarda os itens em execução (até o limite de tempo) e encerra os workers"""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self.notify()
+        done, pending = await asyncio.wait(self._tasks, timeout=OUTBOX_SHUTDOWN_GRACE_SECONDS)
+        # Itens interrompidos voltam à fila quando a lease expirar
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, worker_id: str) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                claim = await run_in_db_executor(_claim_next, worker_id)
+            except Exception:
+                logger.exception("Outbox: erro ao reservar item")
+                claim = None
+
+            if claim is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._execute(claim, worker_id)
+
+    async def _execute(self, claim: ClaimedItem, worker_id: str) -> None:
+        handler = _handlers.get(claim.kind)
+        if handler is None:
+            succeeded, result, error_message = False, None, f"Tipo de job desconhecido: {claim.kind}"
+        else:
+            try:
+                succeeded, result, error_message = await handler(claim)
+            except Exception as e:
+                logger.exception("Outbox: erro no item %s do job %s", claim.item_id, claim.job_id)
+                succeeded, result, error_message = False, None, f"Erro ao processar item: {str(e)}"
+
+        try:
+            await run_in_db_executor(_finish_item, claim, worker_id, succeeded, result, error_message)
+        except Exception:
+            logger.exception("Outbox: erro ao gravar o resultado do item %s", claim.item_id)
+
+
+worker_pool = OutboxWorkerPool()
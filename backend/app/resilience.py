@@ -0,0 +1,229 @@
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, FrozenSet, Optional
+
+import httpx
+
+from .adaptive_limit import AdaptiveLimiter
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Tentativas por chamada (incluindo a primeira) e limite de tempo total gasto com elas, em segundos
+HTTP_RETRY_MAX_ATTEMPTS = int(os.getenv('HTTP_RETRY_MAX_ATTEMPTS', 4))
+HTTP_RETRY_BUDGET_SECONDS = float(os.getenv('HTTP_RETRY_BUDGET_SECONDS', 30))
+# Espera exponencial com jitter: sorteada entre 0 e min(BASE * 2^n, MAX) segundos
+HTTP_RETRY_BACKOFF_BASE = float(os.getenv('HTTP_RETRY_BACKOFF_BASE', 0.5))
+HTTP_RETRY_BACKOFF_MAX = float(os.getenv('HTTP_RETRY_BACKOFF_MAX', 10))
+# Falhas seguidas que abrem o circuito e tempo até liberar uma requisição de teste
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', 30))
+
+# Respostas em que o servidor recusou a requisição sem processá-la: repetidas sempre
+RETRY_STATUSES: FrozenSet[int] = frozenset({429, 503})
+# Erros antes do envio da requisição (não conectou ou não obteve conexão do pool):
+# o servidor nada recebeu, então a repetição é segura mesmo em POST
+RETRY_EXCEPTIONS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+)
+
+# Falhas em que a requisição pode já ter chegado ao servidor (o gateway repassou, ou a
+# conexão caiu depois do envio): repetir um POST poderia criar a viagem/pedido em dobro.
+# Só são repetidas em métodos idempotentes ou quando a requisição leva Idempotency-Key.
+# ReadTimeout fica de fora em todos os casos.
+IDEMPOTENT_RETRY_STATUSES: FrozenSet[int] = RETRY_STATUSES | {502, 504}
+IDEMPOTENT_RETRY_EXCEPTIONS = RETRY_EXCEPTIONS + (
+    httpx.RemoteProtocolError,
+    httpx.ReadError,
+    httpx.WriteError,
+)
+
+IDEMPOTENT_METHODS: FrozenSet[str] = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class CircuitOpenError(Exception):
+    """O circuito do endpoint está aberto: a chamada falha sem ir à rede"""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        super().__init__(f"Sistema externo indisponível ({endpoint}); nova tentativa em {retry_in:.0f}s")
+
+
+class CircuitBreaker:
+    """
+    Disjuntor por endpoint: closed -> open após CIRCUIT_FAILURE_THRESHOLD falhas seguidas;
+    open -> half_open depois de CIRCUIT_RESET_SECONDS, liberando uma única requisição de teste,
+    cujo resultado fecha ou reabre o circuito. Usado apenas a partir do event loop.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def before_request(self) -> None:
+        if self.failure_threshold <= 0 or self.state == 'closed':
+            return
+        if self.state == 'open':
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if retry_in > 0:
+                raise CircuitOpenError(self.endpoint, retry_in)
+            self.state = 'half_open'
+            self._probing = False
+        # half_open: apenas uma requisição de teste por vez
+        if self._probing:
+            raise CircuitOpenError(self.endpoint, self.reset_seconds)
+        self._probing = True
+
+    def record_success(self) -> None:
+        if self.state != 'closed':
+            logger.info("Circuito de %s fechado", self.endpoint)
+        self.state = 'closed'
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failure_threshold <= 0:
+            return
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                logger.warning("Circuito de %s aberto após %d falhas", self.endpoint, self.failures)
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Libera a requisição de teste que terminou sem resultado (ex. cancelada)"""
+        self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+    return breaker
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Lê o header Retry-After, em segundos ou como data HTTP"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_idempotent(method: str, headers: Any) -> bool:
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    return any(name.lower() == 'idempotency-key' for name in (headers or {}))
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(HTTP_RETRY_BACKOFF_BASE * (2 ** attempt), HTTP_RETRY_BACKOFF_MAX))
+
+
+async def send_with_retry(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    limiter: Optional[AdaptiveLimiter] = None,
+    **kwargs: Any
+) -> httpx.Response:
+    """
+    Envia a requisição repetindo falhas transitórias com espera exponencial e jitter,
+    respeitando Retry-After e o orçamento de tempo. Em POST sem Idempotency-Key, só as
+    que garantem que o servidor não processou a requisição (RETRY_STATUSES e
+    RETRY_EXCEPTIONS); nos demais casos, também IDEMPOTENT_RETRY_*.
+    Devolve a última resposta recebida, mesmo de erro; relança o último erro de conexão.
+    Levanta CircuitOpenError sem fazer a chamada se o circuito do endpoint estiver aberto.
+    Com `limiter`, cada tentativa ocupa uma vaga do limite adaptativo (liberada durante
+    a espera entre tentativas) e informa a ele latência e sobrecarga (429, 5xx, erro de rede).
+    """
+    breaker = get_circuit_breaker(url)
+    if _is_idempotent(method, kwargs.get('headers')):
+        retry_statuses, retry_exceptions = IDEMPOTENT_RETRY_STATUSES, IDEMPOTENT_RETRY_EXCEPTIONS
+    else:
+        retry_statuses, retry_exceptions = RETRY_STATUSES, RETRY_EXCEPTIONS
+    deadline = time.monotonic() + HTTP_RETRY_BUDGET_SECONDS
+    attempt = 0
+
+    while True:
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            breaker.before_request()
+        except CircuitOpenError:
+            if limiter is not None:
+                limiter.release()
+            raise
+        error: Optional[httpx.RequestError] = None
+        response: Optional[httpx.Response] = None
+        started = time.monotonic()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except retry_exceptions as e:
+            error = e
+        except httpx.RequestError:
+            breaker.record_failure()
+            if limiter is not None:
+                limiter.release(time.monotonic() - started, overloaded=True)
+            raise
+        except BaseException:
+            breaker.release()
+            if limiter is not None:
+                limiter.release()
+            raise
+
+        if limiter is not None:
+            limiter.release(
+                time.monotonic() - started,
+                overloaded=response is None or response.status_code == 429 or response.status_code >= 500
+            )
+
+        if response is not None and response.status_code not in retry_statuses:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+
+        breaker.record_failure()
+        attempt += 1
+        delay = _backoff(attempt - 1)
+        if response is not None:
+            retry_after = _retry_after_seconds(response)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        if attempt >= HTTP_RETRY_MAX_ATTEMPTS or time.monotonic() + delay > deadline:
+            if error is not None:
+                raise error
+            return response
+
+        logger.info(
+            "Falha transitória em %s %s (%s); tentativa %d em %.2fs",
+            method, url, error or response.status_code, attempt + 1, delay
+        )
+        await asyncio.sleep(delay)
@@ -0,0 +1,397 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import idempotency, outbox
+from .adaptive_limit import ADAPTIVE_LIMIT_ENABLED, ADAPTIVE_LIMIT_MAX
+from .integrated_trips import get_integrated_trip, save_integrated_trip
+from .external_api import (
+    MATRIXCARGO_PAINEL_LOGISTICO_API_URL, MATRIXCARGO_TRACKING_API_URL,
+    MatrixcargoPainelLogistico, MatrixcargoTracking
+)
+from .logging_config import get_logger
+from .models import OrderRequest, Trip
+from .rate_limit import TokenBucketRegistry
+from .trip_builder import build_matrix_cargo_trip
+
+logger = get_logger(__name__)
+
+# Teto de segurança de pedidos em voo por requisição em /orders/matrix-cargo. Quem regula
+# a concorrência é o limite adaptativo (adaptive_limit); este teto só contém uma requisição
+# enorme. Com o limite adaptativo desligado, volta a ser o limite fixo (padrão 10)
+ORDERS_MAX_CONCURRENCY = int(os.getenv(
+    'ORDERS_MAX_CONCURRENCY', int(ADAPTIVE_LIMIT_MAX) if ADAPTIVE_LIMIT_ENABLED else 10
+))
+# Cota de pedidos por segundo no Painel Logístico, por organização (0 desativa o limite)
+ORDERS_RATE_PER_SECOND = float(os.getenv('ORDERS_RATE_PER_SECOND', 10))
+ORDERS_RATE_BURST = float(os.getenv('ORDERS_RATE_BURST', 0)) or None
+
+order_rate_limits = TokenBucketRegistry(ORDERS_RATE_PER_SECOND, ORDERS_RATE_BURST)
+
+
+def new_trip_external_id() -> str:
+    """externalId enviado à Matrix Cargo: timestamp seguido de 4 dígitos aleatórios"""
+    timestamp = datetime.now()
+    return f"{timestamp.strftime('%Y%m%d%H%M%S')}{random.randint(1000,9999)}"
+
+
+def transform_order_to_matrix_cargo_format(order: dict) -> dict:
+    """Transforma o pedido para o formato esperado pela API do Matrixcargo Painel Logistico"""
+    return {
+        "externalId": order["id"],
+        "cliente": {
+            "cnpj": order["customerCNPJ"],
+            "nome": order["customerName"]
+        },
+        "pontoServicoOrigem": {
+            "cnpj": order["originCNPJ"],
+            "nome": order["originName"]
+        },
+        "dataColeta": order["pickupDate"],
+        "pontoServicoDestino": {
+            "cnpj": order["destinationCNPJ"],
+            "nome": order["destinationName"]
+        },
+        "dataEntrega": order["deliveryDate"],
+        "mercadoriaPerigosa": order["isDangerous"],
+        "precisaDeEscolta": order["needsEscort"],
+        "itens": [
+            {
+                "codigo": order["itemCode"],
+                "descricao": order["itemDescription"],
+                "m3": order["itemVolume"],
+                "peso": order["itemWeight"],
+                "quantidade": order["itemQuantity"],
+                "unidade": order["itemUnit"],
+                "valorUnitario": order["itemUnitPrice"]
+            }
+        ],
+        "tipoMercadoria": {
+            "ativo": True,
+            "descricao": order["merchandiseType"]
+        }
+    }
+
+
+def _matrix_cargo_error_message(error_detail: Any) -> str:
+    """Extrai a mensagem de erro devolvida pela Matrix Cargo no detail da HTTPException"""
+    if isinstance(error_detail, str):
+        try:
+            error_json = json.loads(error_detail)
+            if isinstance(error_json.get('message'), list):
+                return '; '.join(error_json['message'])
+            return str(error_json.get('message', error_detail))
+        except:
+            return error_detail
+    return str(error_detail)
+
+
+def _order_error(order: OrderRequest, message: str) -> Dict[str, Any]:
+    return {
+        "id": order.id,
+        "uniqueId": order.uniqueId,
+        "status": "error",
+        "error": message
+    }
+
+
+async def dispatch_order(matrix_cargo_client: MatrixcargoPainelLogistico, order: OrderRequest):
+    """Envia um pedido; retorna (sucesso, item de results ou de errors)"""
+    try:
+        matrix_cargo_order = transform_order_to_matrix_cargo_format(order.dict())
+        result = await matrix_cargo_client.create_order(matrix_cargo_order)
+        return True, {
+            "id": order.id,
+            "uniqueId": order.uniqueId,
+            "status": "success",
+            "result": result
+        }
+    except HTTPException as e:
+        # Tenta extrair a mensagem de erro da Matrix Cargo
+        error_message = _matrix_cargo_error_message(e.detail)
+    except Exception as e:
+        error_message = str(e)
+
+    logger.warning("Erro ao processar pedido %s (uniqueId: %s): %s", order.id, order.uniqueId, error_message)
+    return False, _order_error(order, error_message)
+
+
+async def _dispatch_order_guarded(
+    matrix_cargo_client: MatrixcargoPainelLogistico,
+    order: OrderRequest,
+    organization_id: str
+):
+    """
+    dispatch_order_once em que qualquer falha (ex. banco travado ao reservar a chave de
+    idempotência) vira o erro do próprio pedido, sem derrubar o lote: os demais pedidos,
+    alguns já criados na Matrix Cargo, continuam com seus resultados
+    """
+    try:
+        return await dispatch_order_once(matrix_cargo_client, order, organization_id)
+    except Exception as e:
+        logger.error("Erro ao processar pedido %s (uniqueId: %s): %s", order.id, order.uniqueId, e)
+        return False, _order_error(order, str(e))
+
+
+async def dispatch_order_once(
+    matrix_cargo_client: MatrixcargoPainelLogistico,
+    order: OrderRequest,
+    organization_id: str
+):
+    """
+    dispatch_order com deduplicação por uniqueId: um pedido já enviado com sucesso
+    devolve o resultado guardado sem nova chamada à Matrix Cargo. Falhas não são guardadas.
+    A cota da organização só é consumida quando o pedido vai de fato à Matrix Cargo.
+    """
+    async def send():
+        await order_rate_limits.get(organization_id).acquire()
+        succeeded, outcome = await dispatch_order(matrix_cargo_client, order)
+        return (200 if succeeded else 400), outcome
+
+    payload = order.dict()
+    try:
+        response = await idempotency.run_idempotent(
+            idempotency.make_key('order', organization_id, order.uniqueId),
+            idempotency.content_hash(payload),
+            send
+        )
+    except (idempotency.IdempotencyConflict, idempotency.IdempotencyInProgress) as e:
+        error_message = (
+            f"Pedido {order.uniqueId} já enviado com outro conteúdo"
+            if isinstance(e, idempotency.IdempotencyConflict)
+            else f"Pedido {order.uniqueId} já está sendo enviado por outra requisição"
+        )
+        logger.warning("Erro ao processar pedido %s (uniqueId: %s): %s", order.id, order.uniqueId, error_message)
+        return False, _order_error(order, error_message)
+
+    if response.replayed:
+        logger.info("Pedido %s (uniqueId: %s) já enviado; resultado reaproveitado", order.id, order.uniqueId)
+    return response.status_code < 400, response.content
+
+
+async def submit_trip(
+    trip: Trip,
+    token: str,
+    organization_id: str,
+    workspace_id: str,
+    external_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Envia a viagem ao Tracking Matrix Cargo e registra o resultado em IntegratedTrip.
+    Usado pelo endpoint síncrono e pelos workers do outbox; falhas viram HTTPException.
+    """
+    try:
+        # Generate a unique externalId in the specific format
+        generated_external_id = external_id or new_trip_external_id()
+
+        # Transform trip data to Matrix Cargo format
+        matrix_cargo_data = build_matrix_cargo_trip(trip, generated_external_id, workspace_id)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Dados preparados para envio: %s", json.dumps(matrix_cargo_data, indent=2))
+
+        try:
+            # Inicializar o client com o token recebido do frontend
+            matrix_cargo_client = MatrixcargoTracking(
+                MATRIXCARGO_TRACKING_API_URL, 
+                token, 
+                organization_id,
+                workspace_id
+            )
+
+            # Primeiro tenta enviar para a Matrix Cargo
+            result = await matrix_cargo_client.create_trip(matrix_cargo_data)
+            logger.debug("Resposta da Matrix Cargo: %s", result)
+            
+            # Se chegou aqui, deu sucesso. Agora salva no banco
+            await save_integrated_trip(
+                generated_external_id,
+                trip.dict(),
+                'success',
+                matrix_cargo_response=result
+            )
+            
+            return {
+                "externalId": generated_external_id,
+                "matrix_cargo_response": result
+            }
+
+        except HTTPException as api_error:
+            error_detail = str(api_error.detail)
+            logger.warning("Erro na API da Matrix Cargo: %s", error_detail)
+            
+            # Se falhou na Matrix Cargo, salva o erro no banco
+            await save_integrated_trip(
+                generated_external_id,
+                trip.dict(),
+                'error',
+                error_message=error_detail
+            )
+            
+            raise HTTPException(
+                status_code=api_error.status_code,
+                detail=f"Erro na integração com Matrix Cargo: {error_detail}"
+            )
+
+    except Exception as e:
+        import traceback
+        error_msg = f"{str(e)}\n{traceback.format_exc()}"
+        logger.error("Erro não tratado: %s", error_msg)
+        
+        # Erro geral - tenta salvar no banco, mas não falha se não conseguir
+        try:
+            await save_integrated_trip(
+                generated_external_id,
+                trip.dict(),
+                'error',
+                error_message=error_msg
+            )
+        except Exception as db_error:
+            logger.error("Failed to store error in database: %s", db_error)
+        
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao processar viagem: {error_msg}"
+        )
+
+
+async def submit_orders(
+    orders: List[OrderRequest],
+    token: str,
+    organization_id: str,
+    workspace_id: str
+) -> Dict[str, Any]:
+    """Envia os pedidos ao Painel Logístico e resume os resultados na ordem recebida"""
+    matrix_cargo_client = MatrixcargoPainelLogistico(
+        MATRIXCARGO_PAINEL_LOGISTICO_API_URL,
+        token,
+        organization_id,
+        workspace_id
+    )
+    
+    # Envia os pedidos em paralelo, limitado pelo limite adaptativo (dentro do teto do
+    # semáforo) e pela cota da organização;
+    # gather preserva a ordem de entrada, então cada resultado segue com seu uniqueId
+    semaphore = asyncio.Semaphore(max(ORDERS_MAX_CONCURRENCY, 1))
+
+    async def dispatch(order: OrderRequest):
+        async with semaphore:
+            return await _dispatch_order_guarded(matrix_cargo_client, order, organization_id)
+
+    outcomes = await asyncio.gather(*(dispatch(order) for order in orders))
+
+    results = [outcome for succeeded, outcome in outcomes if succeeded]
+    errors = [outcome for succeeded, outcome in outcomes if not succeeded]
+    
+    return {
+        "results": results,
+        "errors": errors,
+        "total": len(orders),
+        "success": len(results),
+        "failed": len(errors)
+    }
+
+
+
+async def stream_orders(
+    orders: List[OrderRequest],
+    token: str,
+    organization_id: str,
+    workspace_id: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Variante de submit_orders que entrega um evento por pedido assim que o envio termina
+    (na ordem de conclusão, com o índice do pedido no lote) e, no fim, o evento de resumo.
+    Os pedidos em voo seguem o limite adaptativo, até o teto ORDERS_MAX_CONCURRENCY, e
+    nenhum resultado é acumulado.
+    Se o consumidor parar de ler (cliente desconectou), os envios pendentes são cancelados.
+    """
+    matrix_cargo_client = MatrixcargoPainelLogistico(
+        MATRIXCARGO_PAINEL_LOGISTICO_API_URL,
+        token,
+        organization_id,
+        workspace_id
+    )
+    concurrency = max(ORDERS_MAX_CONCURRENCY, 1)
+    # Fila limitada: workers só pegam o próximo pedido depois que o evento anterior foi lido
+    outcomes: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    pending = iter(enumerate(orders))
+
+    async def worker():
+        for index, order in pending:
+            # Com a falha convertida em erro do pedido, o evento sempre chega e o stream não para
+            succeeded, outcome = await _dispatch_order_guarded(matrix_cargo_client, order, organization_id)
+            await outcomes.put((index, succeeded, outcome))
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(orders)))]
+    success = 0
+    failed = 0
+    try:
+        for _ in range(len(orders)):
+            index, succeeded, outcome = await outcomes.get()
+            if succeeded:
+                success += 1
+            else:
+                failed += 1
+            yield {"type": "result" if succeeded else "error", "index": index, **outcome}
+
+        yield {
+            "type": "summary",
+            "total": len(orders),
+            "success": success,
+            "failed": failed
+        }
+    finally:
+        pending_workers = [task for task in workers if not task.done()]
+        if pending_workers:
+            logger.info(
+                "Envio de pedidos interrompido após %d de %d; cancelando os pendentes",
+                success + failed, len(orders)
+            )
+        for task in pending_workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+# Execução assíncrona: cada viagem ou pedido é um item do outbox
+
+async def _run_trip_item(item: outbox.ClaimedItem) -> Tuple[bool, Any, Optional[str]]:
+    trip = Trip(**item.payload["trip"])
+    external_id = item.payload["externalId"]
+    try:
+        # Reexecução após queda do worker: se a viagem já foi registrada, não reenvia
+        integrated_trip = await get_integrated_trip(external_id)
+        if integrated_trip is not None:
+            if integrated_trip.status == 'success':
+                return True, {"externalId": external_id, "matrix_cargo_response": integrated_trip.matrix_cargo_response}, None
+            return False, None, integrated_trip.error_message
+
+        result = await submit_trip(
+            trip, item.token, item.organization_id, item.workspace_id,
+            external_id=external_id
+        )
+        return True, result, None
+    except HTTPException as e:
+        return False, None, str(e.detail)
+
+
+async def _run_order_item(item: outbox.ClaimedItem) -> Tuple[bool, Any, Optional[str]]:
+    order = OrderRequest(**item.payload)
+    matrix_cargo_client = MatrixcargoPainelLogistico(
+        MATRIXCARGO_PAINEL_LOGISTICO_API_URL,
+        item.token,
+        item.organization_id,
+        item.workspace_id
+    )
+    succeeded, outcome = await dispatch_order_once(matrix_cargo_client, order, item.organization_id)
+    return succeeded, outcome, None if succeeded else outcome["error"]
+
+
+outbox.register_handler('trip', _run_trip_item)
+outbox.register_handler('orders', _run_order_item)
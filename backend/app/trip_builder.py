@@ -0,0 +1,128 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from .models import Stop, Trip
+
+# Valores fixos enviados em toda viagem
+_TRANSPORTER = {
+    "cnpj": "29551997000150",
+    "name": "Regler",
+    "abbreviation": "RGL",
+    "email": "contact2@matrixcargo.com"
+}
+_CUSTOMER = {
+    "cnpj": "29551997000150",
+    "name": "Regler"
+}
+
+
+def _build_stop(stop: Stop, sequence: int, window_start: str, window_end: str) -> Dict[str, Any]:
+    """Monta a parada percorrendo as notas uma única vez"""
+    is_delivery = stop.type == "ENTREGA"
+    weight = 0
+    volume = 0
+    proof_of_delivery: List[Dict[str, Any]] = []
+    orders: List[Dict[str, Any]] = []
+
+    for note in stop.notes:
+        note_weight = note.transporte.pesoBruto * 1000
+        note_volume = note.transporte.volume * 1000000000
+        weight += note_weight
+        volume += note_volume
+        if is_delivery:
+            proof_of_delivery.append({
+                "type": "CANHOTO_NOTA_FISCAL",
+                "quantity": 1,
+                "identifier": note.chaveAcesso
+            })
+        orders.append({
+            "externalId": note.chaveAcesso,
+            "items": [
+                {
+                    "code": note.numeroNF,
+                    "description": "NF",
+                    "weightInGrams": int(note_weight),
+                    "volumeInCubicMillimeters": int(note_volume),
+                    "unitOfMeasure": "UN",
+                    "quantity": 1,
+                    "unitPriceInCents": 0,
+                    "totalPriceInCents": 0
+                }
+            ]
+        })
+
+    address = stop.address
+    return {
+        "type": "PICKUP" if stop.type == "COLETA" else "DELIVERY",
+        "sequence": sequence,
+        "weightInGrams": int(weight),
+        "volumeInCubicMillimeters": int(volume),
+        "timeWindowStart": window_start,
+        "timeWindowEnd": window_end,
+        "requiresPickupInvoice": False,
+        "requiresProofOfDelivery": is_delivery,
+        "proofOfDeliveryDetails": proof_of_delivery,
+        "servicePoint": {
+            "name": stop.companyName,
+            "cnpj": stop.cnpj,
+            "address": {
+                "street": address.logradouro,
+                "number": address.numero,
+                "neighborhood": address.bairro,
+                "complement": "",
+                "country": "BRASIL",
+                "city": address.municipio,
+                "state": address.uf,
+                "zipCode": address.cep,
+                "latitude": "0",
+                "longitude": "0"
+            }
+        },
+        "orders": orders
+    }
+
+
+def build_matrix_cargo_trip(
+    trip: Trip,
+    external_id: str,
+    workspace_id: str,
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Transforma a viagem no formato esperado pelo Tracking Matrix Cargo.
+    Um único instante (now, UTC) vale para toda a viagem: início estimado e
+    janelas de atendimento de todas as paradas.
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    window_start = (now + timedelta(days=1)).isoformat()
+    window_end = (now + timedelta(days=1, hours=2)).isoformat()
+
+    return {
+        "externalId": external_id,
+        "licensePlates": [trip.vehicle.plate],
+        "estimatedStart": now.isoformat(),
+        "tripDetails": {},
+        "transporter": dict(_TRANSPORTER),
+        "workspace": {
+            "id": workspace_id,
+            "name": "Operação"
+        },
+        "customer": dict(_CUSTOMER),
+        "driver": {
+            "name": trip.driver.name,
+            "cpf": trip.driver.document,
+            "email": f"driver{random.randint(1000,99999)}@matrixcargo.com",
+            "phone": "+5500000000000"
+        },
+        "tags": [
+            {
+                "name": "INTEGRATION"
+            }
+        ],
+        "tripStops": [
+            _build_stop(stop, idx, window_start, window_end)
+            for idx, stop in enumerate(trip.stops)
+        ]
+    }
@@ -1,31 +1,30 @@
-import xml.etree.ElementTree as ET
-from typing import List, Dict, Any, Optional
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Deque, List, Dict, Any, Iterable, Optional, Tuple, Union
 from fastapi import UploadFile
 from datetime import datetime
+from .nfe_parser import parse_nfe, parse_nfe_chunks
+from .nfe_schema import PLAN
+from .nfe_cache import content_digest, nfe_cache
+from .nfe_records import NFNote
+from .logging_config import get_logger, merge_timings, stage, start_timings
+
+logger = get_logger(__name__)
 
 class NFXMLProcessor:
-    def __init__(self, xml_content: str):
-        self.root = ET.fromstring(xml_content)
-        # Obtém o namespace da NFe
-        self.ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+    def __init__(self, xml_content: Union[str, bytes]):
+        # Validação e extração usam o resultado de uma única passada pelo XML
+        self.nfe = parse_nfe(xml_content)
 
-    def _find_with_ns(self, element: ET.Element, path: str) -> Optional[ET.Element]:
-        """Busca elementos considerando o namespace da NFe"""
-        try:
-            if element is None:
-                print(f"Elemento base é None para path: {path}")
-                return None
-            
-            if not isinstance(element, ET.Element):
-                print(f"Elemento não é do tipo Element para path: {path}")
-                return None
-            
-            result = element.find(f'.//nfe:{path}', self.ns)
-            print(f"Buscando path: {path}, Resultado: {'Encontrado' if result is not None else 'Não encontrado'}")
-            return result
-        except Exception as e:
-            print(f"Erro ao buscar {path}: {str(e)}")
-            return None
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[bytes]) -> 'NFXMLProcessor':
+        """Cria o processador alimentando o extrator bloco a bloco, sem montar o XML inteiro em memória"""
+        processor = cls.__new__(cls)
+        processor.nfe = parse_nfe_chunks(chunks)
+        return processor
 
     def validate(self) -> Dict[str, List[str]]:
         """
@@ -39,88 +38,24 @@ class NFXMLProcessor:
         }
         
         try:
-            nfe = self.root.find('.//nfe:NFe', self.ns)
-            if nfe is None:
+            if not self.nfe.has_nfe:
                 validation_result["is_valid"] = False
                 validation_result["missing_fields"].append("NFe (Nota Fiscal não encontrada no XML)")
                 return validation_result
             
-            infNFe = nfe.find('.//nfe:infNFe', self.ns)
-            if infNFe is None:
+            if not self.nfe.has_inf_nfe:
                 validation_result["is_valid"] = False
                 validation_result["missing_fields"].append("infNFe (Informações da Nota Fiscal não encontradas)")
                 return validation_result
         
-            # Estrutura de campos obrigatórios com mensagens descritivas
-            required_fields = {
-                'emit': {
-                    'fields': ['CNPJ', 'xNome'],
-                    'messages': {
-                        'CNPJ': 'CNPJ do Remetente',
-                        'xNome': 'Nome do Remetente'
-                    }
-                },
-                'dest': {
-                    'fields': ['CNPJ', 'xNome'],
-                    'messages': {
-                        'CNPJ': 'CNPJ do Destinatário',
-                        'xNome': 'Nome do Destinatário'
-                    }
-                },
-                'enderEmit': {
-                    'fields': ['xLgr', 'nro', 'xBairro', 'xMun', 'UF', 'CEP'],
-                    'messages': {
-                        'xLgr': 'Logradouro do Remetente',
-                        'nro': 'Número do Remetente',
-                        'xBairro': 'Bairro do Remetente',
-                        'xMun': 'Município do Remetente',
-                        'UF': 'UF do Remetente',
-                        'CEP': 'CEP do Remetente'
-                    }
-                },
-                'enderDest': {
-                    'fields': ['xLgr', 'nro', 'xBairro', 'xMun', 'UF', 'CEP'],
-                    'messages': {
-                        'xLgr': 'Logradouro do Destinatário',
-                        'nro': 'Número do Destinatário',
-                        'xBairro': 'Bairro do Destinatário',
-                        'xMun': 'Município do Destinatário',
-                        'UF': 'UF do Destinatário',
-                        'CEP': 'CEP do Destinatário'
-                    }
-                },
-                'ide': {
-                    'fields': ['nNF'],
-                    'messages': {
-                        'nNF': 'Número da Nota Fiscal'
-                    }
-                }
-            }
-            
-            # Verifica cada grupo de campos
-            for section, config in required_fields.items():
-                base_element = self._find_with_ns(infNFe, section)
-                
-                if base_element is None:
-                    validation_result["is_valid"] = False
-                    validation_result["missing_fields"].append(f"Seção {section} não encontrada")
-                    continue
-                
-                for field in config['fields']:
-                    field_element = self._find_with_ns(base_element, field)
-                    if field_element is None or not field_element.text:
-                        validation_result["is_valid"] = False
-                        field_message = config['messages'].get(field, field)
-                        validation_result["missing_fields"].append(
-                            f"Campo {field_message} não encontrado ou vazio"
-                        )
+            # Campos obrigatórios e mensagens vêm do plano compilado em nfe_schema
+            missing_fields = PLAN.validate(self.nfe.sections)
+            if missing_fields:
+                validation_result["is_valid"] = False
+                validation_result["missing_fields"] = missing_fields
             
             return validation_result
             
-        except ET.ParseError:
-            validation_result["is_valid"] = False
-            validation_result["missing_fields"].append("Erro ao processar XML: formato inválido")
-            return validation_result
         except Exception as e:
             validation_result["is_valid"] = False
             validation_result["missing_fields"].append(f"Erro inesperado: {str(e)}")
@@ -129,125 +64,176 @@ class NFXMLProcessor:
     def extract_data(self) -> Dict[str, Any]:
         """Extrai os dados relevantes do XML da NFe"""
         try:
-            print("Iniciando extração de dados...")
+            logger.debug("Iniciando extração de dados...")
             
-            # Verifica se root é válido
-            if not isinstance(self.root, ET.Element):
-                raise ValueError(f"Root inválido: {type(self.root)}")
-            
-            # Encontra elementos principais
-            nfe = self.root.find('.//nfe:NFe', self.ns)
-            if nfe is None:
-                print("NFe não encontrada")
+            if not self.nfe.has_nfe:
                 raise ValueError("NFe não encontrada no XML")
             
-            infNFe = nfe.find('.//nfe:infNFe', self.ns)
-            if infNFe is None:
-                print("infNFe não encontrada")
+            if not self.nfe.has_inf_nfe:
                 raise ValueError("infNFe não encontrada no XML")
 
-            # Função auxiliar para extrair texto
-            def get_text(element: Optional[ET.Element], path: str) -> str:
-                if element is None:
-                    print(f"Elemento None para path: {path}")
-                    return ''
-                el = self._find_with_ns(element, path)
-                if el is None:
-                    print(f"Elemento não encontrado para path: {path}")
-                    return ''
-                return el.text if el is not None and el.text else ''
-
-            # Busca o elemento ide separadamente
-            ide = self._find_with_ns(infNFe, 'ide')
-            numero_nf = get_text(ide, 'nNF') if ide is not None else ''
-
-            # Extrair a chave de acesso
-            chave_acesso = infNFe.attrib.get('Id', '').replace('NFe', '') if infNFe is not None else ''
-
-            # Extrai dados com verificações
-            emit = self._find_with_ns(infNFe, 'emit')
-            if emit is None:
-                print("Emitente não encontrado")
-                raise ValueError("Emitente não encontrado")
-            
-            enderEmit = self._find_with_ns(emit, 'enderEmit')
-            if enderEmit is None:
-                print("Endereço do emitente não encontrado")
-                raise ValueError("Endereço do emitente não encontrado")
-
-            dest = self._find_with_ns(infNFe, 'dest')
-            if dest is None:
-                print("Destinatário não encontrado")
-                raise ValueError("Destinatário não encontrado")
-            
-            enderDest = self._find_with_ns(dest, 'enderDest')
-            if enderDest is None:
-                print("Endereço do destinatário não encontrado")
-                raise ValueError("Endereço do destinatário não encontrado")
-
-            # Extrai dados do transporte (opcional)
-            transp = self._find_with_ns(infNFe, 'transp')
-            vol = None if transp is None else self._find_with_ns(transp, 'vol')
-
-            # Valores default para transporte
-            volume = 1
-            peso_bruto = 0.0
-            
-            if vol is not None:
-                volume_text = get_text(vol, 'qVol')
-                peso_text = get_text(vol, 'pesoB')
-                try:
-                    volume = int(volume_text) if volume_text else 1
-                    peso_bruto = float(peso_text) if peso_text else 0.0
-                except (ValueError, TypeError) as e:
-                    print(f"Erro ao converter valores de transporte: {e}")
-                    volume = 1
-                    peso_bruto = 0.0
-
-            # Monta o resultado
-            result = {
-                "numeroNF": numero_nf,
-                "chaveAcesso": chave_acesso,
-                "remetente": {
-                    "cnpj": get_text(emit, 'CNPJ'),
-                    "nome": get_text(emit, 'xNome'),
-                    "endereco": {
-                        "logradouro": get_text(enderEmit, 'xLgr'),
-                        "numero": get_text(enderEmit, 'nro'),
-                        "bairro": get_text(enderEmit, 'xBairro'),
-                        "municipio": get_text(enderEmit, 'xMun'),
-                        "uf": get_text(enderEmit, 'UF'),
-                        "cep": get_text(enderEmit, 'CEP')
-                    }
-                },
-                "destinatario": {
-                    "cnpj": get_text(dest, 'CNPJ'),
-                    "nome": get_text(dest, 'xNome'),
-                    "endereco": {
-                        "logradouro": get_text(enderDest, 'xLgr'),
-                        "numero": get_text(enderDest, 'nro'),
-                        "bairro": get_text(enderDest, 'xBairro'),
-                        "municipio": get_text(enderDest, 'xMun'),
-                        "uf": get_text(enderDest, 'UF'),
-                        "cep": get_text(enderDest, 'CEP')
-                    }
-                },
-                "transporte": {
-                    "volume": volume,
-                    "pesoBruto": peso_bruto
-                }
-            }
-
-            print("Dados extraídos com sucesso")
+            # Monta o resultado conforme o plano compilado em nfe_schema
+            result = PLAN.extract(self.nfe.sections)
+
+            logger.debug("Dados extraídos com sucesso")
             return result
 
         except Exception as e:
-            print(f"Erro na extração de dados: {str(e)}")
+            logger.debug("Erro na extração de dados: %s", e)
             raise ValueError(f"Erro ao extrair dados: {str(e)}")
 
+# Quantidade de processos usados no parsing dos XMLs (0 processa no próprio event loop)
+XML_PROCESS_POOL_SIZE = int(os.getenv('XML_PROCESS_POOL_SIZE', os.cpu_count() or 1))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=XML_PROCESS_POOL_SIZE)
+    return _process_pool
+
+def shutdown_process_pool() -> None:
+    """Encerra o pool de processos de parsing, se tiver sido criado"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+
+def parse_xml_content(content: bytes) -> Tuple[Optional[NFNote], Optional[List[str]]]:
+    """
+    Valida e extrai os dados de uma NF-e.
+    Os bytes vão direto para o parser, que respeita o encoding declarado no XML
+    (ver nfe_parser.parse_nfe para o fallback).
+    Executada nos processos do pool, por isso recebe e devolve apenas dados serializáveis.
+    Returns:
+        Tupla (NFNote, None) ou (None, lista de erros)
+    """
+    # Processa o XML
+    try:
+        with stage('parse'):
+            processor = NFXMLProcessor(content)
+        return validate_and_extract(processor)
+        
+    except ValueError as e:
+        return None, [str(e)]
+    except Exception as e:
+        return None, [f"Erro ao processar XML: {str(e)}"]
+
+def validate_and_extract(processor: NFXMLProcessor) -> Tuple[Optional[NFNote], Optional[List[str]]]:
+    """Valida a NF-e já lida e, se válida, extrai seus dados como registro compacto"""
+    with stage('validate'):
+        validation = processor.validate()
+    
+    if not validation["is_valid"]:
+        return None, validation["missing_fields"]
+    
+    with stage('extract'):
+        return NFNote.from_dict(processor.extract_data()), None
+
+def new_note_id(numero_nf: str) -> str:
+    """ID gerado para cada nota fiscal devolvida em um upload"""
+    return f"nf_{numero_nf}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+def _parse_xml_content_timed(content: bytes):
+    """Versão de parse_xml_content para o pool, que devolve também as medições do processo"""
+    timings = start_timings()
+    data, errors = parse_xml_content(content)
+    return data, errors, timings
+
+async def _parse_in_pool(content: bytes) -> Tuple[Optional[NFNote], Optional[List[str]]]:
+    global _process_pool
+    if XML_PROCESS_POOL_SIZE <= 0:
+        return parse_xml_content(content)
+
+    loop = asyncio.get_running_loop()
+    executor = _get_process_pool()
+    try:
+        data, errors, timings = await loop.run_in_executor(
+            executor, _parse_xml_content_timed, content
+        )
+        merge_timings(timings)
+        return data, errors
+    except BrokenProcessPool:
+        # Um processo morreu: encerra o pool quebrado (processos e threads que restaram)
+        # e o descarta para que o próximo arquivo crie um novo. Outro arquivo do mesmo
+        # pool pode já ter feito isso
+        if _process_pool is executor:
+            _process_pool = None
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+async def _process_file(file: UploadFile) -> Tuple[Optional[NFNote], Optional[List[str]]]:
+    try:
+        # Lê o conteúdo do arquivo
+        content = await file.read()
+        if not content:
+            return None, ["Arquivo vazio"]
+
+        # XMLs já enviados antes não passam de novo por decode/parse
+        digest = None
+        if nfe_cache.enabled:
+            digest = content_digest(content)
+            cached = nfe_cache.get(digest)
+            if cached is not None:
+                return cached, None
+
+        data, errors = await _parse_in_pool(content)
+        if digest is not None and data is not None:
+            nfe_cache.put(digest, data)
+        return data, errors
+
+    except Exception as e:
+        return None, [f"Erro ao processar arquivo: {str(e)}"]
+    finally:
+        await file.seek(0)
+
+async def _invalid_file() -> Tuple[Optional[NFNote], Optional[List[str]]]:
+    return None, ["Arquivo inválido"]
+
+async def iter_xml_files(
+    files: List[UploadFile]
+) -> AsyncIterator[Tuple[str, Optional[NFNote], Optional[List[str]]]]:
+    """
+    Processa os arquivos XML e gera (nome do arquivo, dados, erros) na ordem do upload,
+    assim que cada arquivo termina.
+    Apenas uma janela de arquivos fica em processamento ao mesmo tempo, o que mantém
+    a memória constante; se o consumidor parar de iterar, os pendentes são cancelados.
+    """
+    window = max(XML_PROCESS_POOL_SIZE, 1) * 2
+    pending: Deque[Tuple[str, asyncio.Future]] = deque()
+    remaining = iter(files)
+
+    def schedule() -> None:
+        for file in remaining:
+            # Verifica se o arquivo é válido antes de enviá-lo ao pool
+            if not hasattr(file, 'filename') or not hasattr(file, 'read'):
+                pending.append(("error", asyncio.ensure_future(_invalid_file())))
+            else:
+                pending.append((file.filename, asyncio.ensure_future(_process_file(file))))
+            if len(pending) >= window:
+                return
+
+    try:
+        schedule()
+        while pending:
+            filename, task = pending.popleft()
+            data, errors = await task
+            schedule()
+
+            if data is not None:
+                # Adiciona um ID único para cada nota fiscal
+                data = data.with_id(new_note_id(data.numeroNF))
+            yield filename, data, errors
+    finally:
+        for _, task in pending:
+            task.cancel()
+
 async def process_xml_files(files: List[UploadFile]) -> Dict[str, Any]:
     """
     Processa múltiplos arquivos XML
+    O parsing de cada arquivo roda no pool de processos, mantendo o event loop livre;
+    os resultados são reunidos na ordem do upload.
     Args:
         files: Lista de arquivos XML para processar
     Returns:
@@ -271,56 +257,15 @@ async def process_xml_files(files: List[UploadFile]) -> Dict[str, Any]:
     }
     
     try:
-        for file in files:
-            try:
-                # Verifica se o arquivo é válido
-                if not hasattr(file, 'filename') or not hasattr(file, 'read'):
-                    results["validation_errors"]["error"] = ["Arquivo inválido"]
-                    continue
-
-                # Lê o conteúdo do arquivo
-                content = await file.read()
-                if not content:
-                    results["validation_errors"][file.filename] = ["Arquivo vazio"]
-                    continue
-
-                # Tenta diferentes encodings
-                for encoding in ['utf-8', 'latin1', 'cp1252']:
-                    try:
-                        xml_content = content.decode(encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
-                    results["validation_errors"][file.filename] = ["Não foi possível decodificar o arquivo"]
-                    continue
-
-                # Processa o XML
-                try:
-                    processor = NFXMLProcessor(xml_content)
-                    validation = processor.validate()
-                    
-                    if not validation["is_valid"]:
-                        results["validation_errors"][file.filename] = validation["missing_fields"]
-                        continue
-                    
-                    data = processor.extract_data()
-                    # Adiciona um ID único para cada nota fiscal
-                    data["id"] = f"nf_{data['numeroNF']}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    results["processed_data"].append(data)
-                    
-                except ValueError as e:
-                    results["validation_errors"][file.filename] = [str(e)]
-                except Exception as e:
-                    results["validation_errors"][file.filename] = [f"Erro ao processar XML: {str(e)}"]
-                    
-            except Exception as e:
-                results["validation_errors"][file.filename] = [f"Erro ao processar arquivo: {str(e)}"]
-            finally:
-                await file.seek(0)
+        async for filename, data, errors in iter_xml_files(files):
+            if errors is not None:
+                results["validation_errors"][filename] = errors
+                continue
+
+            results["processed_data"].append(data)
 
         return results
 
     except Exception as e:
-        print(f"Erro geral no processamento: {str(e)}")
-        raise ValueError(f"Erro no processamento dos arquivos: {str(e)}") 
\ No newline at end of file
+        logger.exception("Erro geral no processamento: %s", e)
+        raise ValueError(f"Erro no processamento dos arquivos: {str(e)}")
@@ -0,0 +1,7 @@
+"""
+Benchmarks do pipeline de ingestão de NF-e.
+
+Executar a partir de backend/:
+    python -m benchmarks.bench_xml       # validate, extract_data e process_xml_files
+    python -m benchmarks.bench_upload    # /upload de ponta a ponta via TestClient
+"""
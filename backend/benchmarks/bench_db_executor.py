@@ -0,0 +1,137 @@
+"""
+Benchmark da gravação de IntegratedTrip: sessão síncrona no event loop x db_executor.
+
+    python -m benchmarks.bench_db_executor --trips 200 --concurrency 20 --stops 20
+
+Simula envios de viagem concorrentes (espera do upstream + gravação do resultado) e,
+ao mesmo tempo, requisições leves que não usam o banco. Com a gravação no event loop,
+cada commit do SQLite para todas as outras requisições; com o db_executor, só a
+própria requisição espera. Mede o tempo total, o atraso do event loop e a latência
+das requisições leves.
+
+Roda em um diretório temporário: o banco da aplicação é sqlite:///./trips.db.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from .bench_trip_builder import generate_trip
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(fraction * len(ordered) + 0.999999) - 1))]
+
+
+async def _scenario(save: Callable[[str, Any], Any], trips: int, concurrency: int,
+                    trip_data: Dict[str, Any], upstream_latency: float, prefix: str) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    lags: List[float] = []
+    light_latencies: List[float] = []
+    running = True
+
+    async def submit(number: int) -> None:
+        async with semaphore:
+            await asyncio.sleep(upstream_latency)
+            await save(f"{prefix}-{number}", trip_data)
+
+    async def ticker() -> None:
+        # Atraso do event loop: quanto um sleep de 1ms demora além do pedido
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    async def light_requests() -> None:
+        # Requisições que não tocam o banco, como /organizations vindo do cache
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0)
+            light_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.005)
+
+    background = [asyncio.ensure_future(ticker()), asyncio.ensure_future(light_requests())]
+    start = time.perf_counter()
+    await asyncio.gather(*(submit(number) for number in range(trips)))
+    elapsed = time.perf_counter() - start
+    running = False
+    await asyncio.gather(*background)
+
+    return {
+        "seconds": elapsed,
+        "trips_per_second": trips / elapsed,
+        "loop_lag_p50_ms": _percentile(lags, 0.50) * 1000,
+        "loop_lag_p99_ms": _percentile(lags, 0.99) * 1000,
+        "loop_lag_max_ms": max(lags) * 1000 if lags else 0.0,
+        "light_p99_ms": _percentile(light_latencies, 0.99) * 1000,
+        "light_max_ms": max(light_latencies) * 1000 if light_latencies else 0.0
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.database import IntegratedTrip, SessionLocal
+    from app.db_executor import shutdown_db_executor, start_db_executor
+    from app.integrated_trips import save_integrated_trip
+
+    trip_data = json.loads(generate_trip(args.stops, args.notes).json())
+
+    async def save_on_loop(external_id: str, data: Any) -> None:
+        # Como create_matrix_cargo_trip fazia: sessão síncrona dentro do handler async
+        db = SessionLocal()
+        try:
+            db.add(IntegratedTrip(external_id=external_id, trip_data=data, status='success'))
+            db.commit()
+        finally:
+            db.close()
+
+    async def save_in_executor(external_id: str, data: Any) -> None:
+        await save_integrated_trip(external_id, data, 'success')
+
+    start_db_executor()
+    try:
+        results = []
+        for name, save in (("sessão no event loop", save_on_loop), ("db_executor", save_in_executor)):
+            result = await _scenario(save, args.trips, args.concurrency, trip_data,
+                                     args.upstream_latency, f"{name[:2]}-{time.time_ns()}")
+            results.append({"name": name, **result})
+        return results
+    finally:
+        shutdown_db_executor()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trips', type=int, default=200, help='viagens gravadas por cenário')
+    parser.add_argument('--concurrency', type=int, default=20, help='envios simultâneos')
+    parser.add_argument('--stops', type=int, default=20, help='paradas por viagem (tamanho do trip_data)')
+    parser.add_argument('--notes', type=int, default=3, help='notas por parada')
+    parser.add_argument('--upstream-latency', type=float, default=0.02, help='espera simulada da Matrix Cargo (s)')
+    parser.add_argument('--json', help='grava os resultados neste arquivo JSON')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.json) if args.json else None
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        results = asyncio.run(run(args))
+
+    print(f"{'cenário':<22} {'tempo (s)':>10} {'viagens/s':>10} {'lag p50':>8} {'lag p99':>8} "
+          f"{'lag máx':>8} {'leve p99':>9} {'leve máx':>9}   (ms)")
+    for result in results:
+        print(
+            f"{result['name']:<22} {result['seconds']:>10.3f} {result['trips_per_second']:>10.1f} "
+            f"{result['loop_lag_p50_ms']:>8.2f} {result['loop_lag_p99_ms']:>8.2f} {result['loop_lag_max_ms']:>8.2f} "
+            f"{result['light_p99_ms']:>9.2f} {result['light_max_ms']:>9.2f}"
+        )
+    if output:
+        with open(output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
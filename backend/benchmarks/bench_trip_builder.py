@@ -0,0 +1,207 @@
+"""
+Benchmark do montador de payload de viagens (app.trip_builder) e da serialização JSON.
+
+    python -m benchmarks.bench_trip_builder --stops 10,100,500 --notes 5
+
+Compara com a implementação anterior (comprehensions aninhadas, datetime.now() por
+parada) e confere, com o relógio congelado, que os dois payloads são idênticos byte a byte.
+"""
+import argparse
+import json
+import random
+from datetime import datetime as real_datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from app import json_codec
+from app.models import Address, Driver, Note, Stop, Transport, Trip, Vehicle
+from app.trip_builder import build_matrix_cargo_trip
+
+from .common import BenchResult, measure, parse_sizes, print_results
+
+datetime = real_datetime
+
+
+def legacy_build_matrix_cargo_trip(trip: Trip, external_id: str, workspace_id: str) -> Dict[str, Any]:
+    """Montador anterior, mantido aqui apenas como referência de desempenho e de formato"""
+    return {
+        "externalId": external_id,
+        "licensePlates": [trip.vehicle.plate],
+        "estimatedStart": datetime.now(timezone.utc).isoformat(),
+        "tripDetails": {},
+        "transporter": {
+            "cnpj": "29551997000150",
+            "name": "Regler",
+            "abbreviation": "RGL",
+            "email": "contact2@matrixcargo.com"
+        },
+        "workspace": {
+            "id": workspace_id,
+            "name": "Operação"
+        },
+        "customer": {
+            "cnpj": "29551997000150",
+            "name": "Regler"
+        },
+        "driver": {
+            "name": trip.driver.name,
+            "cpf": trip.driver.document,
+            "email": f"driver{random.randint(1000,99999)}@matrixcargo.com",
+            "phone": "+5500000000000"
+        },
+        "tags": [
+            {
+                "name": "INTEGRATION"
+            }
+        ],
+        "tripStops": [
+            {
+                "type": "PICKUP" if stop.type == "COLETA" else "DELIVERY",
+                "sequence": idx,
+                "weightInGrams": int(sum(note.transporte.pesoBruto * 1000 for note in stop.notes)),
+                "volumeInCubicMillimeters": int(sum(note.transporte.volume * 1000000000 for note in stop.notes)),
+                "timeWindowStart": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+                "timeWindowEnd": (datetime.now(timezone.utc) + timedelta(days=1, hours=2)).isoformat(),
+                "requiresPickupInvoice": False,
+                "requiresProofOfDelivery": stop.type == "ENTREGA",
+                "proofOfDeliveryDetails": [
+                    {
+                        "type": "CANHOTO_NOTA_FISCAL",
+                        "quantity": 1,
+                        "identifier": note.chaveAcesso
+                    } for note in stop.notes
+                ] if stop.type == "ENTREGA" else [],
+                "servicePoint": {
+                    "name": stop.companyName,
+                    "cnpj": stop.cnpj,
+                    "address": {
+                        "street": stop.address.logradouro,
+                        "number": stop.address.numero,
+                        "neighborhood": stop.address.bairro,
+                        "complement": "",
+                        "country": "BRASIL",
+                        "city": stop.address.municipio,
+                        "state": stop.address.uf,
+                        "zipCode": stop.address.cep,
+                        "latitude": "0",
+                        "longitude": "0"
+                    }
+                },
+                "orders": [
+                    {
+                        "externalId": note.chaveAcesso,
+                        "items": [
+                            {
+                                "code": note.numeroNF,
+                                "description": "NF",
+                                "weightInGrams": int(note.transporte.pesoBruto * 1000),
+                                "volumeInCubicMillimeters": int(note.transporte.volume * 1000000000),
+                                "unitOfMeasure": "UN",
+                                "quantity": 1,
+                                "unitPriceInCents": 0,
+                                "totalPriceInCents": 0
+                            }
+                        ]
+                    } for note in stop.notes
+                ]
+            } for idx, stop in enumerate(trip.stops)
+        ]
+    }
+
+
+def generate_trip(stops: int, notes_per_stop: int, seed: int = 0) -> Trip:
+    """Viagem sintética: paradas alternando coleta e entrega, com notas de peso e volume variados"""
+    rng = random.Random(seed)
+    trip_stops: List[Stop] = []
+    for sequence in range(stops):
+        notes = [
+            Note(
+                id=f"nf_{sequence}_{index}",
+                numeroNF=str(rng.randint(1, 999999)),
+                chaveAcesso=''.join(str(rng.randint(0, 9)) for _ in range(44)),
+                transporte=Transport(volume=rng.randint(1, 50), pesoBruto=rng.randint(1, 500000) / 1000)
+            )
+            for index in range(notes_per_stop)
+        ]
+        trip_stops.append(Stop(
+            type='COLETA' if sequence % 2 == 0 else 'ENTREGA',
+            address=Address(logradouro='Av. Paulista', numero=str(sequence), bairro='Centro',
+                            municipio='São Paulo', uf='SP', cep='01310100'),
+            notes=notes,
+            sequence=sequence,
+            companyName=f"Empresa {sequence}",
+            cnpj=f"{sequence:014d}"
+        ))
+    return Trip(
+        externalId='bench',
+        driver=Driver(name='Motorista', document='12345678900'),
+        vehicle=Vehicle(plate='ABC1D23'),
+        stops=trip_stops
+    )
+
+
+class _FrozenDatetime(real_datetime):
+    frozen = real_datetime(2024, 1, 15, 13, 30, tzinfo=timezone.utc)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.frozen if tz is not None else cls.frozen.replace(tzinfo=None)
+
+
+def check_identical(trip: Trip) -> None:
+    """Com relógio e sorteios fixos, os dois montadores devem gerar os mesmos bytes"""
+    global datetime
+    datetime = _FrozenDatetime
+    try:
+        random.seed(1)
+        legacy = legacy_build_matrix_cargo_trip(trip, 'ext', 'ws')
+        random.seed(1)
+        current = build_matrix_cargo_trip(trip, 'ext', 'ws', now=_FrozenDatetime.frozen)
+    finally:
+        datetime = real_datetime
+    if json.dumps(legacy).encode('utf-8') != json.dumps(current).encode('utf-8'):
+        raise AssertionError("payload do trip_builder difere do montador anterior")
+
+
+def bench_trip(stops: int, notes_per_stop: int, repeat: int) -> List[BenchResult]:
+    trip = generate_trip(stops, notes_per_stop)
+    check_identical(trip)
+    payload = build_matrix_cargo_trip(trip, 'ext', 'ws')
+
+    return [
+        measure(f"legacy build [{stops}x{notes_per_stop}]", stops,
+                lambda: legacy_build_matrix_cargo_trip(trip, 'ext', 'ws'), repeat),
+        measure(f"trip_builder [{stops}x{notes_per_stop}]", stops,
+                lambda: build_matrix_cargo_trip(trip, 'ext', 'ws'), repeat),
+        measure(f"json.dumps body [{stops}x{notes_per_stop}]", stops,
+                lambda: json.dumps(payload).encode('utf-8'), repeat),
+        measure(f"json_codec body [{stops}x{notes_per_stop}]", stops,
+                lambda: json_codec.dumps_bytes(payload), repeat),
+        measure(f"json.loads(trip.json()) [{stops}x{notes_per_stop}]", stops,
+                lambda: json.loads(trip.json()), repeat),
+        measure(f"trip.dict() [{stops}x{notes_per_stop}]", stops,
+                lambda: trip.dict(), repeat),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stops', default='10,100,500', help='quantidades de paradas, separadas por vírgula')
+    parser.add_argument('--notes', type=int, default=5, help='notas por parada')
+    parser.add_argument('--repeat', type=int, default=5, help='execuções por medição (vale o melhor tempo)')
+    parser.add_argument('--json', help='grava os resultados neste arquivo JSON')
+    args = parser.parse_args()
+
+    results: List[BenchResult] = []
+    for stops in parse_sizes(args.stops):
+        results.extend(bench_trip(stops, args.notes, args.repeat))
+
+    print(f"notas por parada: {args.notes}  orjson: {'sim' if json_codec.orjson is not None else 'não'}  "
+          f"(docs/s = paradas/s)")
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump([result.as_dict() for result in results], output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
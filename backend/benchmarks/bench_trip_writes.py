@@ -0,0 +1,87 @@
+"""
+Benchmark da gravação de IntegratedTrip: commit por viagem (strict) x buffer write-behind.
+
+    python -m benchmarks.bench_trip_writes --trips 2000 --concurrency 100 --batch-size 100
+
+Simula envios de viagem concorrentes (espera do upstream + gravação do resultado) em
+três modos: TRIP_WRITE_MODE=strict, batched com TRIP_WRITE_DURABILITY=commit e batched
+com buffered. Mede a vazão, o atraso do event loop e quantos commits cada modo fez.
+
+Roda em um diretório temporário: o banco da aplicação é sqlite:///./trips.db.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from .bench_db_executor import _scenario
+from .bench_trip_builder import generate_trip
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app import integrated_trips
+    from app.db_executor import shutdown_db_executor, start_db_executor
+    from app.integrated_trips import TripWriteBuffer, save_integrated_trip
+
+    trip_data = json.loads(generate_trip(args.stops, args.notes).json())
+
+    async def save(external_id: str, data: Any) -> None:
+        await save_integrated_trip(external_id, data, 'success')
+
+    start_db_executor()
+    try:
+        results = []
+        for name, durability in (("strict", None), ("batched/commit", "commit"), ("batched/buffered", "buffered")):
+            buffer = TripWriteBuffer(batch_size=args.batch_size, flush_seconds=args.flush_seconds,
+                                     durability=durability or 'commit')
+            # save_integrated_trip usa o buffer do módulo quando ele está em execução
+            integrated_trips.trip_write_buffer = buffer
+            if durability is not None:
+                buffer.start()
+            start = time.perf_counter()
+            result = await _scenario(save, args.trips, args.concurrency, trip_data,
+                                     args.upstream_latency, f"{name}-{time.time_ns()}")
+            # No modo buffered o cenário termina antes das gravações: a vazão inclui o flush final
+            await buffer.stop()
+            elapsed = time.perf_counter() - start
+            result["seconds"] = elapsed
+            result["trips_per_second"] = args.trips / elapsed
+            results.append({"name": name, "commits": buffer.batches if durability else args.trips, **result})
+        return results
+    finally:
+        shutdown_db_executor()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trips', type=int, default=2000, help='viagens gravadas por modo')
+    parser.add_argument('--concurrency', type=int, default=100, help='envios simultâneos')
+    parser.add_argument('--stops', type=int, default=10, help='paradas por viagem (tamanho do trip_data)')
+    parser.add_argument('--notes', type=int, default=3, help='notas por parada')
+    parser.add_argument('--upstream-latency', type=float, default=0.02, help='espera simulada da Matrix Cargo (s)')
+    parser.add_argument('--batch-size', type=int, default=100, help='TRIP_WRITE_BATCH_SIZE')
+    parser.add_argument('--flush-seconds', type=float, default=0.05, help='TRIP_WRITE_FLUSH_SECONDS')
+    parser.add_argument('--json', help='grava os resultados neste arquivo JSON')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.json) if args.json else None
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        results = asyncio.run(run(args))
+
+    print(f"{'modo':<18} {'tempo (s)':>10} {'viagens/s':>10} {'commits':>8} {'lag p99':>8} {'lag máx':>8}   (ms)")
+    for result in results:
+        print(
+            f"{result['name']:<18} {result['seconds']:>10.3f} {result['trips_per_second']:>10.1f} "
+            f"{result['commits']:>8} {result['loop_lag_p99_ms']:>8.2f} {result['loop_lag_max_ms']:>8.2f}"
+        )
+    if output:
+        with open(output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark de ponta a ponta do endpoint /upload usando o TestClient do FastAPI.
+
+    python -m benchmarks.bench_upload --sizes 1,100,1000 --items 10 [--stream]
+
+Inclui o parsing multipart, o pipeline de XML e a serialização da resposta.
+Cada lote é enviado em uma única requisição, como faz o frontend.
+"""
+import argparse
+import json
+from typing import List, Tuple
+
+from fastapi.testclient import TestClient
+
+from app import xml_processor
+from app.main import app
+
+from .common import BenchResult, measure, parse_sizes, print_results
+from .nfe_generator import generate_batch
+
+DEFAULT_SIZES = '1,100,1000'
+
+
+def bench_upload(
+    client: TestClient,
+    batch: List[Tuple[str, bytes]],
+    repeat: int,
+    stream: bool,
+    use_cache: bool
+) -> BenchResult:
+    files = [('files', (filename, content, 'text/xml')) for filename, content in batch]
+    url = '/upload?stream=true' if stream else '/upload'
+
+    def run():
+        if not use_cache:
+            xml_processor.nfe_cache.clear()
+        response = client.post(url, files=files)
+        if response.status_code != 200:
+            raise RuntimeError(f"/upload respondeu {response.status_code}: {response.text[:200]}")
+        return response.content
+
+    name = f"POST {url} [{len(batch)}]"
+    return measure(name, len(batch), run, repeat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='quantidades de documentos, separadas por vírgula')
+    parser.add_argument('--items', type=int, default=10, help='itens (det) por NF-e')
+    parser.add_argument('--invalid-ratio', type=float, default=0.0, help='fração de documentos inválidos')
+    parser.add_argument('--repeat', type=int, default=3, help='execuções por medição (vale o melhor tempo)')
+    parser.add_argument('--stream', action='store_true', help='usa a resposta NDJSON (?stream=true)')
+    parser.add_argument('--cache', action='store_true', help='mantém o cache de NF-es entre as execuções')
+    parser.add_argument('--json', help='grava os resultados neste arquivo JSON')
+    args = parser.parse_args()
+
+    results: List[BenchResult] = []
+    # O contexto dispara startup/shutdown, o que também encerra o pool de processos
+    with TestClient(app) as client:
+        for size in parse_sizes(args.sizes):
+            batch = generate_batch(size, items=args.items, invalid_ratio=args.invalid_ratio)
+            results.append(bench_upload(client, batch, args.repeat, args.stream, args.cache))
+
+    print(f"itens por NF-e: {args.items}  inválidos: {args.invalid_ratio:.0%}  "
+          f"pool: {xml_processor.XML_PROCESS_POOL_SIZE} processos")
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump([result.as_dict() for result in results], output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark de NFXMLProcessor (parse, validate, extract_data) e de process_xml_files.
+
+    python -m benchmarks.bench_xml --sizes 1,100,10000 --items 10
+
+O pico de memória é medido com tracemalloc e cobre apenas o processo atual:
+com XML_PROCESS_POOL_SIZE > 0 o parsing de process_xml_files roda em outros
+processos. Use XML_PROCESS_POOL_SIZE=0 para medir o pipeline inteiro em um processo.
+"""
+import argparse
+import asyncio
+import io
+import json
+from typing import List, Tuple
+
+from fastapi import UploadFile
+
+from app import xml_processor
+from app.xml_processor import NFXMLProcessor
+
+from .common import BenchResult, measure, parse_sizes, print_results
+from .nfe_generator import generate_batch
+
+DEFAULT_SIZES = '1,100,10000'
+
+
+def bench_processor(batch: List[Tuple[str, bytes]], repeat: int) -> List[BenchResult]:
+    size = len(batch)
+    contents = [content for _, content in batch]
+
+    processors = []
+    for content in contents:
+        try:
+            processors.append(NFXMLProcessor(content))
+        except Exception:
+            # XML malformado: não chega a validate/extract_data
+            continue
+    valid = [processor for processor in processors if processor.validate()["is_valid"]]
+
+    def parse():
+        for content in contents:
+            try:
+                NFXMLProcessor(content)
+            except Exception:
+                pass
+
+    def validate():
+        for processor in processors:
+            processor.validate()
+
+    def extract():
+        for processor in valid:
+            processor.extract_data()
+
+    return [
+        measure(f"NFXMLProcessor() [{size}]", size, parse, repeat),
+        measure(f"validate [{size}]", len(processors), validate, repeat),
+        measure(f"extract_data [{size}]", len(valid), extract, repeat),
+    ]
+
+
+def bench_process_xml_files(batch: List[Tuple[str, bytes]], repeat: int, use_cache: bool) -> BenchResult:
+    files = [UploadFile(filename, file=io.BytesIO(content)) for filename, content in batch]
+
+    def run():
+        if not use_cache:
+            xml_processor.nfe_cache.clear()
+        return asyncio.run(xml_processor.process_xml_files(files))
+
+    return measure(f"process_xml_files [{len(batch)}]", len(batch), run, repeat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='quantidades de documentos, separadas por vírgula')
+    parser.add_argument('--items', type=int, default=10, help='itens (det) por NF-e')
+    parser.add_argument('--invalid-ratio', type=float, default=0.0, help='fração de documentos inválidos')
+    parser.add_argument('--repeat', type=int, default=3, help='execuções por medição (vale o melhor tempo)')
+    parser.add_argument('--cache', action='store_true', help='mantém o cache de NF-es entre as execuções')
+    parser.add_argument('--json', help='grava os resultados neste arquivo JSON')
+    args = parser.parse_args()
+
+    results: List[BenchResult] = []
+    try:
+        for size in parse_sizes(args.sizes):
+            batch = generate_batch(size, items=args.items, invalid_ratio=args.invalid_ratio)
+            results.extend(bench_processor(batch, args.repeat))
+            results.append(bench_process_xml_files(batch, args.repeat, args.cache))
+    finally:
+        xml_processor.shutdown_process_pool()
+
+    print(f"itens por NF-e: {args.items}  inválidos: {args.invalid_ratio:.0%}  "
+          f"pool: {xml_processor.XML_PROCESS_POOL_SIZE} processos")
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump([result.as_dict() for result in results], output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple
+
+
+class BenchResult(NamedTuple):
+    name: str
+    documents: int
+    seconds: float
+    peak_bytes: int
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else float('inf')
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "documents": self.documents,
+            "seconds": round(self.seconds, 6),
+            "docs_per_second": round(self.docs_per_second, 1),
+            "peak_mb": round(self.peak_bytes / (1024 * 1024), 3)
+        }
+
+
+def measure(name: str, documents: int, run: Callable[[], Any], repeat: int = 3) -> BenchResult:
+    """
+    Mede o melhor tempo entre `repeat` execuções e, em uma execução separada
+    (tracemalloc distorce o tempo), o pico de memória alocada pelo Python.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return BenchResult(name, documents, best, peak)
+
+
+def print_results(results: List[BenchResult]) -> None:
+    print(f"{'benchmark':<40} {'docs':>7} {'tempo (s)':>10} {'docs/s':>10} {'pico (MB)':>10}")
+    for result in results:
+        print(
+            f"{result.name:<40} {result.documents:>7} {result.seconds:>10.4f} "
+            f"{result.docs_per_second:>10.1f} {result.peak_bytes / (1024 * 1024):>10.2f}"
+        )
+
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(',') if size]
@@ -0,0 +1,157 @@
+import random
+from typing import List, Optional, Tuple
+
+NFE_NAMESPACE = 'http://www.portalfiscal.inf.br/nfe'
+SIGNATURE_NAMESPACE = 'http://www.w3.org/2000/09/xmldsig#'
+
+# Variantes inválidas: cada uma deve gerar erro de validação ou de parsing
+INVALID_VARIANTS = (
+    'missing_field',   # campo obrigatório vazio (CEP do remetente)
+    'missing_emit',    # sem o grupo emit
+    'no_inf_nfe',      # NFe sem infNFe
+    'not_nfe',         # XML bem formado que não é uma NF-e
+    'malformed',       # XML truncado
+)
+
+_CITIES = (
+    ('3550308', 'São Paulo', 'SP', '01310100'),
+    ('3304557', 'Rio de Janeiro', 'RJ', '20040002'),
+    ('3106200', 'Belo Horizonte', 'MG', '30130010'),
+    ('4106902', 'Curitiba', 'PR', '80010000'),
+    ('4314902', 'Porto Alegre', 'RS', '90010150'),
+)
+_STREETS = ('Av. Paulista', 'Rua das Flores', 'Av. Brasil', 'Rua XV de Novembro', 'Rodovia BR-116')
+_PRODUCTS = ('Caixa de papelão', 'Parafuso sextavado', 'Óleo lubrificante', 'Cabo elétrico 2,5mm', 'Pallet PBR')
+
+
+def _cnpj(rng: random.Random) -> str:
+    return ''.join(str(rng.randint(0, 9)) for _ in range(14))
+
+
+def _address(tag: str, rng: random.Random, cep: Optional[str] = None) -> str:
+    code, city, uf, default_cep = rng.choice(_CITIES)
+    return (
+        f"<{tag}>"
+        f"<xLgr>{rng.choice(_STREETS)}</xLgr><nro>{rng.randint(1, 9999)}</nro><xCpl>Galpão {rng.randint(1, 9)}</xCpl>"
+        f"<xBairro>Centro</xBairro><cMun>{code}</cMun><xMun>{city}</xMun><UF>{uf}</UF>"
+        f"<CEP>{default_cep if cep is None else cep}</CEP><cPais>1058</cPais><xPais>Brasil</xPais>"
+        f"</{tag}>"
+    )
+
+
+def _item(number: int, rng: random.Random) -> str:
+    quantity = rng.randint(1, 50)
+    price = rng.randint(100, 100000) / 100
+    total = quantity * price
+    return (
+        f'<det nItem="{number}"><prod>'
+        f"<cProd>{rng.randint(1000, 99999)}</cProd><cEAN>SEM GTIN</cEAN><xProd>{rng.choice(_PRODUCTS)}</xProd>"
+        f"<NCM>48191000</NCM><CFOP>5102</CFOP><uCom>UN</uCom><qCom>{quantity}.0000</qCom>"
+        f"<vUnCom>{price:.10f}</vUnCom><vProd>{total:.2f}</vProd><indTot>1</indTot>"
+        f"</prod><imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST><modBC>3</modBC>"
+        f"<vBC>{total:.2f}</vBC><pICMS>18.00</pICMS><vICMS>{total * 0.18:.2f}</vICMS>"
+        f"</ICMS00></ICMS><PIS><PISAliq><CST>01</CST><vBC>{total:.2f}</vBC><pPIS>1.65</pPIS>"
+        f"<vPIS>{total * 0.0165:.2f}</vPIS></PISAliq></PIS></imposto></det>"
+    )
+
+
+def generate_nfe(
+    seed: int,
+    items: int = 10,
+    with_transp: bool = True,
+    with_vol: bool = True,
+    invalid: Optional[str] = None
+) -> bytes:
+    """
+    Gera uma NF-e (nfeProc assinada e autorizada) determinística para a semente dada.
+    Args:
+        seed: semente; a mesma semente gera sempre o mesmo XML
+        items: quantidade de itens (det), que domina o tamanho do documento
+        with_transp/with_vol: incluir os grupos transp e transp/vol
+        invalid: uma das INVALID_VARIANTS, ou None para uma nota válida
+    """
+    if invalid is not None and invalid not in INVALID_VARIANTS:
+        raise ValueError(f"Variante inválida desconhecida: {invalid}")
+
+    rng = random.Random(seed)
+    chave = f"{rng.randint(11, 53)}{seed:042d}"[:44].ljust(44, '0')
+    numero = rng.randint(1, 999999999)
+
+    if invalid == 'not_nfe':
+        return f'<?xml version="1.0" encoding="UTF-8"?><pedido><numero>{numero}</numero></pedido>'.encode()
+
+    ide = (
+        f"<ide><cUF>35</cUF><cNF>{rng.randint(10000000, 99999999)}</cNF><natOp>Venda de mercadoria</natOp>"
+        f"<mod>55</mod><serie>1</serie><nNF>{numero}</nNF><dhEmi>2024-01-15T10:30:00-03:00</dhEmi>"
+        f"<tpNF>1</tpNF><idDest>1</idDest><cMunFG>3550308</cMunFG><tpImp>1</tpImp><tpEmis>1</tpEmis>"
+        f"<tpAmb>1</tpAmb><finNFe>1</finNFe><indFinal>0</indFinal><indPres>0</indPres></ide>"
+    )
+    emit = (
+        f"<emit><CNPJ>{_cnpj(rng)}</CNPJ><xNome>Indústria &amp; Comércio {seed} Ltda</xNome>"
+        f"{_address('enderEmit', rng, cep='' if invalid == 'missing_field' else None)}"
+        f"<IE>123456789</IE><CRT>3</CRT></emit>"
+    )
+    dest = (
+        f"<dest><CNPJ>{_cnpj(rng)}</CNPJ><xNome>Distribuidora {seed % 97} S.A.</xNome>"
+        f"{_address('enderDest', rng)}<indIEDest>1</indIEDest></dest>"
+    )
+    det = ''.join(_item(number, rng) for number in range(1, items + 1))
+    total = "<total><ICMSTot><vBC>0.00</vBC><vICMS>0.00</vICMS><vProd>0.00</vProd><vNF>0.00</vNF></ICMSTot></total>"
+
+    transp = ''
+    if with_transp:
+        vol = ''
+        if with_vol:
+            peso = rng.randint(100, 500000) / 100
+            vol = (
+                f"<vol><qVol>{rng.randint(1, 200)}</qVol><esp>CAIXA</esp>"
+                f"<pesoL>{peso * 0.9:.3f}</pesoL><pesoB>{peso:.3f}</pesoB></vol>"
+            )
+        transp = (
+            f"<transp><modFrete>0</modFrete><transporta><CNPJ>{_cnpj(rng)}</CNPJ>"
+            f"<xNome>Transportadora Rápida</xNome></transporta>{vol}</transp>"
+        )
+
+    pag = "<pag><detPag><tPag>15</tPag><vPag>0.00</vPag></detPag></pag>"
+    inf_adic = "<infAdic><infCpl>Documento gerado para benchmark.</infCpl></infAdic>"
+    body = ide + ('' if invalid == 'missing_emit' else emit) + dest + det + total + transp + pag + inf_adic
+    inf_nfe = '' if invalid == 'no_inf_nfe' else f'<infNFe Id="NFe{chave}" versao="4.00">{body}</infNFe>'
+    signature = (
+        f'<Signature xmlns="{SIGNATURE_NAMESPACE}"><SignedInfo><Reference URI="#NFe{chave}">'
+        f"<DigestValue>{'A' * 28}</DigestValue></Reference></SignedInfo>"
+        f"<SignatureValue>{'B' * 344}</SignatureValue></Signature>"
+    )
+    prot = (
+        f'<protNFe versao="4.00"><infProt><tpAmb>1</tpAmb><chNFe>{chave}</chNFe>'
+        f"<dhRecbto>2024-01-15T10:31:00-03:00</dhRecbto><nProt>135240000000000</nProt>"
+        f"<cStat>100</cStat><xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe>"
+    )
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="{NFE_NAMESPACE}" versao="4.00">'
+        f"<NFe>{inf_nfe}{signature}</NFe>{prot}</nfeProc>"
+    )
+    content = xml.encode('utf-8')
+    if invalid == 'malformed':
+        return content[:len(content) // 2]
+    return content
+
+
+def generate_batch(
+    count: int,
+    items: int = 10,
+    invalid_ratio: float = 0.0,
+    seed: int = 0
+) -> List[Tuple[str, bytes]]:
+    """
+    Gera (nome do arquivo, conteúdo) para um lote de NF-es.
+    Uma fração invalid_ratio dos documentos recebe uma variante inválida, em rodízio.
+    """
+    rng = random.Random(seed)
+    batch = []
+    for index in range(count):
+        invalid = None
+        if invalid_ratio and rng.random() < invalid_ratio:
+            invalid = INVALID_VARIANTS[index % len(INVALID_VARIANTS)]
+        content = generate_nfe(seed * 1_000_003 + index, items=items, invalid=invalid)
+        batch.append((f"nfe_{index:06d}.xml", content))
+    return batch
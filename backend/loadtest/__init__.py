@@ -0,0 +1,21 @@
+"""
+Testes de carga de ponta a ponta contra uma Matrix Cargo simulada.
+
+Executar a partir de backend/, em três terminais:
+
+    # 1. Matrix Cargo simulada (latência log-normal ~50ms, 2% de erros 5xx, 5% de 429)
+    python -m loadtest.fake_matrixcargo --port 9000 --latency lognormal:-3,0.5 \\
+        --error-rate 0.02 --rate-limit-rate 0.05
+
+    # 2. API apontando para a simulação
+    MATRIXCARGO_TRACKING_API_URL=http://127.0.0.1:9000/external \\
+    MATRIXCARGO_PAINEL_LOGISTICO_API_URL=http://127.0.0.1:9000 \\
+        uvicorn app.main:app --port 8000
+
+    # 3. Gerador de carga
+    python -m loadtest.run_load --scenario orders --requests 200 --concurrency 20 \\
+        --fake-url http://127.0.0.1:9000
+
+    # Deduplicação do envio de viagem pelo TripManager (clique duplo = uma chamada)
+    python -m loadtest.check_trip_idempotency --fake-url http://127.0.0.1:9000
+"""
@@ -0,0 +1,71 @@
+"""
+Confere a deduplicação do envio de viagem como o TripManager faz: dois POSTs idênticos
+em /trips/matrix-cargo com a mesma Idempotency-Key (clique duplo, ou novo clique depois
+de uma resposta lenta) devem gerar uma única chamada à Matrix Cargo.
+
+Precisa da API apontando para a Matrix Cargo simulada:
+
+    python -m loadtest.fake_matrixcargo --port 9000 --latency fixed:0.5
+    MATRIXCARGO_TRACKING_API_URL=http://127.0.0.1:9000/external uvicorn app.main:app
+    python -m loadtest.check_trip_idempotency --fake-url http://127.0.0.1:9000
+
+Sai com código 1 se a viagem for criada mais de uma vez ou se as respostas diferirem.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+
+import httpx
+
+from benchmarks.bench_trip_builder import generate_trip
+
+from .run_load import _fake_stats
+
+
+async def check(args: argparse.Namespace) -> bool:
+    await _fake_stats(args.fake_url, reset=True)
+
+    trip = json.loads(generate_trip(2, 1).json())
+    trip["vehicle"] = {"plate": f"ID{uuid.uuid4().hex[:6].upper()}"}
+    headers = {
+        "Authorization": f"Bearer {args.token}",
+        "Organization-Id": args.organization,
+        "Workspace-Id": args.workspace,
+        "Idempotency-Key": f"{trip.get('id') or 'trip'}-{uuid.uuid4().hex}"
+    }
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        # Clique duplo: o segundo POST chega enquanto o primeiro ainda espera a Matrix Cargo
+        first, second = await asyncio.gather(
+            client.post("/trips/matrix-cargo", json=trip, headers=headers),
+            client.post("/trips/matrix-cargo", json=trip, headers=headers)
+        )
+        # Novo clique depois da resposta
+        third = await client.post("/trips/matrix-cargo", json=trip, headers=headers)
+
+    stats = await _fake_stats(args.fake_url, reset=False)
+    calls = stats["counters"].get("trip.requests", 0)
+    responses = [first, second, third]
+    print("status: " + " ".join(str(response.status_code) for response in responses))
+    print(f"chamadas à Matrix Cargo: {calls}")
+
+    ok = calls == 1 and all(response.status_code == 200 for response in responses) \
+        and len({response.json()["externalId"] for response in responses}) == 1
+    print("OK" if ok else "FALHOU: viagem enviada mais de uma vez ou respostas diferentes")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL base da API')
+    parser.add_argument('--fake-url', default='http://127.0.0.1:9000', help='URL da Matrix Cargo simulada')
+    parser.add_argument('--token', default='loadtest', help='token enviado no header Authorization')
+    parser.add_argument('--organization', default='org-0')
+    parser.add_argument('--workspace', default='ws-0-0')
+    sys.exit(0 if asyncio.run(check(parser.parse_args())) else 1)
+
+
+if __name__ == '__main__':
+    main()
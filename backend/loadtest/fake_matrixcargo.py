@@ -0,0 +1,222 @@
+"""
+Servidor que simula as APIs da Matrix Cargo usadas por app.external_api e app.organizations:
+
+    POST /external (e /external/trip)   Tracking: criação de viagem
+    POST /order/facilitator             Painel Logístico: criação de pedido
+    GET  /organization                  Painel Logístico: organizações do token
+    GET  /_stats, POST /_reset          contadores da simulação
+
+Latência, erros 5xx, respostas 429 e respostas lentas são configuráveis por linha de
+comando ou pelas variáveis FAKE_MC_*. Com --capacity, chamadas além dessa quantidade
+simultânea por endpoint recebem 429, simulando um upstream saturado. Distribuições de latência (em segundos):
+    fixed:0.05   uniform:0.02,0.2   exponential:0.05   lognormal:MU,SIGMA (exp(N(MU,SIGMA)))
+
+    python -m loadtest.fake_matrixcargo --port 9000 --latency uniform:0.02,0.1 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import uuid
+from collections import Counter
+from typing import Callable, Optional
+
+import uvicorn
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Converte 'distribuição:parâmetros' em uma função que sorteia a latência"""
+    name, _, raw = spec.partition(':')
+    params = [float(value) for value in raw.split(',') if value]
+    if name == 'fixed':
+        return lambda rng: params[0] if params else 0.0
+    if name == 'uniform':
+        return lambda rng: rng.uniform(params[0], params[1])
+    if name == 'exponential':
+        return lambda rng: rng.expovariate(1 / params[0])
+    if name == 'lognormal':
+        return lambda rng: math.exp(rng.gauss(params[0], params[1]))
+    raise ValueError(f"Distribuição de latência desconhecida: {spec}")
+
+
+class FakeConfig:
+    def __init__(self):
+        self.latency_spec = os.getenv('FAKE_MC_LATENCY', 'fixed:0.05')
+        self.latency = parse_latency(self.latency_spec)
+        # Probabilidades por requisição, avaliadas nesta ordem
+        self.error_rate = float(os.getenv('FAKE_MC_ERROR_RATE', 0))
+        self.rate_limit_rate = float(os.getenv('FAKE_MC_RATE_LIMIT_RATE', 0))
+        self.slow_rate = float(os.getenv('FAKE_MC_SLOW_RATE', 0))
+        # Valor do header Retry-After das respostas 429, em segundos
+        self.retry_after = float(os.getenv('FAKE_MC_RETRY_AFTER', 1))
+        # Duração das respostas lentas, em segundos
+        self.slow_seconds = float(os.getenv('FAKE_MC_SLOW_SECONDS', 10))
+        # Chamadas simultâneas aceitas por endpoint (0 = sem limite)
+        self.capacity = int(os.getenv('FAKE_MC_CAPACITY', 0))
+
+    def describe(self) -> dict:
+        return {
+            "latency": self.latency_spec,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "slow_rate": self.slow_rate,
+            "retry_after": self.retry_after,
+            "slow_seconds": self.slow_seconds,
+            "capacity": self.capacity
+        }
+
+
+config = FakeConfig()
+rng = random.Random()
+stats: Counter = Counter()
+in_flight: Counter = Counter()
+
+app = FastAPI(title="Matrix Cargo simulada")
+
+
+async def _simulate(endpoint: str) -> Optional[JSONResponse]:
+    """Aplica capacidade, latência e falhas; devolve a resposta de erro, se houver"""
+    stats[f"{endpoint}.requests"] += 1
+    if config.capacity and in_flight[endpoint] >= config.capacity:
+        stats[f"{endpoint}.429"] += 1
+        stats[f"{endpoint}.over_capacity"] += 1
+        return JSONResponse(
+            {"message": "Too Many Requests"},
+            status_code=429,
+            headers={"Retry-After": f"{config.retry_after:g}"}
+        )
+    in_flight[endpoint] += 1
+    stats[f"{endpoint}.max_in_flight"] = max(stats[f"{endpoint}.max_in_flight"], in_flight[endpoint])
+    try:
+        return await _simulate_response(endpoint)
+    finally:
+        in_flight[endpoint] -= 1
+
+
+async def _simulate_response(endpoint: str) -> Optional[JSONResponse]:
+    draw = rng.random()
+
+    if draw < config.error_rate:
+        await asyncio.sleep(config.latency(rng))
+        status_code = rng.choice((500, 502, 503))
+        stats[f"{endpoint}.{status_code}"] += 1
+        return JSONResponse({"message": "Falha simulada"}, status_code=status_code)
+    draw -= config.error_rate
+
+    if draw < config.rate_limit_rate:
+        stats[f"{endpoint}.429"] += 1
+        return JSONResponse(
+            {"message": "Too Many Requests"},
+            status_code=429,
+            headers={"Retry-After": f"{config.retry_after:g}"}
+        )
+    draw -= config.rate_limit_rate
+
+    if draw < config.slow_rate:
+        stats[f"{endpoint}.slow"] += 1
+        await asyncio.sleep(config.slow_seconds)
+    else:
+        await asyncio.sleep(config.latency(rng))
+    return None
+
+
+def _unauthorized(authorization: Optional[str]) -> Optional[JSONResponse]:
+    if not authorization or not authorization.startswith('Bearer '):
+        return JSONResponse({"message": "Unauthorized"}, status_code=401)
+    return None
+
+
+@app.post("/external")
+@app.post("/external/trip")
+async def create_trip(request: Request, authorization: Optional[str] = Header(None)):
+    error = _unauthorized(authorization) or await _simulate('trip')
+    if error is not None:
+        return error
+    body = await request.json()
+    stats["trip.created"] += 1
+    return JSONResponse({
+        "id": uuid.uuid4().hex,
+        "externalId": body.get("externalId"),
+        "status": "CREATED",
+        "tripStops": len(body.get("tripStops", []))
+    }, status_code=201)
+
+
+@app.post("/order/facilitator")
+async def create_order(request: Request, authorization: Optional[str] = Header(None)):
+    error = _unauthorized(authorization) or await _simulate('order')
+    if error is not None:
+        return error
+    body = await request.json()
+    if not body.get("itens"):
+        stats["order.400"] += 1
+        return JSONResponse({"message": ["itens não pode ser vazio"]}, status_code=400)
+    stats["order.created"] += 1
+    return JSONResponse({"id": uuid.uuid4().hex, "externalId": body.get("externalId")}, status_code=201)
+
+
+@app.get("/organization")
+async def list_organizations(authorization: Optional[str] = Header(None)):
+    error = _unauthorized(authorization) or await _simulate('organization')
+    if error is not None:
+        return error
+    return {
+        "data": [
+            {
+                "id": f"org-{number}",
+                "name": f"Organização {number}",
+                "document": f"{number:014d}",
+                "workspaces": [
+                    {"id": f"ws-{number}-{index}", "name": f"Operação {index}", "active": True}
+                    for index in range(3)
+                ]
+            }
+            for number in range(5)
+        ]
+    }
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {"config": config.describe(), "counters": dict(sorted(stats.items()))}
+
+
+@app.post("/_reset")
+async def reset_stats():
+    stats.clear()
+    return {"ok": True}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', default=config.latency_spec, help='distribuição da latência (ver acima)')
+    parser.add_argument('--error-rate', type=float, default=config.error_rate, help='fração de respostas 5xx')
+    parser.add_argument('--rate-limit-rate', type=float, default=config.rate_limit_rate, help='fração de respostas 429')
+    parser.add_argument('--retry-after', type=float, default=config.retry_after, help='Retry-After das respostas 429 (s)')
+    parser.add_argument('--slow-rate', type=float, default=config.slow_rate, help='fração de respostas lentas')
+    parser.add_argument('--slow-seconds', type=float, default=config.slow_seconds, help='duração das respostas lentas (s)')
+    parser.add_argument('--capacity', type=int, default=config.capacity, help='chamadas simultâneas aceitas por endpoint (0 = sem limite)')
+    parser.add_argument('--seed', type=int, help='semente dos sorteios, para execuções reproduzíveis')
+    args = parser.parse_args()
+
+    config.latency_spec = args.latency
+    config.latency = parse_latency(args.latency)
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    config.retry_after = args.retry_after
+    config.slow_rate = args.slow_rate
+    config.slow_seconds = args.slow_seconds
+    config.capacity = args.capacity
+    if args.seed is not None:
+        rng.seed(args.seed)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Gerador de carga para /upload, /trips/matrix-cargo e /orders/matrix-cargo.
+
+Mantém `--concurrency` requisições em voo até completar `--requests` ou até passar
+`--duration` segundos, e informa vazão, latências p50/p95/p99 e códigos de status.
+Com `--fake-url`, zera e depois mostra os contadores da Matrix Cargo simulada, o que
+permite ver quantas chamadas externas (incluindo retentativas) cada cenário gerou.
+
+    python -m loadtest.run_load --scenario upload --files 20 --requests 100 --concurrency 10
+    python -m loadtest.run_load --scenario trips --duration 30 --concurrency 50 --fake-url http://127.0.0.1:9000
+    python -m loadtest.run_load --scenario orders --batch 50 --requests 40 --concurrency 4 --async
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.bench_trip_builder import generate_trip
+from benchmarks.nfe_generator import generate_batch
+
+SCENARIOS = ('upload', 'trips', 'orders')
+
+
+class Sample(NamedTuple):
+    seconds: float
+    status_code: int
+    # Para /orders/matrix-cargo síncrono: pedidos aceitos e recusados no lote
+    succeeded: int = 0
+    failed: int = 0
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Percentil pelo método do posto mais próximo"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def build_order(sequence: int, run_id: str) -> Dict[str, Any]:
+    """Pedido sintético; uniqueId muda a cada execução para não cair na deduplicação"""
+    return {
+        "id": f"{run_id}-{sequence}",
+        "uniqueId": f"{run_id}-{sequence}",
+        "customerCNPJ": "29551997000150",
+        "customerName": "Regler",
+        "originCNPJ": "11222333000181",
+        "originName": "Origem Ltda",
+        "pickupDate": "2024-01-15T08:00:00.000Z",
+        "destinationCNPJ": "44555666000199",
+        "destinationName": "Destino Ltda",
+        "deliveryDate": "2024-01-16T18:00:00.000Z",
+        "itemCode": f"SKU{sequence % 1000:04d}",
+        "itemDescription": "Mercadoria",
+        "itemVolume": 1.5,
+        "itemWeight": 120.0,
+        "itemQuantity": 3,
+        "itemUnit": "UN",
+        "itemUnitPrice": 10.0,
+        "merchandiseType": "Geral",
+        "isDangerous": False,
+        "needsEscort": False
+    }
+
+
+class LoadGenerator:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.headers = {
+            "Authorization": f"Bearer {args.token}",
+            "Organization-Id": args.organization,
+            "Workspace-Id": args.workspace
+        }
+        self.samples: List[Sample] = []
+        self.sequence = 0
+        self.remaining = args.requests
+        # Payloads montados antes da medição, para não medir o próprio gerador
+        self.upload_files = generate_batch(args.files, items=args.items, invalid_ratio=args.invalid_ratio)
+        self.trip_template = json.loads(generate_trip(args.stops, args.notes).json())
+
+    def _next_sequence(self) -> int:
+        self.sequence += 1
+        return self.sequence
+
+    def _params(self) -> Dict[str, str]:
+        return {"async": "true"} if self.args.asynchronous else {}
+
+    async def _upload(self, client: httpx.AsyncClient) -> httpx.Response:
+        files = [("files", (name, content, "text/xml")) for name, content in self.upload_files]
+        return await client.post("/upload", files=files)
+
+    async def _trip(self, client: httpx.AsyncClient) -> httpx.Response:
+        # Placa distinta por requisição, para que cada envio seja uma viagem diferente
+        trip = dict(self.trip_template)
+        trip["vehicle"] = {"plate": f"LT{self._next_sequence():07d}"}
+        return await client.post("/trips/matrix-cargo", json=trip, headers=self.headers, params=self._params())
+
+    async def _orders(self, client: httpx.AsyncClient) -> httpx.Response:
+        base = self._next_sequence() * self.args.batch
+        orders = [build_order(base + index, self.run_id) for index in range(self.args.batch)]
+        return await client.post("/orders/matrix-cargo", json=orders, headers=self.headers, params=self._params())
+
+    async def _request(self, client: httpx.AsyncClient) -> None:
+        send = {'upload': self._upload, 'trips': self._trip, 'orders': self._orders}[self.args.scenario]
+        start = time.perf_counter()
+        try:
+            response = await send(client)
+        except httpx.HTTPError as error:
+            # Falhas de transporte entram como status 0 para aparecerem no relatório
+            self.samples.append(Sample(time.perf_counter() - start, 0))
+            if self.args.verbose:
+                print(f"erro de transporte: {error!r}")
+            return
+        elapsed = time.perf_counter() - start
+
+        succeeded = failed = 0
+        if self.args.scenario == 'orders' and response.status_code == 200:
+            body = response.json()
+            succeeded, failed = body.get("success", 0), body.get("failed", 0)
+        if self.args.verbose and response.status_code >= 400:
+            print(f"{response.status_code}: {response.text[:200]}")
+        self.samples.append(Sample(elapsed, response.status_code, succeeded, failed))
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: Optional[float]) -> None:
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if deadline is None:
+                if self.remaining <= 0:
+                    return
+                self.remaining -= 1
+            await self._request(client)
+
+    async def run(self) -> float:
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(base_url=self.args.url, limits=limits, timeout=timeout) as client:
+            start = time.perf_counter()
+            deadline = start + self.args.duration if self.args.duration else None
+            await asyncio.gather(*(self._worker(client, deadline) for _ in range(self.args.concurrency)))
+            return time.perf_counter() - start
+
+
+def print_report(scenario: str, samples: List[Sample], elapsed: float) -> None:
+    latencies = sorted(sample.seconds for sample in samples)
+    statuses = Counter(sample.status_code for sample in samples)
+    ok = sum(count for status, count in statuses.items() if 200 <= status < 300)
+
+    print(f"cenário: {scenario}")
+    print(f"requisições: {len(samples)} em {elapsed:.2f}s  vazão: {len(samples) / elapsed if elapsed else 0:.1f} req/s  "
+          f"sucesso: {ok}/{len(samples)}")
+    if latencies:
+        print(
+            f"latência (ms): p50 {percentile(latencies, 0.50) * 1000:.1f}  "
+            f"p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f}  "
+            f"máx {latencies[-1] * 1000:.1f}"
+        )
+    print("status: " + "  ".join(f"{status}={count}" for status, count in sorted(statuses.items())))
+    if scenario == 'orders':
+        succeeded = sum(sample.succeeded for sample in samples)
+        failed = sum(sample.failed for sample in samples)
+        if succeeded or failed:
+            print(f"pedidos: {succeeded} aceitos, {failed} recusados")
+
+
+async def _fake_stats(fake_url: str, reset: bool) -> Optional[Dict[str, Any]]:
+    async with httpx.AsyncClient(base_url=fake_url, timeout=5) as client:
+        if reset:
+            await client.post("/_reset")
+            return None
+        response = await client.get("/_stats")
+        return response.json()
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    if args.fake_url:
+        await _fake_stats(args.fake_url, reset=True)
+
+    generator = LoadGenerator(args)
+    elapsed = await generator.run()
+    print_report(args.scenario, generator.samples, elapsed)
+
+    if args.fake_url:
+        stats = await _fake_stats(args.fake_url, reset=False)
+        print("matrix cargo simulada: " + "  ".join(f"{name}={count}" for name, count in stats["counters"].items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL base da API')
+    parser.add_argument('--scenario', choices=SCENARIOS, default='trips')
+    parser.add_argument('--concurrency', type=int, default=10, help='requisições simultâneas')
+    parser.add_argument('--requests', type=int, default=100, help='total de requisições (ignorado com --duration)')
+    parser.add_argument('--duration', type=float, default=0, help='duração do teste em segundos')
+    parser.add_argument('--timeout', type=float, default=120, help='timeout por requisição (s)')
+    parser.add_argument('--async', dest='asynchronous', action='store_true', help='usa ?async=true (outbox)')
+    parser.add_argument('--token', default='loadtest', help='token enviado no header Authorization')
+    parser.add_argument('--organization', default='org-0')
+    parser.add_argument('--workspace', default='ws-0-0')
+    parser.add_argument('--files', type=int, default=10, help='upload: XMLs por requisição')
+    parser.add_argument('--items', type=int, default=10, help='upload: itens por NF-e')
+    parser.add_argument('--invalid-ratio', type=float, default=0.0, help='upload: fração de XMLs inválidos')
+    parser.add_argument('--stops', type=int, default=10, help='trips: paradas por viagem')
+    parser.add_argument('--notes', type=int, default=3, help='trips: notas por parada')
+    parser.add_argument('--batch', type=int, default=20, help='orders: pedidos por requisição')
+    parser.add_argument('--fake-url', help='URL da Matrix Cargo simulada, para coletar os contadores')
+    parser.add_argument('--verbose', action='store_true', help='mostra as respostas de erro')
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
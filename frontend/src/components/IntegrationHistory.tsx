@@ -22,50 +22,86 @@ interface TripData {
   stops: Stop[];
 }
 
-interface IntegratedTrip {
+// Item da listagem: só o resumo; os JSONs vêm do detalhe, quando o usuário abre a viagem
+interface IntegratedTripSummary {
   id: number;
   external_id: string;
   status: string;
   created_at: string;
+  stop_count: number | null;
+  note_count: number | null;
   error_message?: string;
+}
+
+interface IntegratedTrip extends IntegratedTripSummary {
   trip_data: TripData;
   matrix_cargo_response?: any;
 }
 
 interface PaginatedResponse {
-  items: IntegratedTrip[];
+  items: IntegratedTripSummary[];
   total: number;
-  page: number;
+  page: number | null;
   size: number;
   pages: number;
+  next_cursor: string | null;
+  prev_cursor: string | null;
+}
+
+// Página pedida ao backend: a primeira (sem cursor) ou a vizinha de um cursor
+interface PageRequest {
+  cursor?: string;
+  direction?: 'next' | 'prev';
 }
 
 export function IntegrationHistory() {
-  const [trips, setTrips] = useState<IntegratedTrip[]>([]);
+  const [trips, setTrips] = useState<IntegratedTripSummary[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [currentPage, setCurrentPage] = useState(1);
   const [pageSize] = useState(10);
   const [totalPages, setTotalPages] = useState(0);
   const [totalItems, setTotalItems] = useState(0);
+  const [pageRequest, setPageRequest] = useState<PageRequest>({});
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [prevCursor, setPrevCursor] = useState<string | null>(null);
+  const [statusFilter, setStatusFilter] = useState('');
+  const [dateFrom, setDateFrom] = useState('');
+  const [dateTo, setDateTo] = useState('');
+  const [expanded, setExpanded] = useState<string | null>(null);
+  const [details, setDetails] = useState<Record<string, IntegratedTrip>>({});
+  const [detailError, setDetailError] = useState<string | null>(null);
 
   useEffect(() => {
     loadHistory();
-  }, [currentPage]);
+  }, [pageRequest, statusFilter, dateFrom, dateTo]);
+
+  const toUtcParam = (date: string, endOfDay: boolean) => {
+    // Datas do filtro são dias locais; o fim do intervalo é exclusivo
+    const local = new Date(`${date}T00:00:00`);
+    if (endOfDay) local.setDate(local.getDate() + 1);
+    return local.toISOString();
+  };
 
   const loadHistory = async () => {
     try {
       setLoading(true);
       const response = await api.get<PaginatedResponse>('/trips/integration-history', {
         params: {
-          page: currentPage,
-          size: pageSize
+          size: pageSize,
+          cursor: pageRequest.cursor,
+          direction: pageRequest.direction,
+          status: statusFilter || undefined,
+          created_from: dateFrom ? toUtcParam(dateFrom, false) : undefined,
+          created_to: dateTo ? toUtcParam(dateTo, true) : undefined
         }
       });
       
       setTrips(response.data.items);
       setTotalPages(response.data.pages);
       setTotalItems(response.data.total);
+      setNextCursor(response.data.next_cursor);
+      setPrevCursor(response.data.prev_cursor);
     } catch (err) {
       setError('Erro ao carregar histórico de integrações');
       console.error('Erro:', err);
@@ -74,64 +110,47 @@ export function IntegrationHistory() {
     }
   };
 
-  const handlePageChange = (newPage: number) => {
-    setCurrentPage(newPage);
+  // A paginação é por cursor: só é possível ir para a página vizinha ou voltar ao início
+  const goToFirstPage = () => {
+    setCurrentPage(1);
+    setPageRequest({});
   };
 
-  // Renderiza os botões de paginação
-  const renderPagination = () => {
-    const pages: JSX.Element[] = [];
-    const maxVisiblePages = 5;
-    
-    let startPage = Math.max(1, currentPage - Math.floor(maxVisiblePages / 2));
-    let endPage = Math.min(totalPages, startPage + maxVisiblePages - 1);
-    
-    if (endPage - startPage + 1 < maxVisiblePages) {
-      startPage = Math.max(1, endPage - maxVisiblePages + 1);
-    }
+  const goToNextPage = () => {
+    if (!nextCursor) return;
+    setCurrentPage(page => page + 1);
+    setPageRequest({ cursor: nextCursor, direction: 'next' });
+  };
 
-    // Adiciona primeira página e reticências se necessário
-    if (startPage > 1) {
-      pages.push(
-        <button key={1} onClick={() => handlePageChange(1)} className="page-button">
-          1
-        </button>
-      );
-      if (startPage > 2) {
-        pages.push(<span key="start-ellipsis" className="ellipsis">...</span>);
-      }
-    }
+  const goToPrevPage = () => {
+    if (!prevCursor) return;
+    setCurrentPage(page => Math.max(1, page - 1));
+    setPageRequest({ cursor: prevCursor, direction: 'prev' });
+  };
 
-    // Adiciona páginas numeradas
-    for (let i = startPage; i <= endPage; i++) {
-      pages.push(
-        <button
-          key={i}
-          onClick={() => handlePageChange(i)}
-          className={`page-button ${currentPage === i ? 'active' : ''}`}
-        >
-          {i}
-        </button>
-      );
-    }
+  const handleFilterChange = (setter: (value: string) => void) =>
+    (event: React.ChangeEvent<HTMLInputElement | HTMLSelectElement>) => {
+      setter(event.target.value);
+      goToFirstPage();
+    };
 
-    // Adiciona última página e reticências se necessário
-    if (endPage < totalPages) {
-      if (endPage < totalPages - 1) {
-        pages.push(<span key="end-ellipsis" className="ellipsis">...</span>);
-      }
-      pages.push(
-        <button
-          key={totalPages}
-          onClick={() => handlePageChange(totalPages)}
-          className="page-button"
-        >
-          {totalPages}
-        </button>
+  const toggleDetails = async (externalId: string) => {
+    if (expanded === externalId) {
+      setExpanded(null);
+      return;
+    }
+    setExpanded(externalId);
+    setDetailError(null);
+    if (details[externalId]) return;
+    try {
+      const response = await api.get<IntegratedTrip>(
+        `/trips/integration-history/${encodeURIComponent(externalId)}`
       );
+      setDetails(current => ({ ...current, [externalId]: response.data }));
+    } catch (err) {
+      setDetailError('Erro ao carregar detalhes da viagem');
+      console.error('Erro:', err);
     }
-
-    return pages;
   };
 
   // Função auxiliar para extrair todas as notas da viagem
@@ -152,6 +171,21 @@ export function IntegrationHistory() {
       <h2>Histórico de Integrações</h2>
       <div className="history-header">
         <span className="total-items">Total: {totalItems} integrações</span>
+        <div className="history-filters">
+          <select value={statusFilter} onChange={handleFilterChange(setStatusFilter)}>
+            <option value="">Todos os status</option>
+            <option value="success">Sucesso</option>
+            <option value="error">Erro</option>
+          </select>
+          <label>
+            De
+            <input type="date" value={dateFrom} onChange={handleFilterChange(setDateFrom)} />
+          </label>
+          <label>
+            Até
+            <input type="date" value={dateTo} onChange={handleFilterChange(setDateTo)} />
+          </label>
+        </div>
       </div>
       
       <div className="history-list">
@@ -167,58 +201,56 @@ export function IntegrationHistory() {
               <p className="created-at">
                 Data: {new Date(trip.created_at).toLocaleString()}
               </p>
+              {trip.stop_count !== null && (
+                <p>Paradas: {trip.stop_count} · Notas: {trip.note_count}</p>
+              )}
               {trip.error_message && (
                 <p className="error-details">Erro: {trip.error_message}</p>
               )}
-              <div className="trip-details">
-                <h4>Detalhes da Viagem:</h4>
-                <p>Motorista: {trip.trip_data.driver.name}</p>
-                <p>Veículo: {trip.trip_data.vehicle.plate}</p>
-                <p>Paradas: {trip.trip_data.stops.length}</p>
-                
-                {/* Seção de Notas Fiscais */}
-                <div className="notes-section">
-                  <h5>Notas Fiscais:</h5>
-                  <div className="notes-grid">
-                    {trip.trip_data.stops.map((stop, stopIndex) => (
-                      <div key={stopIndex} className="stop-notes">
-                        <p className="stop-type">
-                          {stop.type === 'COLETA' ? 'Coleta' : 'Entrega'} - {stop.companyName}
-                        </p>
-                        <div className="notes-list">
-                          {stop.notes.map((note, noteIndex) => (
-                            <span key={noteIndex} className="note-badge">
-                              NF {note.numeroNF}
-                            </span>
-                          ))}
-                        </div>
-                      </div>
-                    ))}
-                  </div>
-                </div>
-              </div>
+              <button
+                className="page-button nav-button"
+                onClick={() => toggleDetails(trip.external_id)}
+              >
+                {expanded === trip.external_id ? 'Ocultar detalhes' : 'Detalhes'}
+              </button>
+              {expanded === trip.external_id && !details[trip.external_id] && (
+                <p>{detailError || 'Carregando detalhes...'}</p>
+              )}
+              {expanded === trip.external_id && details[trip.external_id] && (
+                <TripDetails trip={details[trip.external_id]} />
+              )}
             </div>
           </div>
         ))}
       </div>
 
-      {totalPages > 1 && (
+      {(prevCursor || nextCursor) && (
         <div className="pagination">
           <button
-            onClick={() => handlePageChange(currentPage - 1)}
-            disabled={currentPage === 1}
+            onClick={goToFirstPage}
+            disabled={!prevCursor}
+            className="page-button nav-button"
+          >
+            Início
+          </button>
+
+          <button
+            onClick={goToPrevPage}
+            disabled={!prevCursor}
             className="page-button nav-button"
           >
             Anterior
           </button>
           
           <div className="page-numbers">
-            {renderPagination()}
+            <span className="page-button active">
+              {currentPage} de {Math.max(totalPages, currentPage)}
+            </span>
           </div>
           
           <button
-            onClick={() => handlePageChange(currentPage + 1)}
-            disabled={currentPage === totalPages}
+            onClick={goToNextPage}
+            disabled={!nextCursor}
             className="page-button nav-button"
           >
             Próxima
@@ -227,4 +259,38 @@ export function IntegrationHistory() {
       )}
     </div>
   );
-} 
\ No newline at end of file
+} 
+function TripDetails({ trip }: { trip: IntegratedTrip }) {
+  return (
+    <div className="trip-details">
+      <h4>Detalhes da Viagem:</h4>
+      {trip.error_message && (
+        <p className="error-details">Erro: {trip.error_message}</p>
+      )}
+      <p>Motorista: {trip.trip_data.driver.name}</p>
+      <p>Veículo: {trip.trip_data.vehicle.plate}</p>
+      <p>Paradas: {trip.trip_data.stops.length}</p>
+
+      {/* Seção de Notas Fiscais */}
+      <div className="notes-section">
+        <h5>Notas Fiscais:</h5>
+        <div className="notes-grid">
+          {trip.trip_data.stops.map((stop, stopIndex) => (
+            <div key={stopIndex} className="stop-notes">
+              <p className="stop-type">
+                {stop.type === 'COLETA' ? 'Coleta' : 'Entrega'} - {stop.companyName}
+              </p>
+              <div className="notes-list">
+                {stop.notes.map((note, noteIndex) => (
+                  <span key={noteIndex} className="note-badge">
+                    NF {note.numeroNF}
+                  </span>
+                ))}
+              </div>
+            </div>
+          ))}
+        </div>
+      </div>
+    </div>
+  );
+}
@@ -1,5 +1,5 @@
-import React, { useState, useEffect } from 'react';
-import api from '../services/api';
+import React, { useState, useEffect, useRef } from 'react';
+import api, { authHeaders, handleUnauthorized } from '../services/api';
 
 interface CSVOrder {
   id: string;
@@ -43,6 +43,17 @@ interface Organization {
   workspaces: Workspace[];
 }
 
+// Eventos NDJSON de /orders/matrix-cargo?stream=true
+interface OrderStreamEvent {
+  type: 'result' | 'error' | 'summary';
+  uniqueId?: string;
+  result?: { code?: string };
+  error?: string;
+  total?: number;
+  success?: number;
+  failed?: number;
+}
+
 function InstructionsModal({ isOpen, onClose }) {
   if (!isOpen) return null;
 
@@ -196,6 +207,8 @@ export function OrdersImport() {
   const [selectedOrganization, setSelectedOrganization] = useState<string>('');
   const [selectedWorkspace, setSelectedWorkspace] = useState<string>('');
   const [isLoadingOrgs, setIsLoadingOrgs] = useState(false);
+  const [integrationProgress, setIntegrationProgress] = useState<{ done: number; total: number } | null>(null);
+  const integrationAbort = useRef<AbortController | null>(null);
 
   const handleFileChange = (event: React.ChangeEvent<HTMLInputElement>) => {
     const selectedFile = event.target.files?.[0];
@@ -309,74 +322,118 @@ export function OrdersImport() {
       }))
     );
 
-    try {
-      const response = await api.post('/orders/matrix-cargo', 
-        processedOrders,
-        {
-          headers: {
-            'Organization-Id': selectedOrganization,
-            'Workspace-Id': selectedWorkspace
-          }
-        }
-      );
+    // Os resultados chegam pedido a pedido; cancelar fecha a conexão e o servidor
+    // interrompe os envios que ainda não começaram
+    const controller = new AbortController();
+    integrationAbort.current = controller;
+    setIntegrationProgress({ done: 0, total: processedOrders.length });
 
-      // Atualiza o status de cada pedido com base na resposta usando uniqueId
-      setProcessedOrders(orders => 
+    const applyEvents = (events: OrderStreamEvent[]) => {
+      const byUniqueId = new Map(events.filter(event => event.uniqueId).map(event => [event.uniqueId, event]));
+      if (!byUniqueId.size) return;
+      setProcessedOrders(orders =>
         orders.map(order => {
-          // Procura o resultado correspondente pelo uniqueId
-          const successResult = response.data.results.find(r => r.uniqueId === order.uniqueId);
-          const errorResult = response.data.errors.find(e => e.uniqueId === order.uniqueId);
-          
-          if (successResult) {
+          const event = byUniqueId.get(order.uniqueId);
+          if (!event) return order;
+          if (event.type === 'result') {
             return {
               ...order,
               integrationStatus: 'success',
-              integrationCode: successResult.result.code
+              integrationCode: event.result?.code
             };
           }
-          
-          if (errorResult) {
-            return {
-              ...order,
-              integrationStatus: 'error',
-              integrationError: errorResult.error || 'Erro na integração'
-            };
-          }
-          
-          // Se não encontrou nenhum resultado, mantém como erro
           return {
             ...order,
             integrationStatus: 'error',
-            integrationError: 'Não foi possível determinar o status da integração'
+            integrationError: event.error || 'Erro na integração'
           };
         })
       );
+      setIntegrationProgress(progress => progress && { ...progress, done: progress.done + byUniqueId.size });
+    };
+
+    // Pedidos sem evento (stream interrompido) não ficam como pendentes
+    const failPending = (message: string) => {
+      setProcessedOrders(orders =>
+        orders.map(order => order.integrationStatus === 'pending'
+          ? { ...order, integrationStatus: 'error', integrationError: message }
+          : order
+        )
+      );
+    };
+
+    try {
+      const response = await fetch(`${api.defaults.baseURL}/orders/matrix-cargo?stream=true`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Accept': 'application/x-ndjson',
+          ...authHeaders(),
+          'Organization-Id': selectedOrganization,
+          'Workspace-Id': selectedWorkspace
+        },
+        body: JSON.stringify(processedOrders),
+        signal: controller.signal
+      });
+
+      if (response.status === 401) {
+        // Mesmo tratamento do interceptor do axios: sessão expirada volta ao login
+        handleUnauthorized();
+        return;
+      }
+
+      if (!response.ok || !response.body) {
+        const body = await response.json().catch(() => null);
+        throw new Error(body?.detail || 'Erro ao integrar pedidos');
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let summary: OrderStreamEvent | null = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() || '';
+
+        const events = lines.filter(line => line.trim()).map(line => JSON.parse(line) as OrderStreamEvent);
+        summary = events.find(event => event.type === 'summary') || summary;
+        applyEvents(events.filter(event => event.type !== 'summary'));
+      }
+
+      failPending('Não foi possível determinar o status da integração');
 
       // Atualiza mensagem baseada no total de sucessos/falhas
-      const totalSuccess = response.data.success;
-      const totalFailed = response.data.failed;
-      
-      if (totalFailed === 0) {
+      if (!summary) {
+        setError('A integração foi interrompida antes do fim. Verifique os detalhes na tabela.');
+      } else if (summary.failed === 0) {
         alert('Todos os pedidos foram integrados com sucesso!');
         setFile(null);
       } else {
-        setError(`${totalFailed} pedido(s) falharam na integração. Verifique os detalhes na tabela.`);
+        setError(`${summary.failed} pedido(s) falharam na integração. Verifique os detalhes na tabela.`);
       }
     } catch (err: any) {
-      setError(err.response?.data?.detail || 'Erro ao integrar pedidos');
-      // Marca todos os pedidos como erro em caso de falha geral
-      setProcessedOrders(orders => 
-        orders.map(order => ({
-          ...order,
-          integrationStatus: 'error',
-          integrationError: 'Falha na integração'
-        }))
-      );
+      if (err.name === 'AbortError') {
+        setError('Integração cancelada. Pedidos ainda não enviados foram marcados como erro.');
+        failPending('Integração cancelada');
+      } else {
+        setError(err.message || 'Erro ao integrar pedidos');
+        failPending('Falha na integração');
+      }
     } finally {
+      integrationAbort.current = null;
+      setIntegrationProgress(null);
       setIsIntegrating(false);
     }
   };
 
+  const handleCancelIntegration = () => {
+    integrationAbort.current?.abort();
+  };
+
   const generateExampleCSV = () => {
     const headers = [
       'id',
@@ -558,8 +615,15 @@ export function OrdersImport() {
               disabled={isIntegrating}
               className="integrate-button"
             >
-              {isIntegrating ? 'Integrando...' : 'Integrar Pedidos'}
+              {isIntegrating
+                ? `Integrando... ${integrationProgress ? `${integrationProgress.done}/${integrationProgress.total}` : ''}`
+                : 'Integrar Pedidos'}
             </button>
+            {isIntegrating && (
+              <button onClick={handleCancelIntegration} className="cancel-button">
+                Cancelar
+              </button>
+            )}
           </div>
 
           <div className="orders-table-wrapper">
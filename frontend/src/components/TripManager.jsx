@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import PropTypes from 'prop-types'
 import { DragDropContext, Droppable, Draggable } from 'react-beautiful-dnd'
 import api from '../services/api';
@@ -192,6 +192,9 @@ function TripManager({ processedData, onTripGenerated }) {
     stops: []
   })
   const [selectedNotes, setSelectedNotes] = useState(new Set())
+  // Idempotency-Key do envio da viagem atual: reaproveitada em cliques repetidos e
+  // novas tentativas, para que o backend não crie a viagem duas vezes; renovada após o sucesso
+  const sendKeyRef = useRef(null)
   const [showNewStopForm, setShowNewStopForm] = useState(false)
   const [newStop, setNewStop] = useState({
     type: 'COLETA',
@@ -590,13 +593,19 @@ function TripManager({ processedData, onTripGenerated }) {
       return;
     }
 
+    if (!sendKeyRef.current) {
+      sendKeyRef.current = `${currentTrip.id || 'trip'}-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
     try {
       const response = await api.post('/trips/matrix-cargo', currentTrip, {
         headers: {
           'Organization-Id': selectedOrganization,
-          'Workspace-Id': selectedWorkspace
+          'Workspace-Id': selectedWorkspace,
+          'Idempotency-Key': sendKeyRef.current
         }
       });
+      sendKeyRef.current = null;
       
       // Coleta os IDs das notas usadas nesta viagem
       const usedNoteIds = currentTrip.stops.flatMap(stop => 
@@ -6,6 +6,18 @@ const api = axios.create({
   baseURL: 'https://facilitador-api.matrixcargo.com.br',
 });
 
+// Compartilhados com as chamadas feitas com fetch (ex. streaming de pedidos), que não
+// passam pelos interceptors abaixo
+export const authHeaders = (): Record<string, string> => {
+  const token = authService.getAccessToken();
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
+export const handleUnauthorized = () => {
+  authService.logout();
+  window.location.reload();
+};
+
 api.interceptors.request.use((config: InternalAxiosRequestConfig) => {
   const token = authService.getAccessToken();
   if (token) {
@@ -18,8 +30,7 @@ api.interceptors.response.use(
   (response) => response,
   async (error) => {
     if (error.response?.status === 401) {
-      authService.logout();
-      window.location.reload();
+      handleUnauthorized();
     }
     return Promise.reject(error);
   }